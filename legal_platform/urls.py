@@ -19,6 +19,8 @@ from django.http import JsonResponse
 from django.urls import path, include
 from django.contrib import admin
 
+from users.profiling import metrics
+
 
 def home(request):
     return JsonResponse({"message": "Welcome to the Legal Platform API"})
@@ -27,4 +29,5 @@ urlpatterns = [
     path("", home),  # Default root route
     path('admin/', admin.site.urls),
     path('api/', include('users.urls')),
+    path('metrics', metrics),  # Prometheus, with REQUEST_PROFILING=1
 ]
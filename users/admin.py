@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, ClientProfile, LawyerProfile, Consultation, Review, Notification
+from .models import User, ClientProfile, LawyerProfile, Consultation, Review, Notification, OutboxMessage
+from .models import BlackoutDate, WorkingHours
 
 # Register the User model with Django's built-in UserAdmin
 admin.site.register(User, UserAdmin)
@@ -11,12 +12,21 @@ class ClientProfileAdmin(admin.ModelAdmin):
     list_display = ('user', 'address')
     search_fields = ('user__username', 'address')
 
+class WorkingHoursInline(admin.TabularInline):
+    model = WorkingHours
+    extra = 0
+
+class BlackoutDateInline(admin.TabularInline):
+    model = BlackoutDate
+    extra = 0
+
 # Register the LawyerProfile model
 @admin.register(LawyerProfile)
 class LawyerProfileAdmin(admin.ModelAdmin):
     list_display = ('user', 'specialization', 'license_number', 'verified', 'address')
     list_filter = ('verified',)
     search_fields = ('user__username', 'specialization', 'license_number')
+    inlines = [WorkingHoursInline, BlackoutDateInline]
 
 
 @admin.register(Consultation)
@@ -35,4 +45,10 @@ class ReviewAdmin(admin.ModelAdmin):
 class NotificationAdmin(admin.ModelAdmin):
     list_display = ('recipient', 'message', 'is_read', 'created_at')
     list_filter = ('is_read',)
-    search_fields = ('user__username', 'message')
\ No newline at end of file
+    search_fields = ('user__username', 'message')
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ('recipient', 'status', 'channels', 'attempts', 'created_at', 'processed_at')
+    list_filter = ('status',)
+    search_fields = ('recipient__username', 'message')
@@ -0,0 +1,158 @@
+"""
+JWT authentication with role claims and revocation.
+
+Tokens issued by LoginView and /auth/token/ carry the user's roles and profile ids
+(see add_claims). Views that set `authentication_classes = [StatelessJWTAuthentication]`
+get a ClaimsUser built from those claims, so authenticating costs no database query.
+Such views must use request.user.id / .client_profile_id rather than treat
+request.user as a model instance. Every other view keeps loading the User row.
+
+Revocation is kept in the cache, not the database. A logged-out token's jti stays
+revoked until the token would have expired anyway. A change to a user's password,
+roles or active flag revokes every token issued to them before the change (see
+signals.py), so stale claims can't outlive it. Like the response cache, revocation
+only reaches every worker when CACHES points at a shared backend.
+"""
+import time
+
+from django.core.cache import cache
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import ClientProfile, LawyerProfile, User
+
+# Changing any of these revokes the user's outstanding tokens
+AUTH_FIELDS = ('password', 'is_active', 'is_staff', 'is_superuser', 'is_client', 'is_lawyer', 'is_verified')
+
+
+def _profile_id(user, descriptor, model):
+    # EmailBackend joins the profiles in, so a login doesn't query for them again
+    if descriptor.related.is_cached(user):
+        profile = descriptor.related.get_cached_value(user)
+        return profile.pk if profile is not None else None
+    return model.objects.filter(user=user).values_list('id', flat=True).first()
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def add_claims(token, user):
+    # iat is in whole seconds, too coarse to order a token against a revocation made in
+    # the same second, such as logging in again right after a password change
+    token['issued_ms'] = _now_ms()
+    token['username'] = user.username
+    token['is_client'] = user.is_client
+    token['is_lawyer'] = user.is_lawyer
+    token['is_verified'] = user.is_verified
+    token['is_staff'] = user.is_staff
+    token['client_profile_id'] = _profile_id(user, User.clientprofile, ClientProfile)
+    token['lawyer_profile_id'] = _profile_id(user, User.lawyer_profile, LawyerProfile)
+    return token
+
+
+def tokens_for_user(user):
+    """A refresh token with the platform claims. Its .access_token carries them too."""
+    return add_claims(RefreshToken.for_user(user), user)
+
+
+def _token_key(jti):
+    return f'revoked-token:{jti}'
+
+
+def _user_key(user_id):
+    return f'revoked-user:{user_id}'
+
+
+def revoke_token(token):
+    """Reject this token from now until it expires."""
+    remaining = int(token['exp'] - time.time())
+    if remaining > 0:
+        cache.set(_token_key(token[api_settings.JTI_CLAIM]), True, remaining)
+
+
+def revoke_user_tokens(user_id):
+    """Reject every token issued to the user up to now."""
+    lifetime = max(api_settings.ACCESS_TOKEN_LIFETIME, api_settings.REFRESH_TOKEN_LIFETIME)
+    cache.set(_user_key(user_id), _now_ms(), int(lifetime.total_seconds()))
+
+
+def is_revoked(token):
+    token_key = _token_key(token.get(api_settings.JTI_CLAIM))
+    user_key = _user_key(token.get(api_settings.USER_ID_CLAIM))
+    found = cache.get_many([token_key, user_key])
+    if token_key in found:
+        return True
+    revoked_at = found.get(user_key)
+    if revoked_at is None:
+        return False
+    # Tokens issued before issued_ms existed only have iat, which is in whole seconds
+    issued_ms = token.get('issued_ms', token.get('iat', 0) * 1000)
+    return issued_ms <= revoked_at
+
+
+class ClaimsUser(TokenUser):
+    """The user described by an access token's claims. There's no database row behind it."""
+
+    @cached_property
+    def is_client(self):
+        return bool(self.token.get('is_client', False))
+
+    @cached_property
+    def is_lawyer(self):
+        return bool(self.token.get('is_lawyer', False))
+
+    @cached_property
+    def is_verified(self):
+        return bool(self.token.get('is_verified', False))
+
+    @cached_property
+    def client_profile_id(self):
+        return self.token.get('client_profile_id')
+
+    @cached_property
+    def lawyer_profile_id(self):
+        return self.token.get('lawyer_profile_id')
+
+
+class RevocableJWTAuthentication(JWTAuthentication):
+    """simplejwt's authentication, rejecting revoked tokens. Loads the User row."""
+
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        if is_revoked(token):
+            raise InvalidToken({"detail": "Token has been revoked.", "code": "token_revoked"})
+        return token
+
+
+class StatelessJWTAuthentication(RevocableJWTAuthentication):
+    """Builds request.user from the token's claims, for hot read paths."""
+
+    def get_user(self, validated_token):
+        if 'is_client' not in validated_token:
+            # Issued before tokens carried claims, look the user up as before
+            return super().get_user(validated_token)
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken("Token contained no recognizable user identification")
+        return ClaimsUser(validated_token)
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """/auth/token/ with the same claims LoginView issues."""
+
+    @classmethod
+    def get_token(cls, user):
+        return add_claims(super().get_token(user), user)
+
+
+class RevocableTokenRefreshSerializer(TokenRefreshSerializer):
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        if is_revoked(refresh):
+            raise InvalidToken({"detail": "Token has been revoked.", "code": "token_revoked"})
+        return super().validate(attrs)
@@ -0,0 +1,173 @@
+"""
+Lawyer availability and slot conflicts.
+
+A lawyer publishes weekly WorkingHours, a slot length (LawyerProfile.slot_minutes) and
+BlackoutDates. A booking or consultation takes one slot, starting at
+Booking.appointment_date or at Consultation.date + time in the current timezone.
+Lawyers who haven't published working hours can be booked at any time, as before,
+but still never twice for overlapping slots.
+
+Views save through book_slot(), which checks the slot and saves in one transaction
+while holding the lawyer's profile row, so two requests for the same lawyer can't both
+pass the check. The partial unique constraints on Booking and Consultation catch exact
+double bookings even if something writes around this module.
+"""
+import bisect
+from datetime import datetime, time, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import DateField, DateTimeField, F, TimeField, Value
+from django.utils import timezone
+
+from .models import Booking, Consultation, LawyerProfile
+
+
+class SlotUnavailable(Exception):
+    pass
+
+
+class SlotIndex:
+    """A lawyer's busy intervals sorted by start. Overlap checks are a bisect."""
+
+    def __init__(self, intervals=()):
+        intervals = sorted(intervals)
+        self.starts = [start for start, _ in intervals]
+        # Running max of the ends, so a long interval that started earlier isn't missed
+        self.max_ends = []
+        for _, end in intervals:
+            self.max_ends.append(max(end, self.max_ends[-1]) if self.max_ends else end)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def overlaps(self, start, end):
+        """True if [start, end) overlaps a busy interval."""
+        i = bisect.bisect_left(self.starts, end)  # Intervals starting before `end`
+        return i > 0 and self.max_ends[i - 1] > start
+
+
+def consultation_start(date, time_of_day):
+    return timezone.make_aware(datetime.combine(date, time_of_day))
+
+
+def busy_intervals(lawyer, start, end, exclude_booking=None, exclude_consultation=None):
+    """
+    (start, end) of every live booking and consultation of `lawyer` starting in [start, end).
+
+    Both tables are read in one UNION ALL query, each side served by its partial unique index.
+    """
+    length = timedelta(minutes=lawyer.slot_minutes)
+    bookings = (
+        Booking.objects.filter(lawyer_id=lawyer.user_id, appointment_date__gte=start, appointment_date__lt=end)
+        .exclude(status='canceled').exclude(pk__in=[exclude_booking] if exclude_booking else []).order_by()
+        # Both sides select the same aliased columns, so the UNION lines them up
+        .annotate(
+            slot_at=F('appointment_date'),
+            slot_date=Value(None, output_field=DateField()),
+            slot_time=Value(None, output_field=TimeField()),
+        )
+        .values_list('slot_at', 'slot_date', 'slot_time')
+    )
+    consultations = (
+        Consultation.objects.filter(lawyer=lawyer, date__gte=timezone.localdate(start), date__lte=timezone.localdate(end))
+        .exclude(status='canceled').exclude(pk__in=[exclude_consultation] if exclude_consultation else []).order_by()
+        .annotate(slot_at=Value(None, output_field=DateTimeField()), slot_date=F('date'), slot_time=F('time'))
+        .values_list('slot_at', 'slot_date', 'slot_time')
+    )
+
+    intervals = []
+    for booked_at, date, time_of_day in bookings.union(consultations, all=True):
+        slot_start = booked_at if booked_at is not None else consultation_start(date, time_of_day)
+        if start <= slot_start < end:
+            intervals.append((slot_start, slot_start + length))
+    return intervals
+
+
+def slot_windows(lawyer, day):
+    """The working-hour windows on `day` as aware (start, end) pairs, empty on a blackout date."""
+    if any(blackout.date == day for blackout in lawyer.blackout_dates.all()):
+        return []
+    return [
+        (consultation_start(day, hours.start_time), consultation_start(day, hours.end_time))
+        for hours in lawyer.working_hours.all()
+        if hours.weekday == day.weekday()
+    ]
+
+
+def check_bookable(lawyer, start):
+    """Raise SlotUnavailable unless `start` begins a slot in the lawyer's published hours."""
+    if start < timezone.now():
+        raise SlotUnavailable("The requested time is in the past.")
+    if not lawyer.working_hours.all():
+        return
+
+    length = timedelta(minutes=lawyer.slot_minutes)
+    windows = slot_windows(lawyer, timezone.localdate(start))
+    if not windows:
+        raise SlotUnavailable("The lawyer is not available on this date.")
+    for window_start, window_end in windows:
+        if window_start <= start and start + length <= window_end and (start - window_start) % length == timedelta(0):
+            return
+    raise SlotUnavailable(
+        f"The lawyer takes {lawyer.slot_minutes}-minute slots within their working hours, pick one from free-slots."
+    )
+
+
+def reserve_slot(lawyer, start, exclude_booking=None, exclude_consultation=None):
+    """
+    Raise SlotUnavailable unless the slot starting at `start` is bookable and free.
+
+    Only meaningful inside the transaction that saves the booking, see book_slot().
+    """
+    check_bookable(lawyer, start)
+    length = timedelta(minutes=lawyer.slot_minutes)
+    busy = SlotIndex(busy_intervals(lawyer, start - length, start + length, exclude_booking, exclude_consultation))
+    if busy.overlaps(start, start + length):
+        raise SlotUnavailable("The lawyer is already booked at this time.")
+
+
+def book_slot(start, save, exclude_booking=None, exclude_consultation=None, **lawyer_lookup):
+    """
+    Lock the lawyer matching `lawyer_lookup`, check the slot at `start` and call save(),
+    all in one transaction. Returns what save() returns, raises SlotUnavailable.
+    """
+    try:
+        with transaction.atomic():
+            try:
+                # SQLite ignores FOR UPDATE, so there the partial unique constraints on the
+                # slot are the only real guard against a double booking (see the except below)
+                lawyer = LawyerProfile.objects.select_for_update().get(**lawyer_lookup)
+            except LawyerProfile.DoesNotExist:
+                raise SlotUnavailable("The selected user is not a lawyer.")
+            reserve_slot(lawyer, start, exclude_booking, exclude_consultation)
+            return save()
+    except IntegrityError:
+        # A concurrent request got the same slot in, the unique constraint stopped this one
+        raise SlotUnavailable("The lawyer is already booked at this time.")
+
+
+def free_slots(lawyer, start_date, end_date):
+    """
+    Open slot start times from start_date to end_date inclusive, as [(date, [datetime, ...])].
+
+    `lawyer` should come with working_hours and blackout_dates prefetched.
+    """
+    length = timedelta(minutes=lawyer.slot_minutes)
+    range_start = consultation_start(start_date, time.min)
+    range_end = consultation_start(end_date + timedelta(days=1), time.min)
+    busy = SlotIndex(busy_intervals(lawyer, range_start - length, range_end))
+    now = timezone.now()
+
+    days = []
+    day = start_date
+    while day <= end_date:
+        slots = []
+        for window_start, window_end in slot_windows(lawyer, day):
+            slot_start = window_start
+            while slot_start + length <= window_end:
+                if slot_start >= now and not busy.overlaps(slot_start, slot_start + length):
+                    slots.append(slot_start)
+                slot_start += length
+        days.append((day, sorted(slots)))
+        day += timedelta(days=1)
+    return days
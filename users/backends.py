@@ -0,0 +1,40 @@
+"""
+Email login.
+
+LoginView authenticates by email. EmailBackend finds the user with one query on the
+unique email index and joins both profiles, so the token claims (users/authentication.py)
+need no further queries. Unknown emails still run the hasher once, so response times
+don't tell which addresses have accounts.
+
+A password hashed with an older hasher, or with lower costs than PASSWORD_HASHERS now
+asks for, is rehashed on the next successful login. The new hash is written with a plain
+UPDATE: it is the same password, so it mustn't revoke the user's tokens like a password
+change does (see signals.py).
+"""
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import check_password
+
+User = get_user_model()
+
+
+class EmailBackend(ModelBackend):
+    def authenticate(self, request, email=None, password=None, **kwargs):
+        if email is None or password is None:
+            return None
+        try:
+            user = User.objects.select_related('clientprofile', 'lawyer_profile').get(email=email)
+        except User.DoesNotExist:
+            # Hash anyway, like ModelBackend does for unknown usernames
+            User().set_password(password)
+            return None
+        if check_password(password, user.password, setter=lambda raw: self.rehash(user, raw)) \
+                and self.user_can_authenticate(user):
+            return user
+        return None
+
+    def rehash(self, user, raw_password):
+        user.set_password(raw_password)
+        User.objects.filter(pk=user.pk).update(password=user.password)
+        if getattr(user, '_loaded_values', None) is not None:
+            user._loaded_values['password'] = user.password
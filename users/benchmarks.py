@@ -0,0 +1,54 @@
+"""Helpers shared by the benchmark management commands."""
+import math
+import time
+
+
+def percentile(samples, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not samples:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(samples)))
+    return samples[rank - 1]
+
+
+def summarize(samples):
+    """p50/p90/p99/max/mean of a list of durations in seconds, reported in milliseconds."""
+    ordered = sorted(samples)
+    return {
+        'count': len(ordered),
+        'p50_ms': round(percentile(ordered, 50) * 1000, 3),
+        'p90_ms': round(percentile(ordered, 90) * 1000, 3),
+        'p99_ms': round(percentile(ordered, 99) * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3) if ordered else 0.0,
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0,
+    }
+
+
+def time_calls(func, iterations):
+    """Call func() `iterations` times and return the duration of each call."""
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def compare(results, baseline, threshold=0.2, metrics=('p50_ms', 'p99_ms', 'queries', 'peak_kib')):
+    """
+    Regressions of `results` against `baseline`, both {name: {metric: value}}: every metric
+    that grew by more than `threshold` (a fraction), as (name, metric, baseline, now).
+    Query counts are exact, any increase is a regression.
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for metric in metrics:
+            if metric not in current or metric not in previous:
+                continue
+            allowed = previous[metric] if metric == 'queries' else previous[metric] * (1 + threshold)
+            if current[metric] > allowed:
+                regressions.append((name, metric, previous[metric], current[metric]))
+    return regressions
@@ -0,0 +1,175 @@
+"""
+Versioned caching for lawyer directory reads.
+
+Cached entries are never deleted. Each key embeds the current version of the
+namespaces its data depends on: every lawyer, one city, or one specialization. A
+write bumps those versions, so later reads compute new keys and the old entries are
+never served again. They age out through the timeout or the backend's LRU eviction.
+
+LawyerProfile, User and Review saves bump the affected namespaces (see signals.py),
+both straight away and again once the transaction commits. A read racing the commit
+can therefore only cache old rows under a version that is already dead.
+
+Versions live in the configured cache, so with several worker processes CACHES
+should point at a shared backend. With the default local-memory cache, each process
+only sees its own invalidations and RESPONSE_CACHE_TIMEOUT bounds the staleness.
+"""
+import hashlib
+import time
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from rest_framework.response import Response
+
+ALL_LAWYERS = 'lawyers'
+
+
+def _digest(value):
+    return hashlib.md5(value.encode('utf-8')).hexdigest()
+
+
+def city_namespace(city):
+    return 'lawyers-city:' + _digest(city)
+
+
+def specialization_namespace(specialization):
+    return 'lawyers-specialization:' + _digest(specialization.strip().lower())
+
+
+def _version_key(namespace):
+    return 'version:' + namespace
+
+
+def get_versions(*namespaces):
+    """The current version of each namespace, in one cache round trip."""
+    keys = [_version_key(namespace) for namespace in namespaces]
+    found = cache.get_many(keys)
+    versions = []
+    for key in keys:
+        version = found.get(key)
+        if version is None:
+            # Start from the clock so an evicted version key can't bring back older entries
+            version = time.time_ns()
+            if not cache.add(key, version, None):
+                version = cache.get(key, version)
+        versions.append(version)
+    return versions
+
+
+def bump_versions(*namespaces):
+    now = time.time_ns()
+    cache.set_many({_version_key(namespace): now for namespace in set(namespaces)}, None)
+
+
+def invalidate_lawyers(cities=(), specializations=()):
+    """Make cached lawyer data for these cities and specializations (and all lawyers) unreachable."""
+    namespaces = [ALL_LAWYERS]
+    namespaces += [city_namespace(city) for city in cities if city]
+    namespaces += [specialization_namespace(specialization) for specialization in specializations if specialization]
+    bump_versions(*namespaces)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: bump_versions(*namespaces))
+
+
+def lawyer_user_namespace(user_id):
+    return f'lawyer-user:{user_id}'
+
+
+def lawyer_profile_namespace(profile_id):
+    return f'lawyer-profile:{profile_id}'
+
+
+def invalidate_lawyer_dashboard(user_id=None, profile_id=None):
+    """
+    Bookings point at the lawyer's user, consultations and reviews at the profile, so the
+    dashboard depends on one namespace of each and writers bump whichever id they have.
+    """
+    namespaces = []
+    if user_id is not None:
+        namespaces.append(lawyer_user_namespace(user_id))
+    if profile_id is not None:
+        namespaces.append(lawyer_profile_namespace(profile_id))
+    bump_versions(*namespaces)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: bump_versions(*namespaces))
+
+
+def _count(name, outcome):
+    key = f'response-cache:{outcome}:{name}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def cache_stats(*names):
+    """{name: {hits, misses, hit_rate}} for the given CachedResponseMixin.cache_name values."""
+    counts = cache.get_many([f'response-cache:{outcome}:{name}' for name in names for outcome in ('hits', 'misses')])
+    stats = {}
+    for name in names:
+        hits = counts.get(f'response-cache:hits:{name}', 0)
+        misses = counts.get(f'response-cache:misses:{name}', 0)
+        stats[name] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses), 4) if hits + misses else None,
+        }
+    return stats
+
+
+class CachedResponseMixin:
+    """
+    Serve a view's successful GET responses from the cache.
+
+    The key covers the path, the normalized query string (so ?b=2&a=1 and ?a=1&b=2
+    share an entry, and blank parameters are ignored), the host used in pagination
+    links, any `variant` the view passes, and the versions of the namespaces the
+    response depends on. Responses carry X-Cache: HIT or MISS.
+
+    List views are cached as they are, other views call cached_response() themselves.
+    """
+    cache_name = None
+    cache_timeout = None  # Seconds, defaults to settings.RESPONSE_CACHE_TIMEOUT
+
+    def get_cache_timeout(self):
+        if self.cache_timeout is not None:
+            return self.cache_timeout
+        return getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 60)
+
+    def response_cache_key(self, request, namespaces, variant=()):
+        params = sorted(
+            (name, value)
+            for name, values in request.query_params.lists()
+            for value in values
+            if value != ''
+        )
+        versions = ':'.join(str(version) for version in get_versions(*namespaces))
+        fingerprint = repr((request.get_host(), request.is_secure(), request.path, params, tuple(variant)))
+        return f'response:{self.cache_name}:{versions}:{_digest(fingerprint)}'
+
+    def get_cache_namespaces(self, request):
+        return [ALL_LAWYERS]
+
+    def list(self, request, *args, **kwargs):
+        build = partial(super().list, request, *args, **kwargs)
+        return self.cached_response(request, build, self.get_cache_namespaces(request))
+
+    def cached_response(self, request, build, namespaces=(ALL_LAWYERS,), variant=()):
+        """Return the cached response for this request, or call build() and cache a 200."""
+        key = self.response_cache_key(request, namespaces, variant)
+        data = cache.get(key)
+        if data is not None:
+            _count(self.cache_name, 'hits')
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        response = build()
+        if response.status_code == 200:
+            cache.set(key, response.data, self.get_cache_timeout())
+        _count(self.cache_name, 'misses')
+        response['X-Cache'] = 'MISS'
+        return response
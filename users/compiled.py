@@ -0,0 +1,163 @@
+"""
+Read-only serialization without DRF's per-field machinery, for hot list endpoints.
+
+compile_serializer() turns a serializer class into a `.values()` projection plus a
+row -> dict function, generated once per class. Its output is identical to what the
+serializer itself produces, so a view can switch paths without clients noticing:
+
+- model fields whose to_representation() is a no-op for database values (integers,
+  floats, booleans, strings, primary keys) are copied straight from the row;
+- any other plain field keeps its own to_representation() (dates, decimals, choices);
+- nested serializers are compiled recursively into the same row;
+- a SerializerMethodField is only supported when the serializer names the one column
+  it returns in `value_sources`, e.g. {'is_verified': 'user__is_verified'}.
+
+Anything else (many=True, hyperlinks, other method fields, nullable hops in a dotted
+source) raises ImproperlyConfigured when the class is first compiled.
+"""
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.utils import encoders
+
+from .profiling import timed
+
+# Their to_representation() returns database values unchanged
+PASSTHROUGH_FIELDS = (
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.FloatField,
+    serializers.IntegerField,
+    serializers.ReadOnlyField,
+)
+
+
+class CompiledSerializer:
+    def __init__(self, columns, to_dict):
+        self.columns = columns  # Arguments for QuerySet.values()
+        self.to_dict = to_dict
+
+    def many(self, rows):
+        to_dict = self.to_dict
+        with timed('serialize'):
+            return [to_dict(row) for row in rows]
+
+
+@lru_cache(maxsize=256)
+def compile_serializer(serializer_class, **sparse_fields):
+    """Compiled once per serializer class and, for SparseFieldsMixin serializers, per `fields`/`expand`."""
+    builder = _Builder()
+    body = builder.serializer(serializer_class(**sparse_fields), serializer_class.Meta.model, '')
+    namespace = dict(builder.functions)
+    exec(f'def to_dict(row):\n    return {body}\n', namespace)
+    return CompiledSerializer(tuple(builder.columns), namespace['to_dict'])
+
+
+class _Builder:
+    def __init__(self):
+        self.columns = []
+        self.functions = {}
+
+    def column(self, path):
+        if path not in self.columns:
+            self.columns.append(path)
+        return f'row[{path!r}]'
+
+    def serializer(self, serializer, model, prefix):
+        value_sources = getattr(serializer, 'value_sources', {})
+        items = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if name in value_sources:
+                value = self.column(prefix + value_sources[name])
+            else:
+                value = self.field(serializer, name, field, model, prefix)
+            items.append(f'{name!r}: {value}')
+        return '{' + ', '.join(items) + '}'
+
+    def field(self, serializer, name, field, model, prefix):
+        where = f'{type(serializer).__name__}.{name}'
+        if field.source == '*' or isinstance(field, (serializers.ListSerializer, serializers.ManyRelatedField)):
+            raise ImproperlyConfigured(f"{where} can't be compiled, give it a column in value_sources.")
+
+        path = prefix + '__'.join(field.source_attrs)
+        target = self._walk(model, field.source_attrs, where)
+        if isinstance(field, serializers.BaseSerializer):
+            nested = self.serializer(field, target.related_model, path + '__')
+            # DRF renders a missing related object as null
+            return f'(None if {self.column(path)} is None else {nested})' if target.null else nested
+
+        value = self.column(path)
+        if isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None:
+            return value
+        if isinstance(field, PASSTHROUGH_FIELDS):
+            return value
+        function = f'field_{len(self.functions)}'
+        self.functions[function] = field.to_representation
+        return f'(None if {value} is None else {function}({value}))'
+
+    @staticmethod
+    def _walk(model, attrs, where):
+        """The model field at the end of a source, refusing hops that may be null."""
+        current, field = model, None
+        for position, attr in enumerate(attrs):
+            try:
+                field = current._meta.get_field(attr)
+            except FieldDoesNotExist:
+                raise ImproperlyConfigured(f"{where} reads {attr!r}, which isn't a model field.")
+            if not field.concrete:
+                raise ImproperlyConfigured(f"{where} reads {attr!r}, which isn't a column.")
+            if position < len(attrs) - 1:
+                if field.null:
+                    # DRF would skip the key when the relation is missing, values() gives null
+                    raise ImproperlyConfigured(f"{where} goes through the nullable relation {attr!r}.")
+                current = field.related_model
+        return field
+
+
+class CompiledListMixin:
+    """
+    For read-only list views: GETs are served from a `.values()` query through the
+    compiled serializer instead of model instances and the serializer's fields.
+    Place it after mixins that wrap list(), such as ConditionalGetMixin and CachedResponseMixin.
+    """
+
+    def list(self, request, *args, **kwargs):
+        sparse_fields = self.get_sparse_fields() if hasattr(self, 'get_sparse_fields') else {}
+        compiled = compile_serializer(self.get_serializer_class(), **sparse_fields)
+        queryset = self.filter_queryset(self.get_queryset())
+        columns = list(compiled.columns)
+        if self.paginator is not None:
+            # The paginator reads its cursor key off the rows, so they must carry the ordering columns
+            for field in self.paginator.get_ordering(request, queryset, self):
+                if field.lstrip('-') not in columns:
+                    columns.append(field.lstrip('-'))
+        queryset = queryset.values(*columns)
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(compiled.many(page))
+        return Response(compiled.many(queryset))
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer that reuses one encoder for compact output. The bytes are the same."""
+    _encoder = encoders.JSONEncoder(
+        ensure_ascii=JSONRenderer.ensure_ascii,
+        allow_nan=not JSONRenderer.strict,
+        separators=(',', ':'),
+    )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if not self.compact or self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        ret = self._encoder.encode(data)
+        if '\u2028' in ret or '\u2029' in ret:
+            ret = ret.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029')
+        return ret.encode()
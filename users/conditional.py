@@ -0,0 +1,77 @@
+"""
+Conditional GET (ETag / Last-Modified) for list and detail endpoints.
+
+Validators are worked out before anything is serialized. A list's ETag is built from
+max(updated_at) and the row count of the filtered queryset, taken with one aggregate
+query; the count catches deletes, which leave no updated_at behind. Views whose
+rows embed data from other tables add the matching cache versions (users/cache.py)
+through get_etag_extra(). A matching If-None-Match gets a 304 without running the
+list query at all.
+
+Lists send no Last-Modified. max(updated_at) stays the same when a row is deleted or
+changed again within the same second, so If-Modified-Since alone would answer 304 to
+a list that did change. Details send both validators.
+
+ETags are weak: they say the data is the same, not that the bytes are.
+"""
+import hashlib
+from functools import partial
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+
+def _etag(*parts):
+    return 'W/"%s"' % hashlib.md5(repr(parts).encode('utf-8')).hexdigest()
+
+
+def _timestamp(value):
+    return int(value.timestamp()) if value is not None else None
+
+
+class ConditionalGetMixin:
+    """For generic list and retrieve views. Needs an `updated_at` field on the model."""
+    updated_field = 'updated_at'
+
+    def get_etag_extra(self, request):
+        """Anything else the response depends on, e.g. versions of related data."""
+        return ()
+
+    def conditional_response(self, request, etag, last_modified, build):
+        # Clients may keep responses but must check back before reusing them
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            response = not_modified
+        else:
+            response = build()
+            if response.status_code != 200:
+                return response
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def list_etag(self, request):
+        summary = self.filter_queryset(self.get_queryset()).order_by().aggregate(
+            last_modified=Max(self.updated_field), count=Count('pk')
+        )
+        return _etag(
+            summary['last_modified'], summary['count'], request.get_full_path(),
+            request.user.pk, request.accepted_renderer.format, *self.get_etag_extra(request),
+        )
+
+    def list(self, request, *args, **kwargs):
+        etag = self.list_etag(request)
+        return self.conditional_response(request, etag, None, partial(super().list, request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        updated = getattr(instance, self.updated_field)
+        etag = _etag(instance.pk, updated, request.accepted_renderer.format, *self.get_etag_extra(request))
+
+        def build():
+            return Response(self.get_serializer(instance).data)
+        return self.conditional_response(request, etag, _timestamp(updated), build)
@@ -0,0 +1,144 @@
+"""
+Geohash helpers for nearest-lawyer lookups without PostGIS.
+
+Each lawyer stores the geohash of their coordinates in an indexed column. A radius
+query takes the circle's latitude/longitude bounding box and picks the finest geohash
+precision at which at most nine cells overlap it. Each of those cells is one index
+range scan (`geohash >= 'abc' AND geohash < 'abc{'`). Exact distances are only
+computed for the rows those ranges return.
+
+A box that crosses the antimeridian is split in two. A circle that reaches a pole
+covers every longitude there.
+"""
+import heapq
+import math
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 9  # ~5m cells, plenty for matching
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+MAX_COVERING_CELLS = 9
+
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+
+    while len(chars) < precision:
+        # Bits alternate between longitude and latitude, starting with longitude
+        interval, coordinate = (lng_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """(latitude, longitude) span in degrees of a geohash cell."""
+    lng_bits = math.ceil(precision * 5 / 2)
+    lat_bits = precision * 5 // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lng_bits
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """
+    (min_lat, max_lat, longitude ranges) of a circle. There are two (west, east) ranges
+    when the box crosses the antimeridian, and one full range when it reaches a pole.
+    """
+    angle = radius_km / EARTH_RADIUS_KM
+    lat_delta = math.degrees(angle)
+    min_lat, max_lat = max(latitude - lat_delta, -90.0), min(latitude + lat_delta, 90.0)
+    if abs(latitude) + lat_delta >= 90.0:
+        return min_lat, max_lat, [(-180.0, 180.0)]
+
+    # The circle is widest north or south of its centre, not on its own parallel
+    lng_delta = math.degrees(math.asin(min(1.0, math.sin(angle) / math.cos(math.radians(latitude)))))
+    west, east = longitude - lng_delta, longitude + lng_delta
+    if east - west >= 360.0:
+        return min_lat, max_lat, [(-180.0, 180.0)]
+    if west < -180.0:
+        return min_lat, max_lat, [(west + 360.0, 180.0), (-180.0, east)]
+    if east > 180.0:
+        return min_lat, max_lat, [(west, 180.0), (-180.0, east - 360.0)]
+    return min_lat, max_lat, [(west, east)]
+
+
+def _cell_range(low, high, origin, span, count):
+    """Indexes of the cells of width `span`, counted from `origin`, that overlap [low, high]."""
+    return range(int((low - origin) // span), min(int((high - origin) // span), count - 1) + 1)
+
+
+def covering_prefixes(latitude, longitude, radius_km):
+    """Geohash prefixes of the cells covering a circle of radius_km, at most MAX_COVERING_CELLS unless at precision 1."""
+    min_lat, max_lat, lng_ranges = bounding_box(latitude, longitude, radius_km)
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        lat_span, lng_span = cell_size(precision)
+        rows = _cell_range(min_lat, max_lat, -90.0, lat_span, round(180.0 / lat_span))
+        columns = [
+            _cell_range(west, east, -180.0, lng_span, round(360.0 / lng_span)) for west, east in lng_ranges
+        ]
+        if len(rows) * sum(map(len, columns)) <= MAX_COVERING_CELLS:
+            break
+
+    return sorted({
+        encode(-90.0 + (row + 0.5) * lat_span, -180.0 + (column + 0.5) * lng_span, precision)
+        for row in rows
+        for cells in columns
+        for column in cells
+    })
+
+
+def distance_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance (haversine)."""
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def within_radius(latitude, longitude, radius_km, field='geohash'):
+    """
+    Q object selecting rows whose geohash falls in the covering cells, narrowed by a
+    latitude/longitude bounding box. Rows still need an exact distance check.
+    """
+    cells = reduce(or_, (
+        Q(**{f'{field}__gte': prefix, f'{field}__lt': prefix + '{'})  # '{' sorts right after 'z'
+        for prefix in covering_prefixes(latitude, longitude, radius_km)
+    ))
+    min_lat, max_lat, lng_ranges = bounding_box(latitude, longitude, radius_km)
+    box = Q(latitude__gte=min_lat, latitude__lte=max_lat) & reduce(or_, (
+        Q(longitude__gte=west, longitude__lte=east) for west, east in lng_ranges
+    ))
+    return cells & box
+
+
+def nearest(queryset, latitude, longitude, radius_km, limit):
+    """
+    The `limit` closest rows of `queryset` within radius_km as (pk, distance) pairs,
+    closest first. Only the id and coordinates of candidate rows are read.
+    """
+    candidates = queryset.filter(within_radius(latitude, longitude, radius_km)).values_list(
+        'pk', 'latitude', 'longitude'
+    )
+    in_range = (
+        (distance_km(latitude, longitude, lat, lng), pk)
+        for pk, lat, lng in candidates.iterator()
+    )
+    closest = heapq.nsmallest(limit, (item for item in in_range if item[0] <= radius_km))
+    return [(pk, distance) for distance, pk in closest]
@@ -0,0 +1,26 @@
+"""
+Password hashers with costs taken from settings.
+
+Each keeps Django's algorithm name, so existing hashes still verify. When a setting
+changes, Django sees the stored parameters differ and the hash is upgraded on the next
+login (see backends.py).
+"""
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class TunedPBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    iterations = getattr(settings, 'PBKDF2_ITERATIONS', None) or hashers.PBKDF2PasswordHasher.iterations
+
+
+class TunedScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    work_factor = getattr(settings, 'SCRYPT_WORK_FACTOR', hashers.ScryptPasswordHasher.work_factor)
+    block_size = getattr(settings, 'SCRYPT_BLOCK_SIZE', hashers.ScryptPasswordHasher.block_size)
+    parallelism = getattr(settings, 'SCRYPT_PARALLELISM', hashers.ScryptPasswordHasher.parallelism)
+
+
+class TunedArgon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """Needs argon2-cffi, but only once an argon2 hash is made or checked."""
+    time_cost = getattr(settings, 'ARGON2_TIME_COST', hashers.Argon2PasswordHasher.time_cost)
+    memory_cost = getattr(settings, 'ARGON2_MEMORY_COST', hashers.Argon2PasswordHasher.memory_cost)
+    parallelism = getattr(settings, 'ARGON2_PARALLELISM', hashers.Argon2PasswordHasher.parallelism)
@@ -0,0 +1,166 @@
+import json
+import time
+import tracemalloc
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from users.authentication import tokens_for_user
+from users.benchmarks import compare, summarize
+from users.models import Consultation, LawyerProfile, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the main API endpoints in-process through Django's test client, against "
+        "whatever is in the database (see seed_data). Each endpoint reports latency percentiles, "
+        "the queries one request runs and its peak Python memory. Writes are rolled back. "
+        "Save the results with --output and check a later run against them with --baseline, "
+        "which fails when an endpoint got slower, hungrier or ran more queries."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=100, help="Timed requests per endpoint.")
+        parser.add_argument("--warmup", type=int, default=5)
+        parser.add_argument(
+            "--endpoint", action="append", dest="endpoints", metavar="NAME",
+            help="Only run this endpoint (can be repeated), see the names in the output.",
+        )
+        parser.add_argument("--cold", action="store_true", help="Clear the cache before every request.")
+        parser.add_argument("--prefix", default="seed", help="seed_data's --prefix, the users to act as.")
+        parser.add_argument("--password", default="password123", help="seed_data's --password, for login.")
+        parser.add_argument("--output", help="Write the results to this JSON file.")
+        parser.add_argument("--baseline", help="Compare against the results in this JSON file.")
+        parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown, 0.2 is 20%%.")
+        parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+
+    def handle(self, *args, **options):
+        cases = self.cases(options["prefix"], options["password"])
+        unknown = set(options["endpoints"] or ()) - set(cases)
+        if unknown:
+            raise CommandError(f"Unknown endpoint(s): {', '.join(sorted(unknown))}. Choose from {', '.join(cases)}.")
+        names = options["endpoints"] or list(cases)
+
+        # In-process requests come from "testserver", and logins mustn't be throttled
+        with override_settings(ALLOWED_HOSTS=["testserver"], LOGIN_RATE="1000000/s"):
+            endpoints = {name: self.run(cases[name], options) for name in names}
+        results = {
+            "meta": {
+                "database": connection.vendor,
+                "requests": options["requests"],
+                "cold_cache": options["cold"],
+                "lawyers": LawyerProfile.objects.count(),
+                "users": User.objects.count(),
+            },
+            "endpoints": endpoints,
+        }
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as handle:
+                json.dump(results, handle, indent=2)
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            for name, stats in endpoints.items():
+                self.stdout.write(
+                    f"{name}: p50 {stats['p50_ms']} ms, p90 {stats['p90_ms']} ms, p99 {stats['p99_ms']} ms, "
+                    f"{stats['queries']} queries, peak {stats['peak_kib']} KiB"
+                    + (f", {stats['errors']} errors" if stats["errors"] else "")
+                )
+
+        if options["baseline"]:
+            with open(options["baseline"], encoding="utf-8") as handle:
+                baseline = json.load(handle)
+            for key in ("database", "cold_cache"):
+                if baseline["meta"].get(key) != results["meta"][key]:
+                    self.stderr.write(f"The baseline ran with {key}={baseline['meta'].get(key)}, this run with {results['meta'][key]}.")
+            regressions = compare(endpoints, baseline["endpoints"], options["threshold"])
+            for name, metric, before, now in regressions:
+                self.stderr.write(f"{name}: {metric} went from {before} to {now}")
+            if regressions:
+                raise CommandError(f"{len(regressions)} regression(s) against {options['baseline']}.")
+            self.stdout.write(self.style.SUCCESS(f"No regressions against {options['baseline']}."))
+
+    def cases(self, prefix, password):
+        """{name: request function}, each call sends one request and returns the response."""
+        consultation = (
+            Consultation.objects.filter(lawyer__user__username__startswith=f"{prefix}-")
+            .exclude(status="canceled").select_related("client__user", "lawyer__user").first()
+        )
+        if consultation is None:
+            raise CommandError(f"No {prefix}-* users with consultations, run `python manage.py seed_data` first.")
+        lawyer = consultation.lawyer.user
+        # A client in a city with verified lawyers, so matching has candidates
+        city = LawyerProfile.objects.filter(verified=True).values_list("city", flat=True).first()
+        clients = User.objects.filter(is_client=True, username__startswith=f"{prefix}-")
+        client = clients.filter(clientprofile__city=city).first() or consultation.client.user
+
+        http = Client()
+        as_client = {"HTTP_AUTHORIZATION": f"Bearer {tokens_for_user(client).access_token}"}
+        as_lawyer = {"HTTP_AUTHORIZATION": f"Bearer {tokens_for_user(lawyer).access_token}"}
+        statuses = iter(["confirmed", "canceled"] * 1_000_000)
+        # Far beyond any seeded slot, one hour apart
+        next_slot = iter(
+            timezone.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=3650, hours=hour)
+            for hour in range(1_000_000)
+        )
+
+        return {
+            "lawyer-list": lambda: http.get(reverse("lawyer-list"), **as_client),
+            "match-lawyers": lambda: http.get(reverse("match-lawyers"), **as_client),
+            "login": lambda: http.post(
+                reverse("login"), {"email": client.email, "password": password}, content_type="application/json"
+            ),
+            "consultation-status": lambda: http.put(
+                reverse("consultation-status", args=[consultation.pk]), {"status": next(statuses)},
+                content_type="application/json", **as_lawyer,
+            ),
+            "create-booking": lambda: http.post(
+                reverse("create-booking"), {"lawyer": lawyer.pk, "appointment_date": next(next_slot).isoformat()},
+                content_type="application/json", **as_client,
+            ),
+            "client-bookings": lambda: http.get(reverse("client-bookings"), **as_client),
+            "lawyer-bookings": lambda: http.get(reverse("lawyer-bookings"), **as_lawyer),
+        }
+
+    def run(self, request, options):
+        errors = 0
+
+        def send():
+            nonlocal errors
+            if options["cold"]:
+                cache.clear()
+            started = time.perf_counter()
+            response = request()
+            elapsed = time.perf_counter() - started
+            errors += response.status_code >= 400
+            return elapsed
+
+        with transaction.atomic():
+            for _ in range(options["warmup"]):
+                send()
+            samples = [send() for _ in range(options["requests"])]
+
+            # Counted and traced on separate requests, so neither skews the timings. Each request
+            # starts by clearing the query log, so the capture must start from an empty one.
+            reset_queries()
+            with CaptureQueriesContext(connection) as queries:
+                send()
+            query_count = len(queries)  # Read before the next request clears the log
+            tracemalloc.start()
+            try:
+                send()
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            transaction.set_rollback(True)
+
+        stats = summarize(samples)
+        stats.update(queries=query_count, peak_kib=round(peak / 1024, 1), errors=errors)
+        return stats
@@ -0,0 +1,76 @@
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+
+from users.authentication import tokens_for_user
+from users.benchmarks import summarize, time_calls
+from users.models import User
+from users.serializers import LoginSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark logins on one core: check an email and password the way LoginView does and "
+        "issue the tokens. Users are created with the chosen hasher inside a transaction that "
+        "is rolled back, so the database is left as it was."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hasher", choices=["pbkdf2", "scrypt", "argon2"], default=None,
+            help="Defaults to settings.PASSWORD_HASHER.",
+        )
+        parser.add_argument("--users", type=int, default=10)
+        parser.add_argument("--requests", type=int, default=50)
+        parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+
+    def handle(self, *args, **options):
+        hasher = options["hasher"] or settings.PASSWORD_HASHER
+        preferred = settings.PASSWORD_HASHER_CHOICES[hasher]
+        hashers = [preferred] + [path for path in settings.PASSWORD_HASHERS if path != preferred]
+        password = "benchmark-Password-1"
+
+        with override_settings(PASSWORD_HASHERS=hashers), transaction.atomic():
+            try:
+                users = [
+                    User.objects.create_user(
+                        username=f"benchmark-login-{i}", email=f"benchmark-login-{i}@example.com", password=password
+                    )
+                    for i in range(options["users"])
+                ]
+            except ValueError as exc:  # e.g. argon2-cffi isn't installed
+                raise CommandError(str(exc))
+            sent = iter(range(options["requests"] + 1))
+
+            def login():
+                user = users[next(sent) % len(users)]
+                serializer = LoginSerializer(data={"email": user.email, "password": password})
+                serializer.is_valid(raise_exception=True)
+                tokens_for_user(serializer.validated_data["user"])
+
+            login()  # Warm up
+            started = time.perf_counter()
+            samples = time_calls(login, options["requests"])
+            elapsed = time.perf_counter() - started
+            transaction.set_rollback(True)
+
+        results = {
+            "hasher": hasher,
+            "algorithm": users[0].password.split("$", 1)[0],
+            "logins_per_second": round(options["requests"] / elapsed, 1),
+            "login": summarize(samples),
+        }
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        stats = results["login"]
+        self.stdout.write(f"{hasher} ({results['algorithm']}): {results['logins_per_second']} logins/sec on one core")
+        self.stdout.write(
+            f"{stats['count']} logins: p50 {stats['p50_ms']} ms, p90 {stats['p90_ms']} ms, "
+            f"p99 {stats['p99_ms']} ms, max {stats['max_ms']} ms"
+        )
@@ -0,0 +1,76 @@
+import json
+import random
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from users.benchmarks import summarize, time_calls
+from users.recommendations import CandidateSet
+
+SPECIALIZATIONS = ["Corporate Law", "Family Law", "Criminal Law", "Property Law", "Tax Law", "Immigration"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark recommendation ranking on a synthetic city of N lawyers. The candidate set is "
+        "built in memory and stored in the configured cache, so each timed request does what "
+        "MatchLawyersView does on a warm cache: fetch the set, score it and pick the top k."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lawyers", type=int, default=100_000)
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--limit", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        center_lat, center_lng = 6.5244, 3.3792
+
+        rows = [
+            (
+                pk,
+                center_lat + rng.uniform(-0.4, 0.4) if rng.random() > 0.1 else None,
+                center_lng + rng.uniform(-0.4, 0.4),
+                rng.choice(SPECIALIZATIONS),
+                rng.randint(0, 40),
+                rng.uniform(1, 5),
+                rng.randint(0, 200),
+                rng.randint(0, 15),
+            )
+            for pk in range(1, options["lawyers"] + 1)
+        ]
+
+        started = time.perf_counter()
+        candidates = CandidateSet.from_rows(rows, "Corporate Law")
+        build_seconds = time.perf_counter() - started
+
+        key = "benchmark-recommendations"
+        cache.set(key, candidates, 600)
+
+        def request():
+            lat = center_lat + rng.uniform(-0.2, 0.2)
+            lng = center_lng + rng.uniform(-0.2, 0.2)
+            cache.get(key).rank(options["limit"], latitude=lat, longitude=lng, radius_km=25, min_rating=2)
+
+        request()  # Warm up
+        samples = time_calls(request, options["requests"])
+        cache.delete(key)
+
+        results = {
+            "lawyers": options["lawyers"],
+            "build_ms": round(build_seconds * 1000, 1),
+            "request": summarize(samples),
+        }
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        stats = results["request"]
+        self.stdout.write(f"Candidate set of {options['lawyers']} lawyers built in {results['build_ms']} ms")
+        self.stdout.write(
+            f"{stats['count']} requests: p50 {stats['p50_ms']} ms, p90 {stats['p90_ms']} ms, "
+            f"p99 {stats['p99_ms']} ms, max {stats['max_ms']} ms"
+        )
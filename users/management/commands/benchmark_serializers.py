@@ -0,0 +1,95 @@
+import json
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from users.compiled import FastJSONRenderer, compile_serializer
+from users.models import LawyerProfile, User
+from users.serializers import LawyerProfileSerializer
+
+SPECIALIZATIONS = ["Corporate Law", "Family Law", "Criminal Law", "Property Law", "Tax Law", "Immigration"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark serializing and rendering N lawyer rows the way LawyerListView used to "
+        "(model instances through LawyerProfileSerializer and JSONRenderer) against the compiled "
+        "path (.values() rows through users.compiled and FastJSONRenderer). The lawyers are "
+        "created inside a transaction that is rolled back, so the database is left as it was."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10_000)
+        parser.add_argument("--repeat", type=int, default=5, help="Runs per path, the best one counts.")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        rows = options["rows"]
+        serializer = LawyerProfileSerializer()
+        compiled = compile_serializer(LawyerProfileSerializer)
+
+        with transaction.atomic():
+            self.create_lawyers(rows, rng)
+            queryset = serializer.setup_eager_loading(LawyerProfile.objects.order_by("-experience", "-id"))
+
+            def drf():
+                return JSONRenderer().render(LawyerProfileSerializer(queryset.all(), many=True).data)
+
+            def fast():
+                return FastJSONRenderer().render(compiled.many(queryset.values(*compiled.columns)))
+
+            if drf() != fast():
+                raise CommandError("The compiled path rendered different bytes than the serializer.")
+            results = {"rows": rows}
+            for name, render in (("serializer", drf), ("compiled", fast)):
+                seconds = min(self.time(render) for _ in range(options["repeat"]))
+                results[name] = {"seconds": round(seconds, 4), "rows_per_second": round(rows / seconds)}
+            transaction.set_rollback(True)
+
+        results["speedup"] = round(results["compiled"]["rows_per_second"] / results["serializer"]["rows_per_second"], 2)
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for name in ("serializer", "compiled"):
+            self.stdout.write(f"{name}: {results[name]['rows_per_second']} rows/s ({results[name]['seconds']} s for {rows} rows)")
+        self.stdout.write(self.style.SUCCESS(f"Compiled path is {results['speedup']}x faster, same bytes."))
+
+    @staticmethod
+    def time(render):
+        started = time.perf_counter()
+        render()
+        return time.perf_counter() - started
+
+    @staticmethod
+    def create_lawyers(rows, rng):
+        password = make_password(None)
+        users = User.objects.bulk_create(
+            User(
+                username=f"benchmark-lawyer-{i}", email=f"benchmark-lawyer-{i}@example.com",
+                password=password, is_lawyer=True, is_verified=rng.random() < 0.7,
+            )
+            for i in range(rows)
+        )
+        LawyerProfile.objects.bulk_create(
+            LawyerProfile(
+                user=user,
+                specialization=rng.choice(SPECIALIZATIONS),
+                license_number=f"BENCH-{user.pk}",
+                verified=rng.random() < 0.7,
+                address=f"{rng.randint(1, 200)} Broad Street",
+                experience=rng.randint(0, 40),
+                location=rng.choice(["Ikeja", "Lekki", "Yaba", None]),
+                city="Lagos",
+                rating_count=rng.randint(0, 200),
+                rating_avg=round(rng.uniform(1, 5), 2),
+                latitude=6.5 + rng.uniform(-0.4, 0.4) if rng.random() > 0.1 else None,
+                longitude=3.4 + rng.uniform(-0.4, 0.4),
+            )
+            for user in users
+        )
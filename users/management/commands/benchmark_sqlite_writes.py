@@ -0,0 +1,106 @@
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from legal_platform.database import sqlite_tuning_options
+from users.benchmarks import summarize
+
+
+def _connect(path, tuned):
+    # Mirrors what Django's SQLite backend does with and without the tuning options
+    connection = sqlite3.connect(path, timeout=5, isolation_level=None)
+    options = sqlite_tuning_options() if tuned else {}
+    for pragma in options.get("init_command", "").split(";"):
+        if pragma.strip():
+            connection.execute(pragma)
+    return connection, f"BEGIN {options['transaction_mode']}" if tuned else "BEGIN"
+
+
+def _writer(path, tuned, transactions, lawyers, start_at, seed):
+    """Book random slots like book_slot() does: check the slot, then insert, in one transaction."""
+    rng = random.Random(seed)
+    connection, begin = _connect(path, tuned)
+    samples, failed = [], 0
+    time.sleep(max(0.0, start_at - time.time()))
+    for _ in range(transactions):
+        lawyer, slot = rng.randrange(lawyers), rng.randrange(1_000_000)
+        started = time.perf_counter()
+        try:
+            connection.execute(begin)
+            taken = connection.execute(
+                "SELECT 1 FROM booking WHERE lawyer_id = ? AND slot = ?", (lawyer, slot)
+            ).fetchone()
+            if not taken:
+                connection.execute("INSERT INTO booking (lawyer_id, slot, status) VALUES (?, ?, 'pending')", (lawyer, slot))
+            connection.execute("COMMIT")
+            samples.append(time.perf_counter() - started)
+        except sqlite3.OperationalError:  # database is locked
+            failed += 1
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+    connection.close()
+    return samples, failed
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark concurrent booking-style write transactions on a scratch SQLite file, with "
+        "the default SQLite settings and with SQLITE_TUNING's (WAL, synchronous=NORMAL, "
+        "busy_timeout, BEGIN IMMEDIATE). Reports committed and failed transactions per second."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=4)
+        parser.add_argument("--transactions", type=int, default=500, help="Per process.")
+        parser.add_argument("--lawyers", type=int, default=100)
+        parser.add_argument("--mode", choices=["default", "tuned", "both"], default="both")
+        parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+
+    def handle(self, *args, **options):
+        modes = ["default", "tuned"] if options["mode"] == "both" else [options["mode"]]
+        results = [self.run(mode == "tuned", options) | {"mode": mode} for mode in modes]
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for result in results:
+            stats = result["commit"]
+            self.stdout.write(
+                f"{result['mode']}: {result['committed']} committed, {result['failed']} failed "
+                f"(database is locked), {result['commits_per_second']} commits/s, "
+                f"p50 {stats['p50_ms']} ms, p99 {stats['p99_ms']} ms"
+            )
+
+    def run(self, tuned, options):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "bench.sqlite3")
+            connection, _ = _connect(path, tuned)
+            connection.execute(
+                "CREATE TABLE booking (id INTEGER PRIMARY KEY, lawyer_id INTEGER, slot INTEGER, status TEXT)"
+            )
+            connection.execute("CREATE INDEX booking_slot ON booking (lawyer_id, slot)")
+            connection.close()
+
+            start_at = time.time() + 0.5
+            with ProcessPoolExecutor(max_workers=options["processes"]) as pool:
+                futures = [
+                    pool.submit(_writer, path, tuned, options["transactions"], options["lawyers"], start_at, seed)
+                    for seed in range(options["processes"])
+                ]
+                outcomes = [future.result() for future in futures]
+            elapsed = time.time() - start_at
+
+        samples = [sample for outcome, _ in outcomes for sample in outcome]
+        return {
+            "processes": options["processes"],
+            "committed": len(samples),
+            "failed": sum(failed for _, failed in outcomes),
+            "commits_per_second": round(len(samples) / elapsed, 1),
+            "commit": summarize(samples),
+        }
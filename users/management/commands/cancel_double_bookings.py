@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from users.models import Booking, Consultation, User
+from users.notifications import notify
+
+# (model, the fields that make up a lawyer's slot, the client's and the lawyer's user id)
+SLOTS = (
+    (Booking, ('lawyer_id', 'appointment_date'), 'client_id', 'lawyer_id'),
+    (Consultation, ('lawyer_id', 'date', 'time'), 'client__user_id', 'lawyer__user_id'),
+)
+
+
+def double_bookings(model, slot, client, lawyer):
+    """Rows holding a slot an older row already holds, as (id, client user id, lawyer user id)."""
+    seen, duplicates = set(), []
+    rows = model.objects.exclude(status='canceled').order_by('created_at', 'id').values('id', client, lawyer, *slot)
+    for row in rows:
+        key = tuple(row[field] for field in slot)
+        if key in seen:
+            duplicates.append((row['id'], row[client], row[lawyer]))
+        seen.add(key)
+    return duplicates
+
+
+class Command(BaseCommand):
+    help = (
+        "Cancel the bookings and consultations that double-book a lawyer's slot, keeping the oldest, "
+        "and notify the client and the lawyer of each. Run it before migration 0016 when that "
+        "migration refuses to add the unique slot constraints."
+    )
+
+    def handle(self, *args, **options):
+        # Only reads and updates columns that exist before 0016, so it works on a database
+        # the migration stopped at
+        for model, slot, client, lawyer in SLOTS:
+            duplicates = double_bookings(model, slot, client, lawyer)
+            if not duplicates:
+                continue
+            users = User.objects.in_bulk({user_id for _, *parties in duplicates for user_id in parties})
+            name = model._meta.verbose_name
+            with transaction.atomic():
+                model.objects.filter(pk__in=[pk for pk, _, _ in duplicates]).update(status='canceled')
+                for pk, client_id, lawyer_id in duplicates:
+                    message = f"Your {name} #{pk} was canceled because the lawyer was already booked at that time."
+                    notify(users[client_id], message)
+                    notify(users[lawyer_id], message)
+                    self.stdout.write(f"Canceled {name} {pk} (client {client_id}, lawyer {lawyer_id}).")
+            self.stdout.write(self.style.SUCCESS(f"Canceled {len(duplicates)} {name}(s) that double-booked a slot."))
+        self.stdout.write("No double bookings left.")
@@ -0,0 +1,276 @@
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models import Q
+
+from users import geo
+from users.cache import invalidate_lawyers
+from users.models import ClientProfile, LawyerProfile, User
+from users.search import index_lawyers
+from users.signals import signals_suppressed
+
+PROFILE_FIELDS = ("address", "city", "latitude", "longitude")
+LAWYER_FIELDS = ("specialization", "license_number", "experience", "location")
+
+
+def _setup_worker():
+    # Workers started with "spawn" (macOS, Windows) don't inherit the configured apps
+    django.setup()
+
+
+def _hash(password):
+    return make_password(password)
+
+
+def read_rows(path, fmt):
+    """Yield (line number, row dict or None) from a CSV or JSON Lines file, one line at a time."""
+    with open(path, newline="", encoding="utf-8") as handle:
+        if fmt == "csv":
+            reader = csv.DictReader(handle)
+            for row in reader:
+                yield reader.line_num, row
+            return
+        for line_number, line in enumerate(handle, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield line_number, row if isinstance(row, dict) else None
+
+
+def _text(row, field, max_length=None):
+    value = row.get(field)
+    value = "" if value is None else str(value).strip()
+    if max_length is not None and len(value) > max_length:
+        raise ValidationError(f"{field} is longer than {max_length} characters.")
+    return value
+
+
+def _number(row, field, cast, minimum=None, maximum=None):
+    value = row.get(field)
+    if value is None or value == "":
+        return None
+    try:
+        value = cast(value)
+    except (TypeError, ValueError):
+        raise ValidationError(f"{field} must be a number.")
+    if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+        raise ValidationError(f"{field} must be between {minimum} and {maximum}.")
+    return value
+
+
+def clean_row(row):
+    """Validate one row on its own. Returns the cleaned fields, raises ValidationError."""
+    role = _text(row, "role").lower()
+    if role not in ("client", "lawyer"):
+        raise ValidationError("role must be client or lawyer.")
+
+    username = _text(row, "username", 150)
+    if not username:
+        raise ValidationError("username is required.")
+    User.username_validator(username)
+    email = _text(row, "email", 254)
+    validate_email(email)
+    email = User.objects.normalize_email(email)
+
+    cleaned = {
+        "role": role,
+        "username": username,
+        "email": email,
+        "password": str(row["password"]) if row.get("password") else None,
+        "address": _text(row, "address", 255),
+        "city": _text(row, "city", 100) or "Unknown",
+        "latitude": _number(row, "latitude", float, -90, 90),
+        "longitude": _number(row, "longitude", float, -180, 180),
+    }
+    if role == "lawyer":
+        cleaned.update(
+            specialization=_text(row, "specialization", 255),
+            license_number=_text(row, "license_number", 50),
+            experience=_number(row, "experience", int, 0) or 0,
+            location=_text(row, "location", 255) or None,
+        )
+        if not cleaned["license_number"]:
+            raise ValidationError("license_number is required for lawyers.")
+    return cleaned
+
+
+class Command(BaseCommand):
+    help = (
+        "Import clients and lawyers from a CSV or JSON Lines file. Rows are streamed and "
+        "validated in chunks, passwords are hashed in a process pool, and each chunk's users "
+        "and profiles are written with bulk_create in one transaction. Columns: role (client "
+        "or lawyer), username, email, password (optional, leaves the password unusable), "
+        "address, city, latitude, longitude and, for lawyers, specialization, license_number, "
+        "experience, location. Rejected rows are listed with their reason and never stop the import."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=["csv", "jsonl"], help="Defaults to the file extension.")
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument(
+            "--workers", type=int, default=os.cpu_count() or 1,
+            help="Processes hashing passwords. 0 hashes in this process.",
+        )
+        parser.add_argument("--rejects", help="Write rejected rows to this CSV file.")
+        parser.add_argument("--dry-run", action="store_true", help="Validate only, write nothing.")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or ("jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv")
+        if not os.path.exists(path):
+            raise CommandError(f"{path} does not exist.")
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be at least 1.")
+
+        self.seen = {"username": set(), "email": set(), "license_number": set()}
+        self.rejects = []
+        self.cities, self.specializations = set(), set()
+        imported = read = 0
+        started = time.perf_counter()
+
+        self.workers = options["workers"]
+        pool = None
+        if self.workers > 0 and not options["dry_run"]:
+            pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_setup_worker)
+        try:
+            rows = read_rows(path, fmt)
+            while True:
+                chunk = list(islice(rows, options["chunk_size"]))
+                if not chunk:
+                    break
+                read += len(chunk)
+                valid = self.validate_chunk(chunk)
+                if not options["dry_run"]:
+                    imported += self.write_chunk(valid, pool)
+                else:
+                    imported += len(valid)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f"{read} rows read, {imported} {'valid' if options['dry_run'] else 'imported'}, "
+                    f"{len(self.rejects)} rejected ({read / elapsed:.0f} rows/s)"
+                )
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        if imported and not options["dry_run"]:
+            invalidate_lawyers(self.cities, self.specializations)
+        self.report_rejects(options["rejects"])
+        verb = "Validated" if options["dry_run"] else "Imported"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {imported} of {read} row(s), {len(self.rejects)} rejected."))
+
+    def reject(self, line_number, row, reason):
+        self.rejects.append((line_number, row or {}, reason))
+
+    def validate_chunk(self, chunk):
+        """Clean the rows, then drop duplicates within the file and of existing rows (one query each)."""
+        cleaned = []
+        for line_number, row in chunk:
+            if row is None:
+                self.reject(line_number, row, "Not a JSON object.")
+                continue
+            try:
+                cleaned.append((line_number, row, clean_row(row)))
+            except ValidationError as exc:
+                self.reject(line_number, row, " ".join(exc.messages))
+
+        usernames = {data["username"] for _, _, data in cleaned}
+        emails = {data["email"] for _, _, data in cleaned}
+        licenses = {data["license_number"] for _, _, data in cleaned if data["role"] == "lawyer"}
+        taken = {"username": set(), "email": set(), "license_number": set()}
+        for username, email in User.objects.filter(Q(username__in=usernames) | Q(email__in=emails)).values_list(
+            "username", "email"
+        ):
+            taken["username"].add(username)
+            taken["email"].add(email)
+        taken["license_number"].update(
+            LawyerProfile.objects.filter(license_number__in=licenses).values_list("license_number", flat=True)
+        )
+
+        valid = []
+        for line_number, row, data in cleaned:
+            fields = ("username", "email", "license_number") if data["role"] == "lawyer" else ("username", "email")
+            clash = next((field for field in fields if data[field] in taken[field]), None)
+            if clash:
+                self.reject(line_number, row, f"{clash} already exists.")
+                continue
+            clash = next((field for field in fields if data[field] in self.seen[field]), None)
+            if clash:
+                self.reject(line_number, row, f"Duplicate {clash} in the file.")
+                continue
+            for field in fields:
+                self.seen[field].add(data[field])
+            valid.append(data)
+        return valid
+
+    def write_chunk(self, valid, pool):
+        if not valid:
+            return 0
+        passwords = [data["password"] for data in valid if data["password"]]
+        if pool is not None:
+            hashes = iter(pool.map(_hash, passwords, chunksize=max(1, len(passwords) // (self.workers * 4))))
+        else:
+            hashes = iter(map(_hash, passwords))
+
+        users = [
+            User(
+                username=data["username"],
+                email=data["email"],
+                password=next(hashes) if data["password"] else make_password(None),
+                is_client=data["role"] == "client",
+                is_lawyer=data["role"] == "lawyer",
+            )
+            for data in valid
+        ]
+
+        with transaction.atomic(), signals_suppressed():
+            User.objects.bulk_create(users)
+            clients, lawyers = [], []
+            for user, data in zip(users, valid):
+                profile = {field: data[field] for field in PROFILE_FIELDS}
+                if data["role"] == "client":
+                    clients.append(ClientProfile(user=user, **profile))
+                    continue
+                profile.update({field: data[field] for field in LAWYER_FIELDS})
+                if data["latitude"] is not None and data["longitude"] is not None:
+                    # save() isn't called, so fill in what it would
+                    profile["geohash"] = geo.encode(data["latitude"], data["longitude"])
+                lawyers.append(LawyerProfile(user=user, **profile))
+                self.cities.add(data["city"])
+                self.specializations.add(data["specialization"])
+            ClientProfile.objects.bulk_create(clients)
+            LawyerProfile.objects.bulk_create(lawyers)
+            index_lawyers(lawyer_ids=[lawyer.pk for lawyer in lawyers])
+        return len(users)
+
+    def report_rejects(self, path):
+        if not self.rejects:
+            return
+        self.rejects.sort(key=lambda reject: reject[0])
+        if path:
+            columns = sorted({key for _, row, _ in self.rejects for key in row if key != "password"})
+            with open(path, "w", newline="", encoding="utf-8") as handle:
+                writer = csv.writer(handle)
+                writer.writerow(["line", "reason"] + columns)
+                for line_number, row, reason in self.rejects:
+                    writer.writerow([line_number, reason] + [row.get(column, "") for column in columns])
+            self.stdout.write(f"Rejected rows written to {path}")
+            return
+        for line_number, _, reason in self.rejects[:20]:
+            self.stderr.write(f"Line {line_number}: {reason}")
+        if len(self.rejects) > 20:
+            self.stderr.write(f"... and {len(self.rejects) - 20} more, use --rejects to list them all.")
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.notifications import dispatch_pending
+
+
+class Command(BaseCommand):
+    help = (
+        "Deliver queued notifications from the outbox. Runs until interrupted, polling for "
+        "new rows every --interval seconds when the outbox is empty."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--interval", type=float, default=1.0, help="Seconds to sleep when idle.")
+        parser.add_argument("--once", action="store_true", help="Drain the outbox once and exit.")
+
+    def handle(self, *args, **options):
+        delivered = 0
+        try:
+            while True:
+                handled = dispatch_pending(options["batch_size"])
+                delivered += handled
+                if handled:
+                    self.stdout.write(f"Processed {handled} notification(s)")
+                    continue
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {delivered} notification(s) in total."))
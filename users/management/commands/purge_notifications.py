@@ -0,0 +1,43 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from users.models import Notification
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete read notifications older than --days in batches. Each batch is its own short "
+        "DELETE, so the job can run next to live traffic without holding long locks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=getattr(settings, "NOTIFICATION_RETENTION_DAYS", 90),
+            help="Keep read notifications newer than this many days.",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--pause", type=float, default=0.0, help="Seconds to sleep between batches.")
+        parser.add_argument("--dry-run", action="store_true", help="Only count what would be deleted.")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options["days"])
+        expired = Notification.objects.filter(is_read=True, created_at__lt=cutoff)
+
+        if options["dry_run"]:
+            self.stdout.write(f"{expired.count()} read notification(s) older than {options['days']} days.")
+            return
+
+        deleted = 0
+        while True:
+            ids = list(expired.order_by("created_at").values_list("id", flat=True)[:options["batch_size"]])
+            if not ids:
+                break
+            deleted += Notification.objects.filter(pk__in=ids).delete()[0]
+            if options["pause"]:
+                time.sleep(options["pause"])
+
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} read notification(s)."))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from users.cache import bump_versions, invalidate_lawyers, lawyer_profile_namespace
+from users.models import LawyerProfile
+
+
+class Command(BaseCommand):
+    help = "Recompute every lawyer's rating_count, rating_sum and rating_avg from the reviews table."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lawyer", type=int, action="append", dest="lawyers",
+            help="Only rebuild the given lawyer profile id (can be repeated).",
+        )
+
+    def handle(self, *args, **options):
+        queryset = LawyerProfile.objects.all()
+        if options["lawyers"]:
+            queryset = queryset.filter(pk__in=options["lawyers"])
+
+        with transaction.atomic():
+            updated = LawyerProfile.rebuild_ratings(queryset)
+
+        # Cached lists, matches and dashboards still show the old ratings
+        lawyers = list(queryset.values_list("pk", "city", "specialization"))
+        invalidate_lawyers({city for _, city, _ in lawyers}, {specialization for _, _, specialization in lawyers})
+        bump_versions(*(lawyer_profile_namespace(pk) for pk, _, _ in lawyers))
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rating aggregates for {updated} lawyer(s)."))
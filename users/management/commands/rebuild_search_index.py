@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from users.cache import invalidate_lawyers
+from users.search import get_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the lawyer full-text search index from the profile and user tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS, help="Database alias to rebuild.")
+
+    def handle(self, *args, **options):
+        backend = get_backend(connections[options["database"]])
+        if backend is None:
+            raise CommandError("This database has no full-text search support, lawyer search uses icontains.")
+
+        with transaction.atomic(using=options["database"]):
+            backend.create()
+            backend.reindex()
+        invalidate_lawyers()  # Cached search results came from the old index
+
+        self.stdout.write(self.style.SUCCESS("Lawyer search index rebuilt."))
@@ -0,0 +1,182 @@
+import random
+import time
+from datetime import datetime, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from users import geo
+from users.cache import invalidate_lawyers
+from users.models import Booking, ClientProfile, Consultation, LawyerProfile, Notification, Review, User
+from users.search import index_lawyers
+from users.signals import signals_suppressed
+
+CITIES = {
+    "Lagos": (6.5244, 3.3792),
+    "Abuja": (9.0765, 7.3986),
+    "Port Harcourt": (4.8156, 7.0498),
+    "Ibadan": (7.3775, 3.9470),
+    "Kano": (12.0022, 8.5920),
+}
+SPECIALIZATIONS = ["Corporate Law", "Family Law", "Criminal Law", "Property Law", "Tax Law", "Immigration"]
+STATUSES = ["pending", "confirmed", "canceled"]
+SLOTS_PER_DAY = 8  # 09:00 to 16:00
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed the database with synthetic clients, lawyers, bookings, consultations, reviews and "
+        "notifications for benchmarks and load tests. Rows are written with bulk_create, so it "
+        "takes seconds for tens of thousands of rows. Every seeded user's password is --password. "
+        "The same --seed gives the same data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=1000)
+        parser.add_argument("--lawyers", type=int, default=200)
+        parser.add_argument("--bookings", type=int, default=2000)
+        parser.add_argument("--consultations", type=int, default=2000)
+        parser.add_argument("--reviews", type=int, default=1000)
+        parser.add_argument("--notifications", type=int, default=5000)
+        parser.add_argument("--password", default="password123")
+        parser.add_argument("--prefix", default="seed", help="Usernames start with this, e.g. seed-lawyer-12.")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        if options["clients"] < 1 or options["lawyers"] < 1:
+            raise CommandError("--clients and --lawyers must be at least 1.")
+        prefix = options["prefix"]
+        if User.objects.filter(username__startswith=f"{prefix}-").exists():
+            raise CommandError(f"Users named {prefix}-* already exist, pick another --prefix.")
+
+        self.rng = random.Random(options["seed"])
+        self.password = make_password(options["password"])  # Hashed once for every user
+        started = time.perf_counter()
+
+        with transaction.atomic(), signals_suppressed():
+            clients = self.create_clients(prefix, options["clients"])
+            lawyers = self.create_lawyers(prefix, options["lawyers"])
+            bookings = self.create_bookings(clients, lawyers, options["bookings"])
+            # Consultations start the day after the last booking, so the two never clash
+            first_day = 2 + options["bookings"] // len(lawyers) // SLOTS_PER_DAY
+            consultations = self.create_consultations(clients, lawyers, options["consultations"], first_day)
+            reviews = self.create_reviews(clients, lawyers, options["reviews"])
+            notifications = self.create_notifications(clients + lawyers, options["notifications"])
+
+            profile_ids = [profile.pk for profile in lawyers]
+            LawyerProfile.rebuild_ratings(LawyerProfile.objects.filter(pk__in=profile_ids))
+            index_lawyers(lawyer_ids=profile_ids)
+        invalidate_lawyers({profile.city for profile in lawyers}, {profile.specialization for profile in lawyers})
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(clients)} clients, {len(lawyers)} lawyers, {bookings} bookings, "
+            f"{consultations} consultations, {reviews} reviews and {notifications} notifications "
+            f"in {time.perf_counter() - started:.1f}s."
+        ))
+
+    def place(self):
+        city = self.rng.choice(list(CITIES))
+        lat, lng = CITIES[city]
+        return city, lat + self.rng.uniform(-0.2, 0.2), lng + self.rng.uniform(-0.2, 0.2)
+
+    def create_users(self, prefix, role, count):
+        return User.objects.bulk_create(
+            (
+                User(
+                    username=f"{prefix}-{role}-{i}", email=f"{prefix}-{role}-{i}@example.com", password=self.password,
+                    is_client=role == "client", is_lawyer=role == "lawyer", is_verified=self.rng.random() < 0.8,
+                )
+                for i in range(count)
+            ),
+            batch_size=1000,
+        )
+
+    def create_clients(self, prefix, count):
+        profiles = []
+        for user in self.create_users(prefix, "client", count):
+            city, lat, lng = self.place()
+            profiles.append(ClientProfile(
+                user=user, address=f"{self.rng.randint(1, 300)} Market Road", city=city, latitude=lat, longitude=lng,
+            ))
+        return ClientProfile.objects.bulk_create(profiles, batch_size=1000)
+
+    def create_lawyers(self, prefix, count):
+        profiles = []
+        for user in self.create_users(prefix, "lawyer", count):
+            city, lat, lng = self.place()
+            profiles.append(LawyerProfile(
+                user=user,
+                specialization=self.rng.choice(SPECIALIZATIONS),
+                license_number=f"{prefix.upper()}-{user.pk}",
+                verified=self.rng.random() < 0.8,
+                address=f"{self.rng.randint(1, 300)} Broad Street",
+                experience=self.rng.randint(0, 40),
+                location=self.rng.choice(["Central", "North", "South", None]),
+                city=city,
+                latitude=lat,
+                longitude=lng,
+                geohash=geo.encode(lat, lng),  # save() isn't called
+            ))
+        return LawyerProfile.objects.bulk_create(profiles, batch_size=1000)
+
+    def slots(self, lawyers, count, first_day=1):
+        """(lawyer, day offset, hour) with no lawyer booked twice at the same time."""
+        for i in range(count):
+            slot = i // len(lawyers)
+            yield lawyers[i % len(lawyers)], first_day + slot // SLOTS_PER_DAY, 9 + slot % SLOTS_PER_DAY
+
+    def create_bookings(self, clients, lawyers, count):
+        today = timezone.localdate()
+        bookings = [
+            Booking(
+                client_id=self.rng.choice(clients).user_id,
+                lawyer_id=lawyer.user_id,
+                appointment_date=timezone.make_aware(datetime.combine(today + timedelta(days=day), datetime.min.time()))
+                + timedelta(hours=hour),
+                status=self.rng.choice(STATUSES),
+            )
+            for lawyer, day, hour in self.slots(lawyers, count)
+        ]
+        return len(Booking.objects.bulk_create(bookings, batch_size=1000))
+
+    def create_consultations(self, clients, lawyers, count, first_day):
+        today = timezone.localdate()
+        consultations = [
+            Consultation(
+                client=self.rng.choice(clients),
+                lawyer=lawyer,
+                date=today + timedelta(days=day),
+                time=datetime.min.time().replace(hour=hour),
+                status=self.rng.choice(STATUSES),
+                mode=self.rng.choice(["online", "in_person", "phone"]),
+            )
+            for lawyer, day, hour in self.slots(lawyers, count, first_day)
+        ]
+        return len(Consultation.objects.bulk_create(consultations, batch_size=1000))
+
+    def create_reviews(self, clients, lawyers, count):
+        # Client c reviews lawyers c, c+1, ... so no pair repeats
+        count = min(count, len(clients) * len(lawyers))
+        reviews = [
+            Review(
+                client=clients[i % len(clients)],
+                lawyer=lawyers[(i % len(clients) + i // len(clients)) % len(lawyers)],
+                rating=self.rng.choices([1, 2, 3, 4, 5], weights=[1, 1, 3, 5, 6])[0],
+                comment=self.rng.choice(["", "Very helpful.", "Clear advice, would book again."]),
+            )
+            for i in range(count)
+        ]
+        return len(Review.objects.bulk_create(reviews, batch_size=1000))
+
+    def create_notifications(self, profiles, count):
+        notifications = [
+            Notification(
+                recipient_id=self.rng.choice(profiles).user_id,
+                message="Your consultation has been confirmed.",
+                is_read=self.rng.random() < 0.6,
+            )
+            for _ in range(count)
+        ]
+        return len(Notification.objects.bulk_create(notifications, batch_size=1000))
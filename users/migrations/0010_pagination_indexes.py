@@ -0,0 +1,41 @@
+# Generated by Django 5.1.7 on 2026-10-17 11:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0009_review'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['client', 'created_at', 'id'], name='booking_client_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['lawyer', 'created_at', 'id'], name='booking_lawyer_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consultation',
+            index=models.Index(fields=['created_at', 'id'], name='consultation_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lawyerprofile',
+            index=models.Index(fields=['experience', 'id'], name='lawyer_experience_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lawyerprofile',
+            index=models.Index(fields=['specialization', 'id'], name='lawyer_specialization_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['recipient', 'created_at', 'id'], name='notification_recipient_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['created_at', 'id'], name='review_created_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.1.7 on 2026-10-17 11:32
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_ratings(apps, schema_editor):
+    LawyerProfile = apps.get_model('users', 'LawyerProfile')
+    Review = apps.get_model('users', 'Review')
+
+    reviews = Review.objects.filter(lawyer=OuterRef('pk')).order_by().values('lawyer')
+    LawyerProfile.objects.update(
+        rating_count=Coalesce(Subquery(reviews.annotate(n=Count('id')).values('n')), 0),
+        rating_sum=Coalesce(Subquery(reviews.annotate(total=Sum('rating')).values('total')), 0),
+    )
+    for lawyer in LawyerProfile.objects.filter(rating_count__gt=0).only('rating_count', 'rating_sum'):
+        lawyer.rating_avg = lawyer.rating_sum / lawyer.rating_count
+        lawyer.save(update_fields=['rating_avg'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0010_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lawyerprofile',
+            name='rating_avg',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='lawyerprofile',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='lawyerprofile',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='lawyerprofile',
+            index=models.Index(fields=['rating_avg', 'id'], name='lawyer_rating_avg_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lawyerprofile',
+            index=models.Index(fields=['rating_count', 'id'], name='lawyer_rating_count_idx'),
+        ),
+        migrations.RunPython(backfill_ratings, migrations.RunPython.noop),
+    ]
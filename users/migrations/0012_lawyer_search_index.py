@@ -0,0 +1,68 @@
+from django.db import DatabaseError, migrations
+
+# The search index as it stood at this migration. The DDL is spelled out here rather than
+# taken from users/search.py, so later changes there don't alter what this migration does.
+SQLITE_CREATE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS users_lawyer_search "
+    "USING fts5(username, specialization, location, city, address, prefix='2 3')"
+)
+SQLITE_FILL = (
+    "INSERT INTO users_lawyer_search (rowid, username, specialization, location, city, address) "
+    "SELECT lp.id, u.username, lp.specialization, COALESCE(lp.location, ''), lp.city, lp.address "
+    "FROM users_lawyerprofile lp INNER JOIN users_user u ON u.id = lp.user_id"
+)
+POSTGRES_CREATE = (
+    "CREATE TABLE IF NOT EXISTS users_lawyer_search ("
+    "lawyer_id bigint PRIMARY KEY REFERENCES users_lawyerprofile (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+    "document tsvector NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS users_lawyer_search_document_gin ON users_lawyer_search USING gin (document)",
+)
+POSTGRES_FILL = (
+    "INSERT INTO users_lawyer_search (lawyer_id, document) SELECT lp.id, "
+    "setweight(to_tsvector('simple', u.username), 'A') || "
+    "setweight(to_tsvector('simple', lp.specialization), 'A') || "
+    "setweight(to_tsvector('simple', COALESCE(lp.location, '')), 'B') || "
+    "setweight(to_tsvector('simple', lp.city), 'B') || "
+    "setweight(to_tsvector('simple', lp.address), 'C') "
+    "FROM users_lawyerprofile lp INNER JOIN users_user u ON u.id = lp.user_id"
+)
+
+
+def _statements(connection):
+    """(create, fill) statements for this database, or None when it has no full-text search."""
+    if connection.vendor == 'postgresql':
+        return POSTGRES_CREATE, POSTGRES_FILL
+    if connection.vendor != 'sqlite':
+        return None
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute('CREATE VIRTUAL TABLE temp.users_fts5_probe USING fts5(x)')
+            cursor.execute('DROP TABLE temp.users_fts5_probe')
+        except DatabaseError:
+            return None
+    return (SQLITE_CREATE,), SQLITE_FILL
+
+
+def create_search_index(apps, schema_editor):
+    statements = _statements(schema_editor.connection)
+    if statements is not None:
+        create, fill = statements
+        for statement in create:
+            schema_editor.execute(statement)
+        schema_editor.execute(fill)
+
+
+def drop_search_index(apps, schema_editor):
+    if _statements(schema_editor.connection) is not None:
+        schema_editor.execute('DROP TABLE IF EXISTS users_lawyer_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0011_lawyerprofile_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
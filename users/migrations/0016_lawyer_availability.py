@@ -0,0 +1,97 @@
+# Generated by Django 5.1.7 on 2026-10-17 11:44
+
+import django.core.validators
+import django.db.models.deletion
+from django.core.management.base import CommandError
+from django.db import migrations, models
+
+
+def check_double_bookings(apps, schema_editor):
+    # Existing data may already hold the same slot twice, which the unique constraints below
+    # would reject. Stop with the ids rather than cancel anyone's appointment behind their back.
+    conflicts = []
+    for model_name, slot in (('Booking', ('lawyer_id', 'appointment_date')), ('Consultation', ('lawyer_id', 'date', 'time'))):
+        model = apps.get_model('users', model_name)
+        seen, duplicates = set(), []
+        for row in model.objects.exclude(status='canceled').order_by('created_at', 'id').values('id', *slot):
+            key = tuple(row[field] for field in slot)
+            if key in seen:
+                duplicates.append(row['id'])
+            seen.add(key)
+        if duplicates:
+            conflicts.append(f"{model_name} {', '.join(map(str, duplicates))}")
+    if conflicts:
+        raise CommandError(
+            "These rows double-book a lawyer's slot that an older row holds: " + '; '.join(conflicts) + ". "
+            "Move or cancel them, or run `manage.py cancel_double_bookings` to cancel them and notify "
+            "the people affected, then migrate again."
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0015_notification_partial_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlackoutDate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('reason', models.CharField(blank=True, max_length=255)),
+            ],
+            options={
+                'ordering': ['date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='WorkingHours',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.PositiveSmallIntegerField(choices=[(0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'), (4, 'Friday'), (5, 'Saturday'), (6, 'Sunday')])),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+            ],
+            options={
+                'ordering': ['weekday', 'start_time'],
+            },
+        ),
+        migrations.AddField(
+            model_name='lawyerprofile',
+            name='slot_minutes',
+            field=models.PositiveSmallIntegerField(default=60, validators=[django.core.validators.MinValueValidator(5), django.core.validators.MaxValueValidator(480)]),
+        ),
+        migrations.RunPython(check_double_bookings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='booking',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'canceled'), _negated=True), fields=('lawyer', 'appointment_date'), name='booking_lawyer_slot_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='consultation',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'canceled'), _negated=True), fields=('lawyer', 'date', 'time'), name='consultation_lawyer_slot_unique'),
+        ),
+        migrations.AddField(
+            model_name='blackoutdate',
+            name='lawyer',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='blackout_dates', to='users.lawyerprofile'),
+        ),
+        migrations.AddField(
+            model_name='workinghours',
+            name='lawyer',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='working_hours', to='users.lawyerprofile'),
+        ),
+        migrations.AddConstraint(
+            model_name='blackoutdate',
+            constraint=models.UniqueConstraint(fields=('lawyer', 'date'), name='blackout_lawyer_date_unique'),
+        ),
+        migrations.AddIndex(
+            model_name='workinghours',
+            index=models.Index(fields=['lawyer', 'weekday'], name='working_hours_lawyer_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='workinghours',
+            constraint=models.CheckConstraint(condition=models.Q(('start_time__lt', models.F('end_time'))), name='working_hours_start_before_end'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-17 11:59
+
+from django.db import migrations, models
+
+
+def blank_licenses_to_null(apps, schema_editor):
+    apps.get_model('users', 'LawyerProfile').objects.filter(license_number='').update(license_number=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0017_updated_at_tracking'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='lawyerprofile',
+            name='license_number',
+            field=models.CharField(blank=True, max_length=50, null=True, unique=True),
+        ),
+        migrations.RunPython(blank_licenses_to_null, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.7 on 2026-10-17 12:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0018_lawyer_license_nullable'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='consultation',
+            index=models.Index(fields=['client', 'created_at', 'id'], name='consult_client_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consultation',
+            index=models.Index(fields=['lawyer', 'created_at', 'id'], name='consult_lawyer_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consultation',
+            index=models.Index(fields=['client', 'updated_at'], name='consult_client_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consultation',
+            index=models.Index(fields=['lawyer', 'updated_at'], name='consult_lawyer_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lawyerprofile',
+            index=models.Index(condition=models.Q(('verified', True)), fields=['city'], name='lawyer_verified_city_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lawyerprofile',
+            index=models.Index(fields=['location', 'experience', 'id'], name='lawyer_location_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lawyerprofile',
+            index=models.Index(fields=['updated_at'], name='lawyer_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['lawyer', 'created_at', 'id'], name='review_lawyer_created_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.7 on 2026-10-17 12:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0019_query_pattern_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='consultation',
+            index=models.Index(fields=['client', 'date', 'id'], name='consult_client_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consultation',
+            index=models.Index(fields=['lawyer', 'date', 'id'], name='consult_lawyer_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['client', 'created_at', 'id'], name='review_client_created_idx'),
+        ),
+    ]
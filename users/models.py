@@ -1,7 +1,10 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models import Case, Count, F, FloatField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Now
 from django.utils.timezone import now
 from django.core.validators import MinValueValidator, MaxValueValidator
+from . import geo
 
 
 
@@ -16,10 +19,23 @@ class User(AbstractUser):
     def __str__(self):
         return self.username
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Remember what was loaded so signal handlers can see what a save changed
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+LATITUDE_VALIDATORS = [MinValueValidator(-90), MaxValueValidator(90)]
+LONGITUDE_VALIDATORS = [MinValueValidator(-180), MaxValueValidator(180)]
+
+
 class ClientProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     address = models.CharField(max_length=255)
     city = models.CharField(max_length=100,  default="Unknown")
+    latitude = models.FloatField(blank=True, null=True, validators=LATITUDE_VALIDATORS)
+    longitude = models.FloatField(blank=True, null=True, validators=LONGITUDE_VALIDATORS)
 
     def __str__(self):
         return self.user.username
@@ -27,17 +43,161 @@ class ClientProfile(models.Model):
 class LawyerProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE,  related_name="lawyer_profile")
     specialization = models.CharField(max_length=255)
-    license_number = models.CharField(max_length=50, unique=True)  
+    # NULL until the lawyer fills it in, so profiles created at registration don't collide
+    license_number = models.CharField(max_length=50, unique=True, null=True, blank=True)
     verified = models.BooleanField(default=False)
     address = models.CharField(max_length=255)
     experience = models.IntegerField(default=0)
     location = models.CharField(max_length=255, blank=True, null=True)
     city = models.CharField(max_length=100,  default="Unknown")
 
+    # Denormalized from Review so listings can sort and filter by rating without a GROUP BY
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_avg = models.FloatField(default=0)
+
+    latitude = models.FloatField(blank=True, null=True, validators=LATITUDE_VALIDATORS)
+    longitude = models.FloatField(blank=True, null=True, validators=LONGITUDE_VALIDATORS)
+    geohash = models.CharField(max_length=12, blank=True, default='', editable=False)
+
+    # Length of one booking or consultation, see WorkingHours for when slots start
+    slot_minutes = models.PositiveSmallIntegerField(
+        default=60, validators=[MinValueValidator(5), MaxValueValidator(480)]
+    )
+    updated_at = models.DateTimeField(auto_now=True)  # Feeds the lawyer list ETag
+
+    class Meta:
+        indexes = [
+            # Keyset pagination keys for the lawyer list orderings
+            models.Index(fields=['experience', 'id'], name='lawyer_experience_idx'),
+            models.Index(fields=['specialization', 'id'], name='lawyer_specialization_idx'),
+            models.Index(fields=['rating_avg', 'id'], name='lawyer_rating_avg_idx'),
+            models.Index(fields=['rating_count', 'id'], name='lawyer_rating_count_idx'),
+            # Radius matching scans geohash ranges among verified lawyers
+            models.Index(fields=['verified', 'geohash'], name='lawyer_verified_geohash_idx'),
+            # Matching loads the verified lawyers of one city
+            models.Index(fields=['city'], condition=Q(verified=True), name='lawyer_verified_city_idx'),
+            # ?location= filter under the default -experience ordering
+            models.Index(fields=['location', 'experience', 'id'], name='lawyer_location_idx'),
+            # The list ETag aggregates max(updated_at) over every lawyer, this keeps it off the table
+            models.Index(fields=['updated_at'], name='lawyer_updated_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.specialization}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Remember what was loaded so signal handlers can see what a save changed
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        """Keep the geohash in step with the coordinates."""
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = geo.encode(self.latitude, self.longitude)
+        else:
+            self.geohash = ''
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields) | {'updated_at'}
+            if {'latitude', 'longitude'} & update_fields:
+                update_fields.add('geohash')
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+
+        # post_save handlers have seen the old values, what's in the row now is the new baseline
+        self._loaded_values = {
+            field.attname: self.__dict__[field.attname]
+            for field in self._meta.concrete_fields
+            if field.attname in self.__dict__
+        }
+
+    @classmethod
+    def adjust_rating(cls, lawyer_id, count_delta, sum_delta):
+        """
+        Apply a review change to the stored aggregates in a single UPDATE, so
+        concurrent reviews can't overwrite each other's counts.
+        """
+        new_count = F('rating_count') + count_delta
+        new_sum = F('rating_sum') + sum_delta
+        cls.objects.filter(pk=lawyer_id).update(
+            updated_at=Now(),
+            rating_count=new_count,
+            rating_sum=new_sum,
+            rating_avg=Case(
+                When(rating_count__gt=-count_delta, then=Cast(new_sum, FloatField()) / Cast(new_count, FloatField())),
+                default=Value(0.0),
+                output_field=FloatField(),
+            ),
+        )
+
+    @classmethod
+    def rebuild_ratings(cls, queryset=None):
+        """Recompute the aggregates from the Review table, e.g. after a bulk import."""
+        reviews = Review.objects.filter(lawyer=OuterRef('pk')).order_by().values('lawyer')
+        review_count = Coalesce(Subquery(reviews.annotate(n=Count('id')).values('n')), 0)
+        review_sum = Coalesce(Subquery(reviews.annotate(total=Sum('rating')).values('total')), 0)
+
+        queryset = cls.objects.all() if queryset is None else queryset
+        queryset.update(rating_count=review_count, rating_sum=review_sum, updated_at=Now())
+        return queryset.update(
+            rating_avg=Case(
+                When(rating_count__gt=0, then=Cast(F('rating_sum'), FloatField()) / Cast(F('rating_count'), FloatField())),
+                default=Value(0.0),
+                output_field=FloatField(),
+            )
+        )
    
 
+class WorkingHours(models.Model):
+    """A weekly window in which a lawyer takes bookings, cut into slots of slot_minutes."""
+    WEEKDAY_CHOICES = [
+        (0, 'Monday'),
+        (1, 'Tuesday'),
+        (2, 'Wednesday'),
+        (3, 'Thursday'),
+        (4, 'Friday'),
+        (5, 'Saturday'),
+        (6, 'Sunday'),
+    ]
+
+    lawyer = models.ForeignKey(LawyerProfile, on_delete=models.CASCADE, related_name='working_hours')
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+
+    class Meta:
+        ordering = ['weekday', 'start_time']
+        indexes = [
+            models.Index(fields=['lawyer', 'weekday'], name='working_hours_lawyer_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(condition=Q(start_time__lt=F('end_time')), name='working_hours_start_before_end'),
+        ]
+
+    def __str__(self):
+        return f"{self.lawyer.user.username}: {self.get_weekday_display()} {self.start_time}-{self.end_time}"
+
+
+class BlackoutDate(models.Model):
+    """A day a lawyer takes no bookings, whatever their working hours say."""
+    lawyer = models.ForeignKey(LawyerProfile, on_delete=models.CASCADE, related_name='blackout_dates')
+    date = models.DateField()
+    reason = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        ordering = ['date']
+        constraints = [
+            models.UniqueConstraint(fields=['lawyer', 'date'], name='blackout_lawyer_date_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.lawyer.user.username} unavailable on {self.date}"
+
+
 class Booking(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -50,6 +210,22 @@ class Booking(models.Model):
     appointment_date = models.DateTimeField()
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['client', 'created_at', 'id'], name='booking_client_created_idx'),
+            models.Index(fields=['lawyer', 'created_at', 'id'], name='booking_lawyer_created_idx'),
+            # Conditional GET reads max(updated_at) and the count of a user's bookings from these alone
+            models.Index(fields=['client', 'updated_at'], name='booking_client_updated_idx'),
+            models.Index(fields=['lawyer', 'updated_at'], name='booking_lawyer_updated_idx'),
+        ]
+        constraints = [
+            # Backstop for users.availability: a lawyer can't hold two live bookings at the same time
+            models.UniqueConstraint(
+                fields=['lawyer', 'appointment_date'], condition=~Q(status='canceled'), name='booking_lawyer_slot_unique'
+            ),
+        ]
 
     def __str__(self):
         return f"Booking by {self.client} with {self.lawyer} on {self.appointment_date}"
@@ -82,6 +258,22 @@ class Consultation(models.Model):
 
     class Meta:
         ordering = ['-created_at']  # Show newest consultations first
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='consultation_created_idx'),
+            # Each side lists its own consultations newest first, and checks them for ETags
+            models.Index(fields=['client', 'created_at', 'id'], name='consult_client_created_idx'),
+            models.Index(fields=['lawyer', 'created_at', 'id'], name='consult_lawyer_created_idx'),
+            models.Index(fields=['client', 'updated_at'], name='consult_client_updated_idx'),
+            models.Index(fields=['lawyer', 'updated_at'], name='consult_lawyer_updated_idx'),
+            # ?ordering=date and date windows
+            models.Index(fields=['client', 'date', 'id'], name='consult_client_date_idx'),
+            models.Index(fields=['lawyer', 'date', 'id'], name='consult_lawyer_date_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['lawyer', 'date', 'time'], condition=~Q(status='canceled'), name='consultation_lawyer_slot_unique'
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         """Prevent scheduling past consultations."""
@@ -93,11 +285,56 @@ class Notification(models.Model):
     recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name="notifications")
     message = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     is_read = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['recipient', 'created_at', 'id'], name='notification_recipient_idx'),
+            models.Index(fields=['recipient', 'updated_at'], name='notification_updated_idx'),
+            # Partial indexes stay small: unread rows for the badge count, read rows for retention
+            models.Index(fields=['recipient', 'id'], condition=Q(is_read=False), name='notification_unread_idx'),
+            models.Index(fields=['created_at'], condition=Q(is_read=True), name='notification_read_idx'),
+        ]
+
     def __str__(self):
         return f"Notification for {self.recipient.username}: {self.message[:30]}"
 
+class OutboxMessage(models.Model):
+    """
+    A notification waiting to be delivered by the process_notifications worker.
+
+    `channels` holds the channels still to deliver to, comma separated. Each channel is
+    removed once it succeeds, so a retry never repeats a delivery that already worked.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name="outbox_messages")
+    message = models.TextField()
+    channels = models.CharField(max_length=255)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    # When a pending row may next be tried, or when a worker's claim on it expires
+    available_at = models.DateTimeField(default=now)
+    claim_token = models.CharField(max_length=32, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'available_at', 'id'], name='outbox_due_idx'),
+            models.Index(fields=['claim_token'], name='outbox_claim_idx'),
+        ]
+
+    def __str__(self):
+        return f"Outbox #{self.pk} for {self.recipient_id} ({self.status})"
+
 class Review(models.Model):
     client = models.ForeignKey(ClientProfile, on_delete=models.CASCADE, related_name="reviews")
     lawyer = models.ForeignKey(LawyerProfile, on_delete=models.CASCADE, related_name="reviews")
@@ -107,6 +344,11 @@ class Review(models.Model):
 
     class Meta:
         unique_together = ('client', 'lawyer')  # A client can only review a lawyer once
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='review_created_idx'),
+            models.Index(fields=['lawyer', 'created_at', 'id'], name='review_lawyer_created_idx'),
+            models.Index(fields=['client', 'created_at', 'id'], name='review_client_created_idx'),
+        ]
 
     def __str__(self):
         return f"Review by {self.client.user.username} for {self.lawyer.user.username}"
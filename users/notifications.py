@@ -0,0 +1,171 @@
+"""
+Notification dispatch.
+
+Views call notify(), which only writes an OutboxMessage row in the request's own
+transaction. The process_notifications worker claims due rows in batches and hands
+each batch to every channel the rows are addressed to, so in-app rows are written with
+one bulk_create and emails go out over one connection.
+
+Channels are configured in settings.NOTIFICATION_CHANNELS as {name: dotted path};
+settings.NOTIFICATION_DEFAULT_CHANNELS picks the ones notify() uses by default.
+A channel is any class with a `send(messages)` method taking a list of OutboxMessage
+rows (with `recipient` loaded) that raises if the batch could not be delivered.
+"""
+import json
+import logging
+import uuid
+from datetime import timedelta
+from urllib import request as urllib_request
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Notification, OutboxMessage
+from .realtime import publish
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHANNELS = {
+    'in_app': 'users.notifications.InAppChannel',
+    'email': 'users.notifications.EmailChannel',
+    'webhook': 'users.notifications.WebhookChannel',
+}
+MAX_ATTEMPTS = 5
+CLAIM_TIMEOUT = timedelta(minutes=5)  # A crashed worker's rows become due again after this
+
+
+class InAppChannel:
+    """Creates the Notification rows shown by NotificationListView."""
+
+    def send(self, messages):
+        Notification.objects.bulk_create(
+            Notification(recipient_id=message.recipient_id, message=message.message)
+            for message in messages
+        )
+        # bulk_create skips post_save, so wake the recipients' streams here
+        publish(message.recipient_id for message in messages)
+
+
+class EmailChannel:
+    """Sends through EMAIL_BACKEND (console by default) over a single connection."""
+    subject = 'Legal Platform notification'
+
+    def send(self, messages):
+        emails = [
+            EmailMessage(self.subject, message.message, to=[message.recipient.email])
+            for message in messages
+            if message.recipient.email
+        ]
+        if emails:
+            with get_connection() as connection:
+                connection.send_messages(emails)
+
+
+class WebhookChannel:
+    """POSTs the batch as a JSON list to NOTIFICATION_WEBHOOK_URL."""
+    timeout = 10
+
+    def send(self, messages):
+        url = getattr(settings, 'NOTIFICATION_WEBHOOK_URL', '')
+        if not url:
+            return
+        payload = json.dumps([
+            {
+                'id': message.pk,
+                'recipient': message.recipient_id,
+                'message': message.message,
+                'created_at': message.created_at.isoformat(),
+            }
+            for message in messages
+        ]).encode('utf-8')
+        webhook = urllib_request.Request(
+            url, data=payload, headers={'Content-Type': 'application/json'}, method='POST'
+        )
+        with urllib_request.urlopen(webhook, timeout=self.timeout):
+            pass
+
+
+def get_channel(name):
+    paths = {**DEFAULT_CHANNELS, **getattr(settings, 'NOTIFICATION_CHANNELS', {})}
+    return import_string(paths[name])()
+
+
+def notify(recipient, message, channels=None):
+    """Queue a notification for delivery off the request path."""
+    channels = channels or getattr(settings, 'NOTIFICATION_DEFAULT_CHANNELS', ['in_app'])
+    return OutboxMessage.objects.create(
+        recipient=recipient, message=message, channels=','.join(channels)
+    )
+
+
+def claim_batch(batch_size):
+    """
+    Mark up to batch_size due rows as ours and return them.
+
+    The claim is a conditional UPDATE tagged with a fresh token, so two workers can
+    never both take the same row, even on databases without SELECT ... SKIP LOCKED.
+    """
+    now = timezone.now()
+    due = Q(status__in=['pending', 'processing'], available_at__lte=now)
+    token = uuid.uuid4().hex
+
+    with transaction.atomic():
+        ids = list(OutboxMessage.objects.filter(due).order_by('available_at', 'id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return []
+        OutboxMessage.objects.filter(due, pk__in=ids).update(
+            status='processing', claim_token=token, available_at=now + CLAIM_TIMEOUT
+        )
+    return list(OutboxMessage.objects.filter(claim_token=token).select_related('recipient').order_by('id'))
+
+
+def deliver(messages):
+    """Send claimed rows through their channels and record the outcome."""
+    now = timezone.now()
+    pending = {message.pk: set(filter(None, message.channels.split(','))) for message in messages}
+    errors = {}
+
+    channel_names = sorted(set().union(*pending.values())) if pending else []
+    for name in channel_names:
+        batch = [message for message in messages if name in pending[message.pk]]
+        try:
+            get_channel(name).send(batch)
+        except Exception as exc:
+            logger.exception('Notification channel %s failed for %d message(s)', name, len(batch))
+            for message in batch:
+                errors[message.pk] = f'{name}: {exc}'
+        else:
+            for message in batch:
+                pending[message.pk].discard(name)
+
+    for message in messages:
+        message.channels = ','.join(sorted(pending[message.pk]))
+        message.claim_token = ''
+        if not pending[message.pk]:
+            message.status, message.processed_at, message.last_error = 'sent', now, ''
+            continue
+
+        message.attempts += 1
+        message.last_error = errors.get(message.pk, '')
+        if message.attempts >= MAX_ATTEMPTS:
+            message.status, message.processed_at = 'failed', now
+        else:
+            # Exponential backoff: 30s, 1m, 2m, 4m ...
+            message.status = 'pending'
+            message.available_at = now + timedelta(seconds=30 * 2 ** (message.attempts - 1))
+
+    OutboxMessage.objects.bulk_update(
+        messages, ['channels', 'claim_token', 'status', 'processed_at', 'attempts', 'last_error', 'available_at']
+    )
+
+
+def dispatch_pending(batch_size=100):
+    """Deliver one batch of due notifications, returning how many rows were handled."""
+    messages = claim_batch(batch_size)
+    if messages:
+        deliver(messages)
+    return len(messages)
@@ -0,0 +1,198 @@
+import datetime
+import decimal
+import json
+import uuid
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination over a composite key such as (created_at, id) or (experience, id).
+
+    DRF's CursorPagination only filters on the first ordering field and falls back to
+    an OFFSET for ties. Here the cursor carries the full key of the boundary row and the
+    next page is fetched with a row-value comparison against it, so with a matching
+    index every page costs the same as the first one.
+
+    The ordering comes from the view's OrderingFilter, then the queryset's own order_by,
+    then `view.ordering`, then the model's Meta.ordering. The primary key is always
+    appended as the tie-breaker, so ordering fields only need to be non-null.
+    """
+    ordering = ('-created_at',)
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor['reverse']
+
+        ordering = [_flip(field) for field in self.ordering] if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if self.cursor is not None:
+            key = self._clean_key(queryset.model, self.cursor['key'])
+            queryset = queryset.filter(self._after(key, ordering))
+
+        # Fetch one extra row to know whether there is anything beyond this page
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if reverse:
+            self.page.reverse()
+
+        if reverse:
+            self.has_next = self.cursor is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.cursor is not None
+        return self.page
+
+    def get_ordering(self, request, queryset, view):
+        ordering = None
+
+        ordering_filters = [
+            filter_cls for filter_cls in getattr(view, 'filter_backends', [])
+            if hasattr(filter_cls, 'get_ordering')
+        ]
+        if ordering_filters:
+            ordering = ordering_filters[0]().get_ordering(request, queryset, view)
+
+        ordering = (
+            ordering
+            or queryset.query.order_by
+            or getattr(view, 'ordering', None)
+            or queryset.model._meta.ordering
+            or self.ordering
+        )
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+
+        ordering = [field for field in ordering if isinstance(field, str)]
+        pk_name = queryset.model._meta.pk.name
+        if not any(field.lstrip('-') in ('pk', pk_name) for field in ordering):
+            descending = bool(ordering) and ordering[0].startswith('-')
+            ordering.append(f'-{pk_name}' if descending else pk_name)
+        return tuple(ordering)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self._key(self.page[-1]), reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self._key(self.page[0]), reverse=True)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            token = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            cursor = {'key': list(token['k']), 'reverse': bool(token.get('r'))}
+            ordering = token['o']
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+        # A cursor is only meaningful for the ordering it was issued under
+        if ordering != list(self.ordering) or len(cursor['key']) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def _clean_key(self, model, key):
+        """The cursor's key as values of the ordering fields. Cursors come from clients, so may be forged."""
+        try:
+            key = [_to_python(model, field.lstrip('-'), value) for field, value in zip(self.ordering, key)]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        if None in key:
+            raise NotFound(self.invalid_cursor_message)
+        return key
+
+    def encode_cursor(self, key, reverse=False):
+        token = {'k': key, 'o': list(self.ordering)}
+        if reverse:
+            token['r'] = 1
+        payload = json.dumps(token, cls=CursorEncoder, separators=(',', ':'))
+        encoded = urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def _key(self, row):
+        return [_get_value(row, field.lstrip('-')) for field in self.ordering]
+
+    @staticmethod
+    def _after(key, ordering):
+        """
+        Rows strictly after `key` in `ordering`:
+        a >= x AND ((a > x) OR (a = x AND b > y) OR (a = x AND b = y AND c > z) ...)
+
+        The redundant leading bound lets the database seek into an index on (a, b, ...)
+        instead of evaluating the OR-chain row by row.
+        """
+        first = ordering[0]
+        bound = Q(**{f"{first.lstrip('-')}__{'lte' if first.startswith('-') else 'gte'}": key[0]})
+
+        clauses = []
+        for position, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            equal = {f.lstrip('-'): value for f, value in zip(ordering[:position], key)}
+            clauses.append(Q(**equal, **{f'{name}__{lookup}': key[position]}))
+        return bound & reduce(or_, clauses)
+
+
+class CursorEncoder(json.JSONEncoder):
+    """Like DjangoJSONEncoder but keeps full microsecond precision, the key must round-trip exactly."""
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.date, datetime.time)):
+            return o.isoformat()
+        if isinstance(o, (decimal.Decimal, uuid.UUID)):
+            return str(o)
+        return super().default(o)
+
+
+def _flip(field):
+    return field[1:] if field.startswith('-') else f'-{field}'
+
+
+def _to_python(model, path, value):
+    """`value` converted by the model field at `path`. Annotations aren't fields, they only get a type check."""
+    field = None
+    try:
+        for name in path.split('__'):
+            field = model._meta.pk if name == 'pk' else model._meta.get_field(name)
+            model = field.related_model
+    except FieldDoesNotExist:
+        field = None
+    if field is None:
+        if not isinstance(value, (str, int, float)):
+            raise TypeError(f'{value!r} is not a key value')
+        return value
+    return field.to_python(value)
+
+
+def _get_value(row, path):
+    if isinstance(row, dict):
+        return row[path]
+    value = row
+    for attr in path.split('__'):
+        value = getattr(value, attr)
+    return value
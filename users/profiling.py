@@ -0,0 +1,377 @@
+"""
+Opt-in request profiling (REQUEST_PROFILING=1).
+
+RequestProfilingMiddleware measures every request. It records:
+
+- wall time;
+- queries and their time, through connection.execute_wrapper() on every database alias;
+- duplicate queries, meaning the same SQL with the same parameters run more than once in
+  one request, which usually points at a missing select_related/prefetch_related;
+- time spent building serializer data (top-level `.data` and the compiled list path);
+- time spent rendering the response, and its size.
+
+Each response gets a Server-Timing header, so the browser's network panel shows the
+breakdown. Per-route counters and histograms add up in memory:
+
+- they are served in the Prometheus text format at /metrics, to bearer METRICS_TOKEN;
+- every PROFILING_FLUSH_SECONDS, the requests since the last flush are summarized to the
+  'users.profiling' logger.
+
+With PROFILING_CPROFILE_RATE above 0, that fraction of requests also runs under cProfile.
+A profile is kept in PROFILING_DIR when its request took PROFILING_SLOW_MS or longer. Open
+it with `python -m pstats` or snakeviz.
+
+Like the local-memory cache, the numbers are per worker process. Prometheus should
+scrape each worker, or sum them by instance.
+"""
+import cProfile
+import logging
+import os
+import random
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+# Prometheus' default buckets, in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+_current = ContextVar('request_profile', default=None)
+
+
+class RequestProfile:
+    """What one request spent its time on. Also the execute_wrapper for its queries."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.statements = Counter()
+        self.phases = Counter()
+        self._running = set()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - started
+            self.queries += 1
+            self.statements[sql, many or repr(params)] += 1
+
+    @contextmanager
+    def phase(self, name):
+        if name in self._running:
+            # Nested inside the same phase, the outer one is already counting
+            yield
+            return
+        self._running.add(name)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] += time.perf_counter() - started
+            self._running.discard(name)
+
+    @property
+    def duplicates(self):
+        return sum(runs - 1 for runs in self.statements.values())
+
+    def most_repeated(self):
+        """(runs, sql) of the query repeated most often with the same parameters."""
+        (sql, _), runs = self.statements.most_common(1)[0]
+        return runs, sql
+
+
+@contextmanager
+def timed(phase):
+    """Count the block towards the current request's `phase`. Does nothing while profiling is off."""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    with profile.phase(phase):
+        yield
+
+
+_original_data = serializers.BaseSerializer.data
+_serializer_timing_lock = threading.Lock()
+_serializer_timing_users = 0
+
+
+def _profiled_data(self):
+    with timed('serialize'):
+        return _original_data.fget(self)
+
+
+@contextmanager
+def serializer_timing():
+    """
+    Time top-level serializer.data, nested serializers go through to_representation() instead.
+
+    DRF has no hook for this, so BaseSerializer.data is swapped for a timed version while
+    at least one profiled request is running, and put back when the last one ends.
+    """
+    global _serializer_timing_users
+    with _serializer_timing_lock:
+        if not _serializer_timing_users:
+            serializers.BaseSerializer.data = property(_profiled_data)
+        _serializer_timing_users += 1
+    try:
+        yield
+    finally:
+        with _serializer_timing_lock:
+            _serializer_timing_users -= 1
+            if not _serializer_timing_users:
+                serializers.BaseSerializer.data = _original_data
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last one is above every bucket
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield bound, total
+
+
+class RouteStats:
+    def __init__(self):
+        self.statuses = Counter()
+        self.duration = Histogram(DURATION_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.db_seconds = 0.0
+        self.duplicates = 0
+        self.serialize_seconds = 0.0
+        self.response_bytes = 0
+
+    def record(self, profile, seconds, status, size):
+        self.statuses[status] += 1
+        self.duration.observe(seconds)
+        self.queries.observe(profile.queries)
+        self.db_seconds += profile.db_seconds
+        self.duplicates += profile.duplicates
+        self.serialize_seconds += profile.phases['serialize']
+        self.response_bytes += size
+
+
+class Registry:
+    """Per-route stats since the process started, plus the window since the last log flush."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.routes = {}
+            self.window = {}
+            self.flushed_at = time.monotonic()
+
+    def record(self, method, route, profile, seconds, status, size):
+        key = (method, route)
+        with self.lock:
+            for stats in (self.routes, self.window):
+                if key not in stats:
+                    stats[key] = RouteStats()
+                stats[key].record(profile, seconds, status, size)
+
+    def flush_due(self, interval):
+        with self.lock:
+            if time.monotonic() - self.flushed_at < interval:
+                return {}
+            window, self.window = self.window, {}
+            self.flushed_at = time.monotonic()
+            return window
+
+    def render(self):
+        """All routes in the Prometheus text exposition format."""
+        with self.lock:
+            routes = sorted(self.routes.items())
+            lines = [
+                '# HELP http_requests_total Requests by route, method and status code.',
+                '# TYPE http_requests_total counter',
+            ]
+            for (method, route), stats in routes:
+                for status, count in sorted(stats.statuses.items()):
+                    lines.append(f'http_requests_total{_labels(route, method, status=status)} {count}')
+            for name, kind, help_text in (
+                ('http_request_duration_seconds', 'duration', 'Wall time of requests.'),
+                ('http_request_db_queries', 'queries', 'Database queries per request.'),
+            ):
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+                for (method, route), stats in routes:
+                    histogram = getattr(stats, kind)
+                    for bound, count in histogram.cumulative():
+                        lines.append(f'{name}_bucket{_labels(route, method, le=bound)} {count}')
+                    lines.append(f'{name}_bucket{_labels(route, method, le="+Inf")} {histogram.count}')
+                    lines.append(f'{name}_sum{_labels(route, method)} {histogram.sum:.6g}')
+                    lines.append(f'{name}_count{_labels(route, method)} {histogram.count}')
+            for name, attr, help_text in (
+                ('http_request_db_seconds_total', 'db_seconds', 'Time spent in database queries.'),
+                ('http_request_duplicate_queries_total', 'duplicates', 'Queries repeated with the same parameters within a request.'),
+                ('http_request_serialize_seconds_total', 'serialize_seconds', 'Time spent building serializer data.'),
+                ('http_response_bytes_total', 'response_bytes', 'Size of response bodies, streams excluded.'),
+            ):
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+                for (method, route), stats in routes:
+                    lines.append(f'{name}{_labels(route, method)} {getattr(stats, attr):.6g}')
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(route, method, **extra):
+    labels = {'route': route, 'method': method, **extra}
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = Registry()
+
+
+def _route(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.route if match is not None else 'unmatched'
+
+
+class RequestProfilingMiddleware:
+    """
+    Place it first in MIDDLEWARE so its wall time covers the other middleware too.
+
+    Under ASGI it runs natively. cProfile only follows the thread it was enabled on, while
+    async requests interleave on the event loop, so those are never sampled.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        profile, profiler = RequestProfile(), self.sample_profiler()
+        started = time.perf_counter()
+        with self.profiling(profile, profiler):
+            response = self.get_response(request)
+        return self.finish(request, response, profile, time.perf_counter() - started, profiler)
+
+    async def __acall__(self, request):
+        profile = RequestProfile()
+        started = time.perf_counter()
+        with self.profiling(profile):
+            response = await self.get_response(request)
+        return self.finish(request, response, profile, time.perf_counter() - started)
+
+    @staticmethod
+    @contextmanager
+    def profiling(profile, profiler=None):
+        token = _current.set(profile)
+        try:
+            with ExitStack() as stack:
+                stack.enter_context(serializer_timing())
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(profile))
+                if profiler is not None:
+                    stack.callback(profiler.disable)
+                    profiler.enable()
+                yield
+        finally:
+            _current.reset(token)
+
+    def finish(self, request, response, profile, seconds, profiler=None):
+        response['Server-Timing'] = self.server_timing(profile, seconds)
+        route = _route(request)
+        size = 0 if response.streaming else len(response.content)
+        registry.record(request.method, route, profile, seconds, response.status_code, size)
+        self.report(request, route, profile, seconds, profiler)
+        for (method, path), stats in sorted(registry.flush_due(settings.PROFILING_FLUSH_SECONDS).items()):
+            requests = stats.duration.count
+            logger.info(
+                '%s %s: %d requests, avg %.1f ms, %.1f queries/request, %d duplicate queries',
+                method, path, requests, stats.duration.sum / requests * 1000,
+                stats.queries.sum / requests, stats.duplicates,
+            )
+        return response
+
+    def process_template_response(self, request, response):
+        # Render now to time it, Django's own render() call is then a no-op
+        with timed('render'):
+            response.render()
+        return response
+
+    @staticmethod
+    def sample_profiler():
+        rate = settings.PROFILING_CPROFILE_RATE
+        if not rate or random.random() >= rate:
+            return None
+        return cProfile.Profile()
+
+    @staticmethod
+    def server_timing(profile, seconds):
+        metrics = [
+            f'total;dur={seconds * 1000:.1f}',
+            f'db;dur={profile.db_seconds * 1000:.1f};desc="{profile.queries} queries, {profile.duplicates} duplicate"',
+        ]
+        metrics += [f'{name};dur={spent * 1000:.1f}' for name, spent in profile.phases.items()]
+        return ', '.join(metrics)
+
+    @staticmethod
+    def report(request, route, profile, seconds, profiler):
+        if profile.duplicates:
+            runs, sql = profile.most_repeated()
+            logger.info(
+                '%s %s ran %d duplicate queries, this one %d times: %.200s',
+                request.method, request.path, profile.duplicates, runs, sql,
+            )
+        if seconds * 1000 < settings.PROFILING_SLOW_MS:
+            return
+        logger.warning(
+            'Slow request %s %s: %.0f ms, %d queries in %.0f ms',
+            request.method, request.path, seconds * 1000, profile.queries, profile.db_seconds * 1000,
+        )
+        if profiler is not None:
+            os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+            name = re.sub(r'[^A-Za-z0-9]+', '-', route).strip('-') or 'root'
+            path = os.path.join(
+                settings.PROFILING_DIR, f'{time.strftime("%Y%m%d-%H%M%S")}-{request.method}-{name}-{seconds * 1000:.0f}ms.prof',
+            )
+            profiler.dump_stats(path)
+            logger.warning('Saved the profile of %s %s to %s', request.method, request.path, path)
+
+
+def metrics(request):
+    """The per-route stats for Prometheus, to `Authorization: Bearer <METRICS_TOKEN>`."""
+    if not settings.REQUEST_PROFILING or not settings.METRICS_TOKEN:
+        raise Http404
+    if not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {settings.METRICS_TOKEN}'):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,93 @@
+"""
+Wake-ups for open notification streams.
+
+Published messages carry no payload, only "user X has new notifications". A woken
+stream reads the rows after its cursor from the database. The database stays the
+source of truth, and resuming from a Last-Event-ID is just a query for `id > cursor`.
+
+The default broker is in-process. The notification worker usually runs in a different
+process, so streams also re-check the database every NOTIFICATION_STREAM_POLL_SECONDS.
+Setting NOTIFICATION_BROKER to a dotted path swaps in a shared broker, such as Redis
+pub/sub or PostgreSQL LISTEN/NOTIFY, that implements subscribe() and publish().
+"""
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class Subscription:
+    """One open stream waiting for a user's notifications. Must be created inside the event loop."""
+
+    def __init__(self, broker, user_id):
+        self.broker = broker
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+
+    async def wait(self, timeout):
+        """Wait for a publish or the timeout, True if something was published."""
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.event.clear()
+
+    def notify(self):
+        # publish() may run on any thread, the event belongs to this loop
+        self.loop.call_soon_threadsafe(self.event.set)
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        subscription = Subscription(self, user_id)
+        with self._lock:
+            self._subscriptions[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def publish(self, user_ids):
+        with self._lock:
+            subscriptions = [s for user_id in set(user_ids) for s in self._subscriptions.get(user_id, ())]
+        for subscription in subscriptions:
+            try:
+                subscription.notify()
+            except RuntimeError:
+                # The stream's event loop has already closed
+                self.unsubscribe(subscription)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                path = getattr(settings, 'NOTIFICATION_BROKER', 'users.realtime.InProcessBroker')
+                _broker = import_string(path)()
+    return _broker
+
+
+def publish(user_ids):
+    get_broker().publish(user_ids)
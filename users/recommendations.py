@@ -0,0 +1,183 @@
+"""
+Scored lawyer recommendations for MatchLawyersView.
+
+Every verified lawyer in a city is a candidate. Candidates are loaded once per
+(city, specialization) into a column-oriented CandidateSet, and the parts of the score
+that don't depend on the request are precomputed there. The set is cached under the
+city's version (users/cache.py), so it is dropped when a lawyer in that city or one
+of their reviews changes. A request then only computes the distance column and a
+weighted sum over numpy arrays, and picks the top k with argpartition.
+
+Booking load also changes through Booking and Consultation writes. Those don't
+invalidate the set, they are picked up when the cached set expires
+(RECOMMENDATION_CACHE_TIMEOUT, 5 minutes by default).
+"""
+import hashlib
+import re
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .cache import city_namespace, get_versions
+from .geo import EARTH_RADIUS_KM
+from .models import Booking, Consultation, LawyerProfile
+
+DEFAULT_WEIGHTS = {
+    'distance': 0.35,
+    'specialization': 0.25,
+    'rating': 0.2,
+    'experience': 0.1,
+    'load': 0.1,
+}
+EXPERIENCE_CAP = 30  # Years of experience past this don't raise the score further
+RATING_PRIOR_MEAN = 3.5
+RATING_PRIOR_WEIGHT = 5  # Lawyers with few reviews are pulled towards the prior mean
+
+
+def get_weights():
+    return {**DEFAULT_WEIGHTS, **getattr(settings, 'RECOMMENDATION_WEIGHTS', {})}
+
+
+def specialization_match(wanted, offered):
+    """1 for the same specialization, 0.5 when they share a word, 0 otherwise."""
+    if not wanted:
+        return 0.0
+    wanted, offered = wanted.strip().lower(), (offered or '').strip().lower()
+    if wanted == offered:
+        return 1.0
+    if set(re.findall(r'\w+', wanted)) & set(re.findall(r'\w+', offered)) - {'law', 'and', 'of'}:
+        return 0.5
+    return 0.0
+
+
+class CandidateSet:
+    """The candidate matrix for one (city, specialization), one numpy array per column."""
+
+    def __init__(self, ids, latitude, longitude, specialization, experience, rating_avg, rating_count, load):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.latitude = np.radians(np.asarray(latitude, dtype=np.float64))  # NaN when unknown
+        self.longitude = np.radians(np.asarray(longitude, dtype=np.float64))
+        self.rating_avg = np.asarray(rating_avg, dtype=np.float64)
+
+        rating_count = np.asarray(rating_count, dtype=np.float64)
+        bayesian_rating = (
+            (self.rating_avg * rating_count + RATING_PRIOR_MEAN * RATING_PRIOR_WEIGHT)
+            / (rating_count + RATING_PRIOR_WEIGHT)
+        )
+        # Request-independent score components, each scaled to [0, 1]
+        self.components = {
+            'specialization': np.asarray(specialization, dtype=np.float64),
+            'experience': np.minimum(np.asarray(experience, dtype=np.float64), EXPERIENCE_CAP) / EXPERIENCE_CAP,
+            'rating': bayesian_rating / 5,
+            'load': 1 / (1 + np.asarray(load, dtype=np.float64)),
+        }
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_rows(cls, rows, specialization=''):
+        """Build from (id, latitude, longitude, specialization, experience, rating_avg, rating_count, load) rows."""
+        rows = list(rows)
+        if not rows:
+            return cls(*([] for _ in range(8)))
+        ids, latitude, longitude, offered, experience, rating_avg, rating_count, load = zip(*rows)
+        return cls(
+            ids,
+            [np.nan if value is None else value for value in latitude],
+            [np.nan if value is None else value for value in longitude],
+            [specialization_match(specialization, value) for value in offered],
+            experience, rating_avg, rating_count, load,
+        )
+
+    def distances(self, latitude, longitude):
+        """Haversine distance in km from a point to every candidate, NaN where unknown."""
+        lat, lng = np.radians(latitude), np.radians(longitude)
+        a = (
+            np.sin((self.latitude - lat) / 2) ** 2
+            + np.cos(lat) * np.cos(self.latitude) * np.sin((self.longitude - lng) / 2) ** 2
+        )
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    def rank(self, limit, weights=None, latitude=None, longitude=None, radius_km=None, min_rating=None):
+        """The top `limit` candidates as (id, score, distance_km or None), best first."""
+        if not len(self):
+            return []
+        weights = weights or get_weights()
+
+        score = sum(weights[name] * column for name, column in self.components.items())
+        keep = np.ones(len(self), dtype=bool)
+        distance = None
+
+        if latitude is not None and longitude is not None:
+            distance = self.distances(latitude, longitude)
+            known = ~np.isnan(distance)
+            if radius_km:
+                proximity = np.clip(1 - distance / radius_km, 0, 1)
+                # Lawyers without coordinates stay in, they just get no proximity credit
+                keep &= ~known | (distance <= radius_km)
+            else:
+                proximity = 1 / (1 + distance)
+            score = score + weights['distance'] * np.where(known, proximity, 0.0)
+
+        if min_rating is not None:
+            keep &= self.rating_avg >= min_rating
+
+        candidates = np.flatnonzero(keep)
+        if len(candidates) > limit:
+            # argpartition finds the top k in linear time, only those k get sorted
+            candidates = candidates[np.argpartition(-score[candidates], limit - 1)[:limit]]
+        candidates = candidates[np.lexsort((self.ids[candidates], -score[candidates]))]
+
+        return [
+            (
+                int(self.ids[i]),
+                float(score[i]),
+                None if distance is None or np.isnan(distance[i]) else float(distance[i]),
+            )
+            for i in candidates
+        ]
+
+
+def load_candidates(city, specialization=''):
+    """Read the candidate matrix for a city from the database in one query."""
+    today, now = timezone.localdate(), timezone.now()
+    upcoming_consultations = (
+        Consultation.objects.filter(lawyer=OuterRef('pk'), date__gte=today)
+        .exclude(status='canceled').order_by().values('lawyer')
+        .annotate(n=Count('id')).values('n')
+    )
+    upcoming_bookings = (
+        Booking.objects.filter(lawyer=OuterRef('user'), appointment_date__gte=now)
+        .exclude(status='canceled').order_by().values('lawyer')
+        .annotate(n=Count('id')).values('n')
+    )
+    rows = (
+        LawyerProfile.objects.filter(verified=True, city=city)
+        .annotate(load=Coalesce(Subquery(upcoming_consultations), 0) + Coalesce(Subquery(upcoming_bookings), 0))
+        .values_list('id', 'latitude', 'longitude', 'specialization', 'experience', 'rating_avg', 'rating_count', F('load'))
+    )
+    return CandidateSet.from_rows(rows, specialization)
+
+
+def get_candidates(city, specialization=''):
+    """The cached candidate set for (city, specialization), loading it on a miss."""
+    digest = hashlib.md5(f'{city}\0{specialization.strip().lower()}'.encode('utf-8')).hexdigest()
+    version, = get_versions(city_namespace(city))
+    key = f'lawyer-candidates:{version}:{digest}'
+    candidates = cache.get(key)
+    if candidates is None:
+        candidates = load_candidates(city, specialization)
+        cache.set(key, candidates, getattr(settings, 'RECOMMENDATION_CACHE_TIMEOUT', 300))
+    return candidates
+
+
+def recommend(city, limit, specialization='', latitude=None, longitude=None, radius_km=None, min_rating=None):
+    """Ranked (lawyer id, score, distance_km) tuples for a client."""
+    return get_candidates(city, specialization).rank(
+        limit, latitude=latitude, longitude=longitude, radius_km=radius_km, min_rating=min_rating
+    )
@@ -0,0 +1,113 @@
+"""
+Primary/replica routing.
+
+Everything reads from and writes to the primary ('default') unless a 'replica' database
+is configured and the request runs in a ReplicaReadMixin view: then that view's GETs
+read from the replica. Two things keep users from seeing stale data:
+
+- a request that has written anything reads from the primary for the rest of the request;
+- after a successful POST/PUT/PATCH/DELETE, ReadYourWritesMiddleware pins the user to
+  the primary for REPLICA_PIN_SECONDS, so the next list they load shows their change.
+
+Pins live in the cache. Like the response cache, they only reach every worker when
+CACHES points at a shared backend.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from rest_framework.permissions import SAFE_METHODS
+
+REPLICA = 'replica'
+
+_read_replica = ContextVar('read_replica', default=False)
+
+
+def replica_configured():
+    return REPLICA in connections.settings
+
+
+def _pin_key(user_id):
+    return f'db-pin:{user_id}'
+
+
+def pin_to_primary(user_id):
+    cache.set(_pin_key(user_id), True, getattr(settings, 'REPLICA_PIN_SECONDS', 5))
+
+
+def is_pinned(user_id):
+    return user_id is not None and cache.get(_pin_key(user_id)) is not None
+
+
+@contextmanager
+def reading_from_replica(enabled=True):
+    token = _read_replica.set(enabled and replica_configured())
+    try:
+        yield
+    finally:
+        _read_replica.reset(token)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return REPLICA if _read_replica.get() else None
+
+    def db_for_write(self, model, **hints):
+        # Whatever this request reads from now on must see the write
+        _read_replica.set(False)
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+
+class ReplicaReadMixin:
+    """Serve this view's GET/HEAD requests from the replica, unless the user is pinned to the primary."""
+
+    def dispatch(self, request, *args, **kwargs):
+        with reading_from_replica(enabled=False):
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # Decided after authentication, which reads from the primary
+        if request.method in SAFE_METHODS and replica_configured() and not is_pinned(request.user.id):
+            _read_replica.set(True)
+
+
+class ReadYourWritesMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        if self.wrote(request, response):
+            self.pin_user(request)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if self.wrote(request, response):
+            # request.user may still be lazy, and loading it queries the database
+            await sync_to_async(self.pin_user)(request)
+        return response
+
+    @staticmethod
+    def wrote(request, response):
+        return request.method not in SAFE_METHODS and response.status_code < 400 and replica_configured()
+
+    @staticmethod
+    def pin_user(request):
+        if getattr(request, 'user', None) is not None and request.user.is_authenticated:
+            pin_to_primary(request.user.id)
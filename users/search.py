@@ -0,0 +1,233 @@
+"""
+Full-text search over lawyer profiles.
+
+The index covers the lawyer's username, specialization, location, city and address.
+SQLite keeps it in an FTS5 virtual table and PostgreSQL in a tsvector column with a
+GIN index. Both are filled with a single INSERT ... SELECT, so the same code serves the
+migration, the signal handlers and the rebuild_search_index command.
+
+Any other database, or an SQLite build without FTS5, falls back to DRF's icontains search.
+"""
+import re
+
+from django.db import DatabaseError, connections
+from django.db.models import Case, IntegerField, Value, When
+from rest_framework import filters
+
+SEARCH_TABLE = 'users_lawyer_search'
+
+# Columns of the joined lawyer/user row that make up a search document, in rank order
+DOCUMENT_COLUMNS = (
+    ('username', 'u.username'),
+    ('specialization', 'lp.specialization'),
+    ('location', "COALESCE(lp.location, '')"),
+    ('city', 'lp.city'),
+    ('address', 'lp.address'),
+)
+
+DOCUMENT_SOURCE = (
+    'FROM users_lawyerprofile lp INNER JOIN users_user u ON u.id = lp.user_id'
+)
+
+
+def search_terms(query):
+    """Split free text into word tokens, dropping anything that could be query syntax."""
+    return re.findall(r'\w+', query.lower())
+
+
+class SQLiteSearchBackend:
+    # bm25 column weights, a username or specialization hit outranks an address hit
+    weights = (10.0, 8.0, 4.0, 4.0, 1.0)
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def create(self):
+        columns = ', '.join(name for name, _ in DOCUMENT_COLUMNS)
+        with self.connection.cursor() as cursor:
+            # Prefix indexes make type-ahead queries of 2 and 3 characters cheap
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5({columns}, prefix='2 3')"
+            )
+
+    def drop(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+    def reindex(self, lawyer_ids=None, user_ids=None):
+        where, params = _where(lawyer_ids, user_ids)
+        columns = ', '.join(name for name, _ in DOCUMENT_COLUMNS)
+        values = ', '.join(expression for _, expression in DOCUMENT_COLUMNS)
+        with self.connection.cursor() as cursor:
+            if where:
+                cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN (SELECT lp.id {DOCUMENT_SOURCE}{where})', params)
+            else:
+                cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {SEARCH_TABLE} (rowid, {columns}) SELECT lp.id, {values} {DOCUMENT_SOURCE}{where}',
+                params,
+            )
+
+    def remove(self, lawyer_ids):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({', '.join(['%s'] * len(lawyer_ids))})",
+                list(lawyer_ids),
+            )
+
+    def search(self, query, limit):
+        terms = search_terms(query)
+        if not terms:
+            return []
+        match = ' AND '.join(f'"{term}"*' for term in terms)
+        weights = ', '.join(str(weight) for weight in self.weights)
+        with self.connection.cursor() as cursor:
+            # bm25() is lower-is-better
+            cursor.execute(
+                f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s '
+                f'ORDER BY bm25({SEARCH_TABLE}, {weights}) LIMIT %s',
+                [match, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class PostgresSearchBackend:
+    # setweight() labels per document column, same order as DOCUMENT_COLUMNS
+    weights = ('A', 'A', 'B', 'B', 'C')
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def create(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ('
+                'lawyer_id bigint PRIMARY KEY REFERENCES users_lawyerprofile (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+                'document tsvector NOT NULL)'
+            )
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_document_gin ON {SEARCH_TABLE} USING gin (document)'
+            )
+
+    def drop(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+    def reindex(self, lawyer_ids=None, user_ids=None):
+        where, params = _where(lawyer_ids, user_ids)
+        document = ' || '.join(
+            f"setweight(to_tsvector('simple', {expression}), '{weight}')"
+            for (_, expression), weight in zip(DOCUMENT_COLUMNS, self.weights)
+        )
+        with self.connection.cursor() as cursor:
+            if not where:
+                cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {SEARCH_TABLE} (lawyer_id, document) SELECT lp.id, {document} {DOCUMENT_SOURCE}{where} '
+                'ON CONFLICT (lawyer_id) DO UPDATE SET document = EXCLUDED.document',
+                params,
+            )
+
+    def remove(self, lawyer_ids):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE lawyer_id = ANY(%s)', [list(lawyer_ids)])
+
+    def search(self, query, limit):
+        terms = search_terms(query)
+        if not terms:
+            return []
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT lawyer_id FROM {SEARCH_TABLE}, to_tsquery('simple', %s) query "
+                'WHERE document @@ query ORDER BY ts_rank(document, query) DESC, lawyer_id LIMIT %s',
+                [tsquery, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+def _where(lawyer_ids, user_ids):
+    if lawyer_ids is not None:
+        return f" WHERE lp.id IN ({', '.join(['%s'] * len(lawyer_ids))})", list(lawyer_ids)
+    if user_ids is not None:
+        return f" WHERE lp.user_id IN ({', '.join(['%s'] * len(user_ids))})", list(user_ids)
+    return '', []
+
+
+def get_backend(connection):
+    """The search backend for a connection, or None when only icontains search is possible."""
+    if connection.vendor == 'postgresql':
+        return PostgresSearchBackend(connection)
+    if connection.vendor == 'sqlite' and _sqlite_has_fts5(connection):
+        return SQLiteSearchBackend(connection)
+    return None
+
+
+def _sqlite_has_fts5(connection):
+    # Checked once per connection wrapper, not on every search
+    if not hasattr(connection, 'users_has_fts5'):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+            connection.users_has_fts5 = bool(cursor.fetchone()[0])
+            if not connection.users_has_fts5:
+                # Some builds load FTS5 without the compile option, so probe for it
+                try:
+                    cursor.execute('CREATE VIRTUAL TABLE temp.users_fts5_probe USING fts5(x)')
+                    cursor.execute('DROP TABLE temp.users_fts5_probe')
+                    connection.users_has_fts5 = True
+                except DatabaseError:
+                    pass
+    return connection.users_has_fts5
+
+
+def index_lawyers(lawyer_ids=None, user_ids=None, using='default'):
+    """Refresh the search documents for the given lawyers, or for every lawyer if none are given."""
+    if (lawyer_ids is not None and not lawyer_ids) or (user_ids is not None and not user_ids):
+        return
+    backend = get_backend(connections[using])
+    if backend is not None:
+        backend.reindex(lawyer_ids=lawyer_ids, user_ids=user_ids)
+
+
+def unindex_lawyers(lawyer_ids, using='default'):
+    backend = get_backend(connections[using])
+    if backend is not None and lawyer_ids:
+        backend.remove(lawyer_ids)
+
+
+class LawyerSearchFilter(filters.SearchFilter):
+    """
+    Drop-in replacement for SearchFilter that answers `?search=` from the full-text index.
+
+    Matches are annotated with `search_rank` (0 is the best match) so RankedOrderingFilter
+    and the paginator can order by relevance. Prefix matching is on for every term.
+    """
+    max_results = 1000
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+
+        backend = get_backend(connections[queryset.db])
+        if backend is None:
+            return super().filter_queryset(request, queryset, view).annotate(search_rank=Value(0))
+
+        lawyer_ids = backend.search(' '.join(terms), self.max_results)
+        return queryset.filter(pk__in=lawyer_ids).annotate(
+            search_rank=Case(
+                *[When(pk=pk, then=Value(rank)) for rank, pk in enumerate(lawyer_ids)],
+                default=Value(len(lawyer_ids)),
+                output_field=IntegerField(),
+            )
+        )
+
+
+class RankedOrderingFilter(filters.OrderingFilter):
+    """Orders search results by relevance unless the client asked for an explicit ordering."""
+
+    def get_ordering(self, request, queryset, view):
+        searching = request.query_params.get(LawyerSearchFilter.search_param)
+        if searching and self.ordering_param not in request.query_params:
+            return ['search_rank']
+        return super().get_ordering(request, queryset, view)
@@ -1,15 +1,154 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model, authenticate
+from django.core.exceptions import FieldDoesNotExist
 from .models import ClientProfile, LawyerProfile
 from users.models import User
 from .models import Review
 from .models import Booking, Consultation, Notification
+from .models import BlackoutDate, WorkingHours
 
 
 User = get_user_model()
 
+
+class ChangedFieldsUpdateMixin:
+    """ModelSerializer.update() that writes only the fields whose values changed, or nothing at all."""
+
+    def update(self, instance, validated_data):
+        changed = [name for name, value in validated_data.items() if getattr(instance, name) != value]
+        for name in changed:
+            setattr(instance, name, validated_data[name])
+        if changed:
+            instance.save(update_fields=changed)
+        return instance
+
+
+class EagerLoadingMixin:
+    """
+    Works out which relations and columns a serializer reads so list views can
+    load them with select_related/prefetch_related/only() instead of one query per row.
+
+    Model fields, nested serializers and dotted sources are discovered automatically.
+    SerializerMethodFields are opaque, so declare what they read in `field_sources`,
+    e.g. {'is_verified': ['user__is_verified']}.
+    """
+    field_sources = {}
+
+    def setup_eager_loading(self, queryset, restrict_columns=True):
+        select_related, prefetch_related, columns = set(), set(), set()
+        self._collect_eager_fields(self, '', select_related, prefetch_related, columns)
+
+        if select_related:
+            queryset = queryset.select_related(*sorted(select_related))
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*sorted(prefetch_related))
+        if restrict_columns and self._columns_exist(queryset.model, columns):
+            queryset = queryset.only(*sorted(columns))
+        return queryset
+
+    @classmethod
+    def _collect_eager_fields(cls, serializer, prefix, select_related, prefetch_related, columns):
+        declared = getattr(serializer, 'field_sources', {})
+
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+
+            if name in declared:
+                for path in declared[name]:
+                    parts = path.split('__')
+                    for depth in range(1, len(parts)):
+                        select_related.add(prefix + '__'.join(parts[:depth]))
+                    columns.add(prefix + path)
+                continue
+
+            if field.source == '*' or isinstance(field, serializers.SerializerMethodField):
+                continue
+
+            path = prefix + '__'.join(field.source_attrs)
+            for depth in range(1, len(field.source_attrs)):
+                select_related.add(prefix + '__'.join(field.source_attrs[:depth]))
+
+            if isinstance(field, (serializers.ListSerializer, serializers.ManyRelatedField)):
+                # Reverse and many-to-many relations can't be joined, load them in one extra query
+                prefetch_related.add(path)
+            elif isinstance(field, serializers.BaseSerializer):
+                select_related.add(path)
+                columns.add(path)
+                cls._collect_eager_fields(field, path + '__', select_related, prefetch_related, columns)
+            else:
+                columns.add(path)
+
+    @staticmethod
+    def _columns_exist(model, columns):
+        """only() needs concrete columns; properties or methods used as sources disable it."""
+        for path in columns:
+            current = model
+            for part in path.split('__'):
+                try:
+                    field = current._meta.get_field(part)
+                except FieldDoesNotExist:
+                    return False
+                if not field.concrete:
+                    return False
+                current = field.related_model
+        return True
+
+
+def parse_field_list(value):
+    """'id, user.username' -> ('id', 'user.username'), or None when the list is blank."""
+    names = sorted({name.strip() for name in (value or '').split(',') if name.strip()})
+    return tuple(names) or None
+
+
+class SparseFieldsMixin:
+    """
+    Renders only the fields named in `fields`, e.g. ('id', 'specialization', 'user.username').
+
+    A nested serializer named on its own collapses to the related object's id, unless it's
+    also in `expand`; dotted names pick fields inside it. EagerLoadingMixin sees the pruned
+    fields, so list views only select those columns and only join what's still rendered.
+    """
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        self.sparse_fields = fields
+        self.expand = expand or ()
+        super().__init__(*args, **kwargs)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.sparse_fields is None:
+            return fields
+
+        wanted, expand = {}, {}
+        for path in self.sparse_fields:
+            name, _, rest = path.partition('.')
+            wanted.setdefault(name, []).extend([rest] if rest else [])
+        for path in self.expand:
+            name, _, rest = path.partition('.')
+            expand.setdefault(name, []).extend([rest] if rest else [])
+        unknown = sorted(set(wanted) - set(fields))
+        if unknown:
+            raise serializers.ValidationError({"error": f"Unknown field(s) in 'fields': {', '.join(unknown)}."})
+
+        projected = {}
+        for name, field in fields.items():
+            if name not in wanted:
+                continue
+            nested = isinstance(field, SparseFieldsMixin) and not isinstance(field, serializers.ListSerializer)
+            if wanted[name] and not nested:
+                raise serializers.ValidationError({"error": f"'{name}' has no fields to pick from."})
+            if wanted[name] or (nested and name in expand):
+                kwargs = dict(field._kwargs, fields=tuple(wanted[name]) or None, expand=tuple(expand.get(name, ())))
+                field = type(field)(*field._args, **kwargs)
+            elif nested:
+                field = serializers.PrimaryKeyRelatedField(read_only=True, source=field.source)
+            projected[name] = field
+        return projected
+
+
 # User Serializer
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'is_client', 'is_lawyer', 'is_verified']
@@ -23,15 +162,14 @@ class RegisterSerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'email', 'password', 'is_client', 'is_lawyer']
 
     def create(self, validated_data):
-        user = User.objects.create_user(
+        # Roles go in with the INSERT so the post_save signal creates the right profile
+        return User.objects.create_user(
             username=validated_data['username'],
             email=validated_data['email'],
-            password=validated_data['password']
+            password=validated_data['password'],
+            is_client=validated_data.get('is_client', False),
+            is_lawyer=validated_data.get('is_lawyer', False),
         )
-        user.is_client = validated_data.get('is_client', False)
-        user.is_lawyer = validated_data.get('is_lawyer', False)
-        user.save()
-        return user
 
 # Login Serializer
 class LoginSerializer(serializers.Serializer):
@@ -39,16 +177,8 @@ class LoginSerializer(serializers.Serializer):
     password = serializers.CharField(write_only=True)
 
     def validate(self, data):
-        email = data.get("email")
-        password = data.get("password")
-
-        try:
-            user = User.objects.get(email=email)
-        except User.DoesNotExist:
-            raise serializers.ValidationError("Invalid email or password.")
-
-        # Authenticate using username instead of email
-        user = authenticate(username=user.username, password=password)
+        # One query through users.backends.EmailBackend
+        user = authenticate(self.context.get("request"), email=data.get("email"), password=data.get("password"))
 
         if not user:
             raise serializers.ValidationError("Invalid email or password.")
@@ -56,35 +186,108 @@ class LoginSerializer(serializers.Serializer):
         return {"user": user}
 
 # Client Profile Serializer
-class ClientProfileSerializer(serializers.ModelSerializer):
-    user = UserSerializer()
+class ClientProfileSerializer(ChangedFieldsUpdateMixin, SparseFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
+    user = UserSerializer(read_only=True)  # Declared fields ignore read_only_fields
 
     class Meta:
         model = ClientProfile
-        fields = ['id', 'user', 'address', 'city']
+        fields = ['id', 'user', 'address', 'city', 'latitude', 'longitude']
         read_only_fields = ["id", "user"]
 
 # Lawyer Profile Serializer
-class LawyerProfileSerializer(serializers.ModelSerializer):
+class LawyerProfileSerializer(ChangedFieldsUpdateMixin, SparseFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)  # Reference UserSerializer correctly
     is_verified = serializers.SerializerMethodField()
 
+    field_sources = {'is_verified': ['user__is_verified']}
+    value_sources = {'is_verified': 'user__is_verified'}  # For users.compiled
 
     class Meta:
         model = LawyerProfile
-        fields = ['id', 'user', 'specialization', 'license_number', 'verified', 'address', 'experience', 'location', 'is_verified']
-        read_only_fields = ["id", "user"]  # This prevents users from changing the owner
+        fields = ['id', 'user', 'specialization', 'license_number', 'verified', 'address', 'experience', 'location', 'city', 'is_verified', 'rating_count', 'rating_avg', 'latitude', 'longitude', 'slot_minutes']
+        read_only_fields = ["id", "user", "rating_count", "rating_avg"]  # This prevents users from changing the owner
 
     def get_is_verified(self, obj):
         return obj.user.is_verified if obj.user else False
 
-class BookingSerializer(serializers.ModelSerializer):
+    def validate_license_number(self, value):
+        # Blank is stored as NULL, which the unique constraint allows any number of times
+        return value or None
+
+class MatchedLawyerSerializer(LawyerProfileSerializer):
+    """A lawyer match with its recommendation score and, when known, the distance from the client."""
+    score = serializers.SerializerMethodField()
+    distance_km = serializers.SerializerMethodField()
+
+    class Meta(LawyerProfileSerializer.Meta):
+        fields = LawyerProfileSerializer.Meta.fields + ['score', 'distance_km']
+
+    def get_score(self, obj):
+        score = getattr(obj, 'match_score', None)
+        return round(score, 4) if score is not None else None
+
+    def get_distance_km(self, obj):
+        distance = getattr(obj, 'distance_km', None)
+        return round(distance, 2) if distance is not None else None
+
+class WorkingHoursSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = WorkingHours
+        fields = ['weekday', 'start_time', 'end_time']
+
+    def validate(self, data):
+        if data['start_time'] >= data['end_time']:
+            raise serializers.ValidationError("start_time must be before end_time.")
+        return data
+
+class BlackoutDateSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = BlackoutDate
+        fields = ['date', 'reason']
+
+class AvailabilitySerializer(serializers.ModelSerializer):
+    """A lawyer's slot length, weekly working hours and blackout dates, replaced as a whole on update."""
+    working_hours = WorkingHoursSerializer(many=True)
+    blackout_dates = BlackoutDateSerializer(many=True)
+
+    class Meta:
+        model = LawyerProfile
+        fields = ['slot_minutes', 'working_hours', 'blackout_dates']
+
+    def validate_working_hours(self, value):
+        windows = sorted((hours['weekday'], hours['start_time'], hours['end_time']) for hours in value)
+        for (day, _, end), (next_day, next_start, _) in zip(windows, windows[1:]):
+            if day == next_day and next_start < end:
+                raise serializers.ValidationError("Working hours on the same day can't overlap.")
+        return value
+
+    def validate_blackout_dates(self, value):
+        dates = [blackout['date'] for blackout in value]
+        if len(dates) != len(set(dates)):
+            raise serializers.ValidationError("Each blackout date can only be listed once.")
+        return value
+
+    def update(self, instance, validated_data):
+        working_hours = validated_data.pop('working_hours', None)
+        blackout_dates = validated_data.pop('blackout_dates', None)
+        if 'slot_minutes' in validated_data:
+            instance.slot_minutes = validated_data['slot_minutes']
+            instance.save(update_fields=['slot_minutes'])
+        if working_hours is not None:
+            instance.working_hours.all().delete()
+            WorkingHours.objects.bulk_create(WorkingHours(lawyer=instance, **hours) for hours in working_hours)
+        if blackout_dates is not None:
+            instance.blackout_dates.all().delete()
+            BlackoutDate.objects.bulk_create(BlackoutDate(lawyer=instance, **blackout) for blackout in blackout_dates)
+        return instance
+
+class BookingSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     class Meta:
         model = Booking
         fields = '__all__'
         read_only_fields = ['client', 'status', 'created_at']
 
-class ConsultationSerializer(serializers.ModelSerializer):
+class ConsultationSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     class Meta:
         model = Consultation
         fields = '__all__'
@@ -95,7 +298,7 @@ class ConsultationSerializer(serializers.ModelSerializer):
         user = self.context['request'].user
 
         # Lawyers can update only the status
-        if hasattr(user, 'lawyerprofile'):
+        if hasattr(user, 'lawyer_profile'):
             if 'status' in validated_data:
                 instance.status = validated_data['status']
         
@@ -109,17 +312,29 @@ class ConsultationSerializer(serializers.ModelSerializer):
         instance.save()
         return instance
     
-class NotificationSerializer(serializers.ModelSerializer):
+class NotificationSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     class Meta:
         model = Notification
         fields = '__all__'
         read_only_fields = ['recipient', 'created_at']
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     client = serializers.ReadOnlyField(source='client.user.username')  # Show username instead of ID
     lawyer = serializers.ReadOnlyField(source='lawyer.user.username')
+    # The reviewed lawyer is taken from the consultation, it isn't stored on the review
+    consultation = serializers.PrimaryKeyRelatedField(
+        queryset=Consultation.objects.all(), write_only=True, required=False
+    )
 
     class Meta:
         model = Review
         fields = '__all__'
         read_only_fields = ['client', 'created_at']
+
+    def create(self, validated_data):
+        validated_data.pop('consultation', None)
+        return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        validated_data.pop('consultation', None)
+        return super().update(instance, validated_data)
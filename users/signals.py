@@ -1,20 +1,214 @@
-from django.db.models.signals import post_save
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from .models import User, ClientProfile, LawyerProfile
 from django.core.mail import send_mail
-from .models import Consultation
+from .models import Booking, Consultation, Notification, Review
+from .search import DOCUMENT_COLUMNS, index_lawyers, unindex_lawyers
+from .authentication import AUTH_FIELDS, revoke_user_tokens
+from .cache import invalidate_lawyer_dashboard, invalidate_lawyers
+from .realtime import publish
+
+_state = threading.local()
+
+
+@contextmanager
+def signals_suppressed():
+    """
+    Skip the receivers below in this thread, for bulk writes that do their own
+    indexing and cache invalidation afterwards (see the import_users command).
+    """
+    previous = getattr(_state, 'suppressed', False)
+    _state.suppressed = True
+    try:
+        yield
+    finally:
+        _state.suppressed = previous
+
 
+def suppressible(handler):
+    @wraps(handler)
+    def wrapper(*args, **kwargs):
+        if not getattr(_state, 'suppressed', False):
+            return handler(*args, **kwargs)
+    return wrapper
+
+
+# Profiles are created once, when the user is created or first given the role. Saving a
+# user never writes to its profile, profile views save the profile themselves.
 @receiver(post_save, sender=User)
-def create_profile(sender, instance, created, **kwargs):
+@suppressible
+def create_profile(sender, instance, created, using, update_fields=None, **kwargs):
     if created:
         if instance.is_client:
-            ClientProfile.objects.create(user=instance)
+            ClientProfile.objects.using(using).create(user=instance)
         elif instance.is_lawyer:
-            LawyerProfile.objects.create(user=instance)
+            LawyerProfile.objects.using(using).create(user=instance)
+        return
+
+    if update_fields is not None and not {'is_client', 'is_lawyer'} & set(update_fields):
+        return
+    loaded = getattr(instance, '_loaded_values', None)
+    for role, model in (('is_client', ClientProfile), ('is_lawyer', LawyerProfile)):
+        if not getattr(instance, role):
+            continue
+        if loaded is not None and role in loaded:
+            granted = not loaded[role]
+        else:
+            # e.g. an instance that was just created, only an explicit update of the role counts
+            granted = update_fields is not None and role in update_fields
+        if granted:
+            model.objects.using(using).get_or_create(user=instance)
+
+
+def _batch():
+    return getattr(_state, 'batch', None)
+
+
+@contextmanager
+def side_effects_batched():
+    """
+    Collect the search reindexing and lawyer cache invalidation that the receivers below
+    do on every save, and run them once for the whole block when it exits.
+    """
+    if _batch() is not None:
+        yield
+        return
+    _state.batch = batch = {'index': set(), 'index_users': set(), 'unindex': set(), 'cities': set(), 'specializations': set()}
+    try:
+        yield
+    finally:
+        _state.batch = None
+        for using in {using for using, _ in batch['index'] | batch['index_users'] | batch['unindex']}:
+            lawyer_ids = [pk for db, pk in batch['index'] if db == using]
+            user_ids = [pk for db, pk in batch['index_users'] if db == using]
+            unindex_lawyers([pk for db, pk in batch['unindex'] if db == using], using=using)
+            index_lawyers(lawyer_ids=lawyer_ids, using=using)
+            index_lawyers(user_ids=user_ids, using=using)
+        if batch['cities'] or batch['specializations']:
+            invalidate_lawyers(cities=batch['cities'], specializations=batch['specializations'])
+
+
+def _index(using, lawyer_ids=(), user_ids=()):
+    batch = _batch()
+    if batch is None:
+        if lawyer_ids:
+            index_lawyers(lawyer_ids=list(lawyer_ids), using=using)
+        if user_ids:
+            index_lawyers(user_ids=list(user_ids), using=using)
+        return
+    batch['index'].update((using, pk) for pk in lawyer_ids)
+    batch['index_users'].update((using, pk) for pk in user_ids)
+
+
+def _unindex(using, lawyer_ids):
+    batch = _batch()
+    if batch is None:
+        unindex_lawyers(lawyer_ids, using=using)
+    else:
+        batch['unindex'].update((using, pk) for pk in lawyer_ids)
+
+
+def _invalidate(cities, specializations):
+    batch = _batch()
+    if batch is None:
+        invalidate_lawyers(cities=cities, specializations=specializations)
+    else:
+        batch['cities'].update(city for city in cities if city)
+        batch['specializations'].update(specialization for specialization in specializations if specialization)
+
+
+# Keep the lawyer search index in step with the columns it covers
+INDEXED_PROFILE_FIELDS = {name for name, _ in DOCUMENT_COLUMNS} - {'username'}
+
+@receiver(post_save, sender=LawyerProfile)
+@suppressible
+def index_lawyer_profile(sender, instance, using, update_fields=None, **kwargs):
+    if update_fields is not None and not INDEXED_PROFILE_FIELDS & set(update_fields):
+        return
+    _index(using, lawyer_ids=[instance.pk])
+
+@receiver(post_delete, sender=LawyerProfile)
+@suppressible
+def unindex_lawyer_profile(sender, instance, using, **kwargs):
+    _unindex(using, [instance.pk])
+
+@receiver(post_save, sender=User)
+@suppressible
+def index_lawyer_username(sender, instance, created, using, update_fields=None, **kwargs):
+    # Only the username is indexed from the user row, skip saves that can't have changed it
+    if created or not instance.is_lawyer:
+        return
+    if update_fields is not None and 'username' not in update_fields:
+        return
+    _index(using, user_ids=[instance.pk])
+
+
+# Cached lawyer data is versioned per city and specialization, bump both the old and the new ones
+@receiver(post_save, sender=LawyerProfile)
+@receiver(post_delete, sender=LawyerProfile)
+@suppressible
+def invalidate_lawyer_profile(sender, instance, **kwargs):
+    loaded = getattr(instance, '_loaded_values', {})
+    _invalidate(
+        cities=[instance.city, loaded.get('city')],
+        specializations=[instance.specialization, loaded.get('specialization')],
+    )
+
+# Listings show the lawyer's username and verification flag
+@receiver(post_save, sender=User)
+@suppressible
+def invalidate_lawyer_user(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and not {'username', 'is_verified'} & set(update_fields)):
+        return  # e.g. login only touches last_login
+    profile = LawyerProfile.objects.filter(user=instance).values('city', 'specialization').first()
+    if profile:
+        _invalidate(cities=[profile['city']], specializations=[profile['specialization']])
+
+# Reviews change the stored rating through a queryset update, which sends no signal of its own
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+@suppressible
+def invalidate_reviewed_lawyer(sender, instance, **kwargs):
+    profile = LawyerProfile.objects.filter(pk=instance.lawyer_id).values('city', 'specialization').first()
+    if profile:
+        _invalidate(cities=[profile['city']], specializations=[profile['specialization']])
+
+
+# The lawyer dashboard counts bookings, consultations and reviews
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+@suppressible
+def invalidate_booking_dashboard(sender, instance, **kwargs):
+    invalidate_lawyer_dashboard(user_id=instance.lawyer_id)
+
+@receiver(post_save, sender=Consultation)
+@receiver(post_delete, sender=Consultation)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+@suppressible
+def invalidate_profile_dashboard(sender, instance, **kwargs):
+    invalidate_lawyer_dashboard(profile_id=instance.lawyer_id)
+
+
+# Wake any open notification streams of the recipient
+@receiver(post_save, sender=Notification)
+@suppressible
+def publish_notification(sender, instance, created, **kwargs):
+    if created:
+        publish([instance.recipient_id])
+
 
+# Tokens carry the user's roles, so a change to them (or the password) retires the old tokens
 @receiver(post_save, sender=User)
-def save_profile(sender, instance, **kwargs):
-    if instance.is_client and hasattr(instance, 'clientprofile'):
-        instance.clientprofile.save()
-    elif instance.is_lawyer and hasattr(instance, 'lawyerprofile'):
-        instance.lawyerprofile.save()
+@suppressible
+def revoke_stale_tokens(sender, instance, created, **kwargs):
+    loaded = getattr(instance, '_loaded_values', None)
+    if created or loaded is None:
+        return
+    if any(field in loaded and loaded[field] != getattr(instance, field) for field in AUTH_FIELDS):
+        revoke_user_tokens(instance.pk)
+    loaded.update({field: getattr(instance, field) for field in AUTH_FIELDS if field in loaded})
@@ -1,3 +1,1691 @@
-from django.test import TestCase
+import base64
+from datetime import date, datetime, time, timedelta
+import json
+import os
+import random
+import re
+import shutil
+import tempfile
+from contextlib import asynccontextmanager
+from io import StringIO
+from itertools import count
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction
+from django.contrib.auth.hashers import PBKDF2SHA1PasswordHasher
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.http import JsonResponse
+from django.test import AsyncClient, TestCase, modify_settings, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path, reverse
+from django.utils import timezone
+from rest_framework.mixins import ListModelMixin
+from rest_framework.renderers import JSONRenderer
+from rest_framework.serializers import BaseSerializer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from legal_platform.database import parse_database_url, sqlite_tuning_options
+
+from . import geo, urls as user_urls
+from .authentication import revoke_user_tokens, tokens_for_user
+from .availability import SlotIndex
+from .recommendations import CandidateSet, get_candidates
+from .compiled import FastJSONRenderer, compile_serializer
+from .notifications import MAX_ATTEMPTS, claim_batch, dispatch_pending, notify
+from .profiling import RequestProfile, RequestProfilingMiddleware, registry
+from .routers import PrimaryReplicaRouter, ReadYourWritesMiddleware, is_pinned, reading_from_replica
+from .signals import side_effects_batched
+from .serializers import LawyerProfileSerializer, MatchedLawyerSerializer
+from .throttling import LoginRateThrottle
+from .models import (
+    User, ClientProfile, LawyerProfile, Booking, Consultation, Notification, OutboxMessage, Review,
+    BlackoutDate, WorkingHours,
+)
+
+
+_sequence = count(1)
+
+
+def make_client(**profile_fields):
+    n = next(_sequence)
+    user = User.objects.create_user(
+        username=f"client{n}", email=f"client{n}@example.com", password="password123", is_client=True
+    )
+    ClientProfile.objects.filter(user=user).update(**profile_fields)
+    return user
+
+
+def make_lawyer(**profile_fields):
+    # The signal would create the profile without a license number, so build it by hand
+    n = next(_sequence)
+    user = User.objects.create_user(
+        username=f"lawyer{n}", email=f"lawyer{n}@example.com", password="password123"
+    )
+    LawyerProfile.objects.create(user=user, license_number=f"LIC-{n}", **profile_fields)
+    user.is_lawyer = True
+    user.save(update_fields=["is_lawyer"])
+    return user
+
+
+class ListQueryCountMixin:
+    """Checks that a list endpoint's query count doesn't grow with the number of rows."""
+
+    def assertListQueriesConstant(self, url, add_rows, sizes=(1, 5)):
+        counts = []
+        for size in sizes:
+            add_rows(size)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.api.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            counts.append(len(queries))
+
+        self.assertEqual(
+            len(set(counts)), 1,
+            f"{url} ran {counts} queries for {list(sizes)} extra rows, expected a fixed count",
+        )
+
+
+# Hashing dominates test time otherwise
+FAST_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ListEndpointQueryCountTests(ListQueryCountMixin, TestCase):
+    def setUp(self):
+        self.api = APIClient()
+        self.client_user = make_client(city="Lagos")
+        self.lawyer_user = make_lawyer(city="Lagos", verified=True)
+        self.future = date.today() + timedelta(days=7)
+
+    def add_lawyers(self, n):
+        for _ in range(n):
+            make_lawyer(city="Lagos", verified=True)
+
+    def add_consultations(self, n):
+        # One slot per consultation, a lawyer can't hold the same date and time twice
+        for _ in range(n):
+            Consultation.objects.create(
+                client=make_client().clientprofile,
+                lawyer=self.lawyer_user.lawyer_profile,
+                date=self.future + timedelta(days=next(_sequence)),
+                time="10:00:00",
+            )
+
+    def add_bookings(self, n):
+        for _ in range(n):
+            Booking.objects.create(
+                client=self.client_user, lawyer=self.lawyer_user, appointment_date=timezone.now()
+            )
+
+    def test_lawyer_list(self):
+        self.api.force_authenticate(self.client_user)
+        self.assertListQueriesConstant(reverse("lawyer-list"), self.add_lawyers)
+
+    def test_match_lawyers(self):
+        self.api.force_authenticate(self.client_user)
+        self.assertListQueriesConstant(reverse("match-lawyers"), self.add_lawyers)
+
+    def test_client_list(self):
+        self.api.force_authenticate(self.lawyer_user)
+        self.assertListQueriesConstant(
+            reverse("client-list"), lambda n: [make_client() for _ in range(n)]
+        )
+
+    def test_booking_lists(self):
+        self.api.force_authenticate(self.client_user)
+        self.assertListQueriesConstant(reverse("client-bookings"), self.add_bookings)
+        self.api.force_authenticate(self.lawyer_user)
+        self.assertListQueriesConstant(reverse("lawyer-bookings"), self.add_bookings)
+
+    def test_consultation_list(self):
+        self.api.force_authenticate(self.client_user)
+        self.assertListQueriesConstant(reverse("consultation-list-create"), self.add_consultations)
+
+    def test_notification_list(self):
+        self.api.force_authenticate(self.client_user)
+        self.assertListQueriesConstant(
+            reverse("notification-list"),
+            lambda n: Notification.objects.bulk_create(
+                Notification(recipient=self.client_user, message="Hello") for _ in range(n)
+            ),
+        )
+
+    def test_review_list(self):
+        def add_reviews(n):
+            for _ in range(n):
+                Review.objects.create(
+                    client=self.client_user.clientprofile,
+                    lawyer=make_lawyer().lawyer_profile,
+                    rating=4,
+                )
+
+        # The list only holds the client's own reviews
+        self.api.force_authenticate(self.client_user)
+        self.assertListQueriesConstant(reverse("review-list-create"), add_reviews)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class RatingAggregateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.api = APIClient()
+        self.lawyer = make_lawyer(city="Lagos", verified=True).lawyer_profile
+
+    def review(self, rating, client=None):
+        client = client or make_client()
+        consultation = Consultation.objects.create(
+            client=client.clientprofile, lawyer=self.lawyer, date=date(2030, 1, 1) + timedelta(days=next(_sequence)), time="10:00:00",
+        )
+        self.api.force_authenticate(client)
+        return self.api.post(reverse("review-list-create"), {"consultation": consultation.pk, "rating": rating})
+
+    def assertRating(self, count, total, avg):
+        self.lawyer.refresh_from_db()
+        self.assertEqual((self.lawyer.rating_count, self.lawyer.rating_sum, self.lawyer.rating_avg), (count, total, avg))
+
+    def test_review_writes_keep_aggregates(self):
+        first = self.review(4)
+        self.assertEqual(first.status_code, 201, first.content)
+        self.assertRating(1, 4, 4.0)
+        self.review(2)
+        self.assertRating(2, 6, 3.0)
+
+        # The last request was the second client's, who can't see the first review
+        self.assertEqual(self.api.patch(reverse("review-detail", args=[first.data["id"]]), {"rating": 5}).status_code, 404)
+        self.api.force_authenticate(Review.objects.get(pk=first.data["id"]).client.user)
+        self.assertEqual(self.api.patch(reverse("review-detail", args=[first.data["id"]]), {"rating": 5}).status_code, 200)
+        self.assertRating(2, 7, 3.5)
+        self.assertEqual(self.api.delete(reverse("review-detail", args=[first.data["id"]])).status_code, 204)
+        self.assertRating(1, 2, 2.0)
+
+    def test_rejected_reviews_leave_aggregates_alone(self):
+        client = make_client()
+        self.assertEqual(self.review(5, client).status_code, 201)
+        duplicate = self.review(3, client)
+        self.assertEqual(duplicate.status_code, 400)
+        self.assertEqual(duplicate.json(), {"error": "You have already reviewed this lawyer."})
+
+        self.api.force_authenticate(make_client())
+        self.assertEqual(self.api.post(reverse("review-list-create"), {"rating": 3}).status_code, 400)
+        other = Consultation.objects.filter(client=client.clientprofile).first()
+        self.assertEqual(self.api.post(reverse("review-list-create"), {"consultation": other.pk, "rating": 3}).status_code, 400)
+
+        self.api.force_authenticate(make_lawyer())
+        response = self.api.post(reverse("review-list-create"), {"consultation": other.pk, "rating": 1})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json(), {"error": "Only clients can review lawyers."})
+        self.assertEqual(self.api.get(reverse("review-detail", args=[Review.objects.get().pk])).status_code, 404)
+        self.assertRating(1, 5, 5.0)
+
+    def test_rebuild_ratings(self):
+        self.review(5)
+        self.review(2)
+        LawyerProfile.objects.filter(pk=self.lawyer.pk).update(rating_count=9, rating_sum=1, rating_avg=0.1)
+        call_command("rebuild_ratings", stdout=StringIO())
+        self.assertRating(2, 7, 3.5)
+
+    def test_rebuild_ratings_refreshes_cached_lists(self):
+        self.review(4)
+        self.api.force_authenticate(make_client())
+
+        def rating():
+            return self.api.get(reverse("lawyer-list")).json()["results"][0]["rating_avg"]
+
+        self.assertEqual(rating(), 4.0)
+
+        Review.objects.update(rating=2)  # Behind the signals' back, like a bulk import
+        self.assertEqual(rating(), 4.0)
+        call_command("rebuild_ratings", stdout=StringIO())
+        self.assertEqual(rating(), 2.0)
+
+    def test_lawyer_list_filters_and_orders_by_rating(self):
+        self.review(3)
+        better = make_lawyer(city="Lagos", verified=True).lawyer_profile
+        Review.objects.create(client=make_client().clientprofile, lawyer=better, rating=5)
+        LawyerProfile.rebuild_ratings(LawyerProfile.objects.filter(pk=better.pk))
+        unrated = make_lawyer(city="Lagos", verified=True).lawyer_profile
+
+        self.api.force_authenticate(make_client())
+        rows = self.api.get(reverse("lawyer-list"), {"ordering": "-rating_avg"}).json()["results"]
+        self.assertEqual([row["id"] for row in rows], [better.pk, self.lawyer.pk, unrated.pk])
+        rows = self.api.get(reverse("lawyer-list"), {"rating_avg__gte": 4}).json()["results"]
+        self.assertEqual([(row["id"], row["rating_avg"], row["rating_count"]) for row in rows], [(better.pk, 5.0, 1)])
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(make_client())
+        # Several lawyers share an experience value, so the id tie-breaker matters
+        self.lawyers = [make_lawyer(experience=years) for years in (5, 3, 3, 3, 1)]
+
+    def walk(self, url, link):
+        ids, pages = [], 0
+        while url:
+            body = self.api.get(url).json()
+            ids.extend(row["id"] for row in body["results"])
+            url, pages = body[link], pages + 1
+        return ids, pages
+
+    def test_pages_cover_every_row_once_in_order(self):
+        ids, pages = self.walk(reverse("lawyer-list") + "?page_size=2", "next")
+        expected = list(
+            LawyerProfile.objects.order_by("-experience", "-id").values_list("id", flat=True)
+        )
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, 3)
+
+    def test_previous_links_walk_back(self):
+        url = reverse("lawyer-list") + "?page_size=2&ordering=experience"
+        body = self.api.get(url).json()
+        last_page = self.api.get(self.api.get(body["next"]).json()["next"]).json()
+        self.assertIsNone(last_page["next"])
+
+        ids, _ = self.walk(last_page["previous"], "previous")
+        expected = list(LawyerProfile.objects.order_by("experience", "id").values_list("id", flat=True))
+        self.assertEqual(ids, expected[2:4] + expected[:2])
+
+    def test_cursor_from_another_ordering_is_rejected(self):
+        body = self.api.get(reverse("lawyer-list") + "?page_size=2").json()
+        response = self.api.get(body["next"] + "&ordering=experience")
+        self.assertEqual(response.status_code, 404)
+
+    def test_forged_cursor_is_rejected(self):
+        ordering = ["-experience", "-id"]
+        for key in ([{"gt": 1}, 1], ["five", 1], [None, 1], [3, [1]]):
+            token = json.dumps({"k": key, "o": ordering}).encode()
+            cursor = base64.urlsafe_b64encode(token).decode()
+            response = self.api.get(reverse("lawyer-list"), {"page_size": 2, "cursor": cursor})
+            self.assertEqual(response.status_code, 404, key)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class CompiledSerializerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        make_lawyer(address="12 \u2028 \"Quoted\" Street", location="Ikeja", latitude=6.45, longitude=3.39, rating_avg=4.25)
+        unlicensed = make_lawyer(address="Ọ̀sun Road", verified=True, experience=7)
+        LawyerProfile.objects.filter(user=unlicensed).update(license_number=None)
+        User.objects.filter(pk=make_lawyer(city="Abuja").pk).update(is_verified=True, username="José")
+
+    def test_output_matches_the_serializer_byte_for_byte(self):
+        queryset = LawyerProfile.objects.order_by("id")
+        compiled = compile_serializer(LawyerProfileSerializer)
+        expected = JSONRenderer().render(LawyerProfileSerializer(queryset, many=True).data)
+        self.assertEqual(FastJSONRenderer().render(compiled.many(queryset.values(*compiled.columns))), expected)
+
+    def test_lawyer_list_matches_the_serializer(self):
+        api = APIClient()
+        api.force_authenticate(make_client())
+        response = api.get(reverse("lawyer-list"), {"ordering": "user__username"})
+        queryset = LawyerProfile.objects.order_by("user__username", "id")
+        expected = LawyerProfileSerializer(queryset, many=True).data
+        self.assertEqual(response.json()["results"], json.loads(JSONRenderer().render(expected)))
+
+    def test_unsupported_fields_are_refused(self):
+        with self.assertRaises(ImproperlyConfigured):
+            compile_serializer(MatchedLawyerSerializer)  # score and distance_km are method fields
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class SparseFieldsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client_user = make_client(city="Lagos")
+        self.lawyer = make_lawyer(city="Lagos", verified=True, specialization="Tax Law")
+        self.api = APIClient()
+        self.api.force_authenticate(self.client_user)
+
+    def get(self, name, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.api.get(reverse(name), params)
+        self.assertEqual(response.status_code, 200, response.content)
+        selects = [q["sql"] for q in queries if q["sql"].startswith("SELECT") and "users_lawyerprofile" in q["sql"]]
+        return response.json(), selects[-1]
+
+    def test_lawyer_list_reads_only_the_projected_columns(self):
+        body, sql = self.get("lawyer-list", {"fields": "id,specialization,city,user.username"})
+        self.assertEqual(
+            body["results"],
+            [{"id": self.lawyer.lawyer_profile.id, "user": {"username": self.lawyer.username},
+              "specialization": "Tax Law", "city": "Lagos"}],
+        )
+        self.assertNotIn("license_number", sql)
+        self.assertNotIn('"users_user"."email"', sql)
+
+        body, sql = self.get("lawyer-list", {"fields": "id, city"})
+        self.assertEqual(body["results"], [{"id": self.lawyer.lawyer_profile.id, "city": "Lagos"}])
+        self.assertNotIn("users_user", sql)
+
+    def test_nested_objects_collapse_unless_expanded(self):
+        body, _ = self.get("lawyer-list", {"fields": "id,user"})
+        self.assertEqual(body["results"][0]["user"], self.lawyer.id)
+        body, _ = self.get("lawyer-list", {"fields": "id,user", "expand": "user"})
+        self.assertEqual(body["results"][0]["user"]["email"], self.lawyer.email)
+        # No projection, no change
+        body, _ = self.get("lawyer-list", {})
+        self.assertEqual(body["results"][0]["license_number"], self.lawyer.lawyer_profile.license_number)
+
+    def test_unknown_fields_are_rejected(self):
+        self.assertEqual(self.api.get(reverse("lawyer-list"), {"fields": "id,password"}).status_code, 400)
+        self.assertEqual(self.api.get(reverse("lawyer-list"), {"fields": "city.name"}).status_code, 400)
+
+    def test_client_list_and_matches(self):
+        api = APIClient()
+        api.force_authenticate(self.lawyer)
+        response = api.get(reverse("client-list"), {"fields": "id,city"})
+        self.assertEqual(response.json()["results"], [{"id": self.client_user.clientprofile.id, "city": "Lagos"}])
+
+        body, sql = self.get("match-lawyers", {"fields": "id,score"})
+        self.assertEqual(set(body[0]), {"id", "score"})
+        self.assertNotIn("license_number", sql)
+
+
+class BrokenChannel:
+    def send(self, messages):
+        raise RuntimeError("gateway down")
+
+
+@override_settings(
+    PASSWORD_HASHERS=FAST_HASHERS,
+    NOTIFICATION_CHANNELS={"broken": "users.tests.BrokenChannel"},
+    NOTIFICATION_DEFAULT_CHANNELS=["in_app", "email"],
+)
+class NotificationOutboxTests(TestCase):
+    def setUp(self):
+        self.user = make_client()
+
+    def test_notify_queues_until_dispatched(self):
+        message = notify(self.user, "Your booking is confirmed.")
+        self.assertEqual((message.status, message.channels), ("pending", "in_app,email"))
+        self.assertFalse(Notification.objects.exists())
+
+        self.assertEqual(dispatch_pending(), 1)
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.channels, message.attempts), ("sent", "", 0))
+        self.assertEqual(list(Notification.objects.values_list("recipient", "message")), [(self.user.pk, "Your booking is confirmed.")])
+        self.assertEqual([email.to for email in mail.outbox], [[self.user.email]])
+        self.assertEqual(dispatch_pending(), 0)
+
+    def test_claims_are_exclusive_until_they_expire(self):
+        first, second = notify(self.user, "one"), notify(self.user, "two")
+        self.assertEqual([message.pk for message in claim_batch(1)], [first.pk])
+        self.assertEqual([message.pk for message in claim_batch(10)], [second.pk])
+        self.assertEqual(claim_batch(10), [])
+
+        # A worker that died mid-batch leaves its rows to be claimed again
+        OutboxMessage.objects.filter(pk=first.pk).update(available_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual([message.pk for message in claim_batch(10)], [first.pk])
+
+    def test_failed_channel_backs_off_without_repeating_the_others(self):
+        message = notify(self.user, "Reminder", channels=["in_app", "broken"])
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            started = timezone.now()
+            with self.assertLogs("users.notifications", "ERROR"):
+                self.assertEqual(dispatch_pending(), 1)
+            message.refresh_from_db()
+            self.assertEqual((message.channels, message.attempts), ("broken", attempt))
+            self.assertEqual(message.last_error, "broken: gateway down")
+            if attempt < MAX_ATTEMPTS:
+                self.assertEqual(message.status, "pending")
+                backoff = (message.available_at - started).total_seconds()
+                self.assertAlmostEqual(backoff, 30 * 2 ** (attempt - 1), delta=1)
+                self.assertEqual(dispatch_pending(), 0)  # Not due yet
+                OutboxMessage.objects.filter(pk=message.pk).update(available_at=started)
+        self.assertEqual(message.status, "failed")
+        self.assertEqual(Notification.objects.count(), 1)  # In-app was delivered once
+
+    def test_process_notifications_command(self):
+        for n in range(3):
+            notify(self.user, f"Message {n}")
+        out = StringIO()
+        call_command("process_notifications", "--once", "--batch-size", "2", stdout=out)
+        self.assertIn("Processed 3 notification(s) in total.", out.getvalue())
+        self.assertEqual(OutboxMessage.objects.filter(status="sent").count(), 3)
+        self.assertEqual(len(mail.outbox), 3)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class NotificationPollTests(TestCase):
+    def setUp(self):
+        self.user = make_client()
+        self.headers = {"Authorization": f"Bearer {AccessToken.for_user(self.user)}"}
+        self.url = reverse("notification-poll")
+
+    def test_returns_notifications_after_cursor(self):
+        first, second = (Notification.objects.create(recipient=self.user, message=m) for m in ("a", "b"))
+        Notification.objects.create(recipient=make_client(), message="not mine")
+
+        body = self.client.get(f"{self.url}?cursor={first.id}", headers=self.headers).json()
+        self.assertEqual([row["id"] for row in body["results"]], [second.id])
+        self.assertEqual(body["cursor"], second.id)
+
+    def test_times_out_empty_from_latest(self):
+        latest = Notification.objects.create(recipient=self.user, message="old")
+        body = self.client.get(f"{self.url}?timeout=0", headers=self.headers).json()
+        self.assertEqual(body, {"cursor": latest.id, "results": []})
+
+    def test_requires_token(self):
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+        self.assertEqual(self.client.get(f"{self.url}?access_token=junk").status_code, 401)
+
+
+# Short polls, so an idle stream sends its heartbeat right away
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, NOTIFICATION_STREAM_POLL_SECONDS=0.01)
+class NotificationStreamTests(TestCase):
+    def setUp(self):
+        self.user = make_client()
+        self.headers = {"Authorization": f"Bearer {AccessToken.for_user(self.user)}"}
+        self.first, self.second = (Notification.objects.create(recipient=self.user, message=m) for m in ("a", "b"))
+
+    @asynccontextmanager
+    async def stream(self, **headers):
+        response = await self.async_client.get(reverse("notification-stream"), headers={**self.headers, **headers})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        content = response.streaming_content
+        try:
+            yield content
+        finally:
+            await content.aclose()  # The stream never ends by itself
+
+    def assertEvent(self, chunk, notification):
+        event_id, event, data = chunk.decode().removesuffix("\n\n").split("\n")
+        self.assertEqual((event_id, event), (f"id: {notification.id}", "event: notification"))
+        self.assertEqual(json.loads(data.removeprefix("data: "))["message"], notification.message)
+
+    async def test_resumes_after_last_event_id(self):
+        async with self.stream(**{"Last-Event-ID": str(self.first.id)}) as content:
+            self.assertEqual(await anext(content), b"retry: 5000\n\n")
+            self.assertEvent(await anext(content), self.second)  # The first one was already delivered
+            self.assertEqual(await anext(content), b": keep-alive\n\n")
+
+    async def test_new_stream_starts_after_the_latest(self):
+        async with self.stream() as content:
+            self.assertEqual(await anext(content), b"retry: 5000\n\n")
+            self.assertEqual(await anext(content), b": keep-alive\n\n")
+            third = await Notification.objects.acreate(recipient=self.user, message="c")
+            chunk = await anext(content)
+            while chunk == b": keep-alive\n\n":
+                chunk = await anext(content)
+            self.assertEvent(chunk, third)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class NotificationReadStateTests(TestCase):
+    def setUp(self):
+        self.user = make_client()
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+        self.notifications = [Notification.objects.create(recipient=self.user, message=str(i)) for i in range(4)]
+        Notification.objects.create(recipient=make_client(), message="someone else's")
+
+    def unread(self):
+        return self.api.get(reverse("notification-unread-count")).json()["unread"]
+
+    def test_mark_read_up_to_cursor(self):
+        self.assertEqual(self.unread(), 4)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.api.post(reverse("notification-mark-read"), {"up_to": self.notifications[1].id})
+        self.assertEqual(response.json(), {"marked_read": 2})
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(self.unread(), 2)
+
+        self.api.post(reverse("notification-mark-read"))
+        self.assertEqual(self.unread(), 0)
+        self.assertEqual(Notification.objects.filter(is_read=False).count(), 1)
+
+    def test_mark_single_read(self):
+        response = self.api.put(reverse("notification-read", args=[self.notifications[0].id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.unread(), 3)
+        other = Notification.objects.exclude(recipient=self.user).get()
+        self.assertEqual(self.api.put(reverse("notification-read", args=[other.id])).status_code, 404)
+
+    def test_purge_removes_only_old_read_rows(self):
+        old = timezone.now() - timedelta(days=120)
+        Notification.objects.filter(pk__in=[n.id for n in self.notifications[:3]]).update(created_at=old)
+        Notification.objects.filter(pk__in=[n.id for n in self.notifications[1:]]).update(is_read=True)
+
+        call_command("purge_notifications", days=90, batch_size=1, stdout=StringIO())
+        remaining = set(Notification.objects.filter(recipient=self.user).values_list("id", flat=True))
+        self.assertEqual(remaining, {self.notifications[0].id, self.notifications[3].id})
+
+
+class SlotIndexTests(TestCase):
+    def test_overlaps(self):
+        index = SlotIndex([(9, 10), (13, 17), (11, 12)])
+        self.assertTrue(index.overlaps(9, 10))
+        self.assertTrue(index.overlaps(16, 18))
+        self.assertFalse(index.overlaps(10, 11))
+        self.assertFalse(index.overlaps(12, 13))
+        self.assertFalse(index.overlaps(17, 20))
+        # A long interval is found even when shorter ones start after it
+        self.assertTrue(SlotIndex([(0, 100), (10, 11)]).overlaps(50, 51))
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class AvailabilityTests(TestCase):
+    def setUp(self):
+        self.client_user = make_client()
+        self.api = APIClient()
+        self.api.force_authenticate(self.client_user)
+        self.lawyer = make_lawyer(specialization="Tax Law", slot_minutes=30).lawyer_profile
+
+        # Next Monday, at least a week out
+        today = timezone.localdate()
+        self.day = today + timedelta(days=7 + (7 - today.weekday()) % 7)
+        WorkingHours.objects.create(lawyer=self.lawyer, weekday=0, start_time=time(9), end_time=time(11))
+
+    def at(self, hour, minute=0):
+        return timezone.make_aware(datetime.combine(self.day, time(hour, minute)))
+
+    def book(self, hour, minute=0):
+        return self.api.post(
+            reverse("create-booking"),
+            {"lawyer": self.lawyer.user_id, "appointment_date": self.at(hour, minute).isoformat()},
+        )
+
+    def consult(self, hour, minute=0):
+        return self.api.post(
+            reverse("consultation-list-create"),
+            {"lawyer": self.lawyer.pk, "date": self.day.isoformat(), "time": f"{hour:02}:{minute:02}:00"},
+        )
+
+    def test_double_booking_is_rejected(self):
+        self.assertEqual(self.book(9).status_code, 201)
+        self.assertEqual(self.book(9).status_code, 400)
+        # A consultation can't take the slot a booking holds either
+        self.assertEqual(self.consult(9).status_code, 400)
+        self.assertEqual(self.consult(9, 30).status_code, 201)
+        self.assertEqual(Booking.objects.count() + Consultation.objects.count(), 2)
+
+    def test_slots_must_fit_working_hours(self):
+        self.assertEqual(self.book(9, 15).status_code, 400)  # Off the 30 minute grid
+        self.assertEqual(self.book(10, 30).status_code, 201)  # Last slot of the window
+        self.assertEqual(self.book(11).status_code, 400)
+        BlackoutDate.objects.create(lawyer=self.lawyer, date=self.day)
+        self.assertEqual(self.book(9).status_code, 400)
+
+    def test_free_slots(self):
+        self.book(9, 30)
+        self.consult(10)
+        url = reverse("lawyer-free-slots", args=[self.lawyer.pk])
+        body = self.api.get(f"{url}?start={self.day}&end={self.day + timedelta(days=1)}").json()
+
+        self.assertEqual(body["slot_minutes"], 30)
+        self.assertEqual([day["date"] for day in body["days"]], [str(self.day), str(self.day + timedelta(days=1))])
+        self.assertEqual(len(body["days"][0]["slots"]), 2)
+        self.assertEqual(body["days"][1]["slots"], [])
+
+    def test_reschedule_into_taken_slot_conflicts(self):
+        self.book(9)
+        self.consult(10)
+        consultation = Consultation.objects.get()
+        url = reverse("consultation-reschedule", args=[consultation.pk])
+
+        response = self.api.put(url, {"date": str(self.day), "time": "09:00:00"})
+        self.assertEqual(response.status_code, 409)
+        response = self.api.put(url, {"date": str(self.day), "time": "10:30:00"})
+        self.assertEqual(response.status_code, 200)
+
+    def test_booking_status_update_changes_only_the_status(self):
+        self.book(9)
+        self.book(9, 30)
+        booking = Booking.objects.get(appointment_date=self.at(9, 30))
+        api = APIClient()
+        api.force_authenticate(self.lawyer.user)
+        url = reverse("update-booking-status", args=[booking.pk])
+
+        # Moving it onto the other booking, or into the past, is not this endpoint's business
+        response = api.patch(url, {"status": "confirmed", "appointment_date": self.at(9).isoformat()})
+        self.assertEqual(response.status_code, 200)
+        response = api.patch(url, {"status": "confirmed", "appointment_date": "2000-01-01T09:00:00Z"})
+        self.assertEqual(response.status_code, 200)
+        booking.refresh_from_db()
+        self.assertEqual((booking.status, booking.appointment_date), ("confirmed", self.at(9, 30)))
+        self.assertEqual(api.patch(url, {"status": "pending"}).status_code, 400)
+
+        # A canceled slot taken since can't be confirmed again
+        api.patch(url, {"status": "canceled"})
+        self.assertEqual(self.book(9, 30).status_code, 201)
+        self.assertEqual(api.patch(url, {"status": "confirmed"}).status_code, 409)
+
+    def test_lawyer_sets_availability(self):
+        api = APIClient()
+        api.force_authenticate(self.lawyer.user)
+        response = api.put(reverse("lawyer-availability"), {
+            "slot_minutes": 45,
+            "working_hours": [{"weekday": 1, "start_time": "08:00", "end_time": "12:00"}],
+            "blackout_dates": [{"date": str(self.day), "reason": "Court"}],
+        }, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(self.lawyer.working_hours.values_list("weekday", flat=True)), [1])
+
+        overlapping = [
+            {"weekday": 1, "start_time": "08:00", "end_time": "12:00"},
+            {"weekday": 1, "start_time": "11:00", "end_time": "13:00"},
+        ]
+        response = api.patch(reverse("lawyer-availability"), {"working_hours": overlapping}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class LawyerSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.api = APIClient()
+        self.api.force_authenticate(make_client())
+        self.tax = make_lawyer(specialization="Tax Law", city="Lagos", address="1 Marina").lawyer_profile
+        self.taxation_street = make_lawyer(specialization="Family Law", city="Abuja", address="12 Taxation Street").lawyer_profile
+        self.family = make_lawyer(specialization="Family Law", city="Kano", address="4 Bank Road").lawyer_profile
+
+    def search(self, query):
+        response = self.api.get(reverse("lawyer-list"), {"search": query})
+        self.assertEqual(response.status_code, 200, response.content)
+        return [row["id"] for row in response.json()["results"]]
+
+    def indexed(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT rowid FROM users_lawyer_search ORDER BY rowid")
+            return [row[0] for row in cursor.fetchall()]
+
+    def test_prefix_matching_and_rank(self):
+        # A specialization hit outranks an address hit
+        self.assertEqual(self.search("tax"), [self.tax.pk, self.taxation_street.pk])
+        self.assertEqual(self.search("Ta"), [self.tax.pk, self.taxation_street.pk])
+        self.assertEqual(sorted(self.search("fam")), sorted([self.taxation_street.pk, self.family.pk]))
+        self.assertEqual(self.search("family abuja"), [self.taxation_street.pk])  # Every term must match
+
+    def test_query_syntax_is_plain_text(self):
+        self.assertEqual(self.search("tax*"), self.search("tax"))
+        self.assertEqual(self.search('"tax" -law'), [self.tax.pk, self.taxation_street.pk])  # Not a NOT
+        self.assertEqual(self.search("^tax"), [self.tax.pk, self.taxation_street.pk])
+        # Operators and column filters are searched for as words, which no lawyer has
+        for query in ["tax OR family", "NEAR(tax law)", "city:Kano", '"', "("]:
+            self.assertEqual(self.search(query), [], query)
+
+    def test_index_follows_saves_and_deletes(self):
+        user = self.family.user
+        user.username = "zelda"
+        user.save()
+        self.assertEqual(self.search("zel"), [self.family.pk])
+
+        self.family.city = "Maiduguri"
+        self.family.save()
+        self.assertEqual(self.search("maid"), [self.family.pk])
+        self.assertEqual(self.search("kano"), [])
+
+        self.tax.user.delete()
+        self.assertEqual(self.indexed(), sorted([self.taxation_street.pk, self.family.pk]))
+
+    def test_rebuild_search_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM users_lawyer_search")
+        self.assertEqual(self.search("tax"), [])
+        call_command("rebuild_search_index", stdout=StringIO())
+        self.assertEqual(self.search("tax"), [self.tax.pk, self.taxation_street.pk])
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class NearestLawyerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def place(self, latitude, longitude, **fields):
+        fields.setdefault("verified", True)
+        return make_lawyer(latitude=latitude, longitude=longitude, **fields).lawyer_profile
+
+    def assertMatchesBruteForce(self, latitude, longitude, radius_km):
+        expected = sorted(
+            (distance, profile.pk)
+            for profile in LawyerProfile.objects.all()
+            for distance in [geo.distance_km(latitude, longitude, profile.latitude, profile.longitude)]
+            if distance <= radius_km
+        )
+        found = geo.nearest(LawyerProfile.objects.all(), latitude, longitude, radius_km, limit=1000)
+        self.assertEqual([pk for pk, _ in found], [pk for _, pk in expected], (latitude, longitude, radius_km))
+        return len(expected)
+
+    def test_pole_and_antimeridian(self):
+        # Across the pole: the same latitude band, on the far side of it
+        across_pole = self.place(89.9, -170.0)
+        beside_pole = self.place(89.8, 100.0)
+        self.place(89.0, 10.0)  # 105 km away
+        self.assertEqual(
+            [pk for pk, _ in geo.nearest(LawyerProfile.objects.all(), 89.95, 10.0, 50, 10)],
+            [across_pole.pk, beside_pole.pk],
+        )
+        self.assertEqual(self.assertMatchesBruteForce(-89.99, 45.0, 50), 0)
+
+        east = self.place(0.5, -179.9)
+        west = self.place(0.5, 179.9)
+        self.assertEqual(self.assertMatchesBruteForce(0.5, 179.98, 25), 2)
+        self.assertEqual(self.assertMatchesBruteForce(0.5, -179.98, 25), 2)
+        self.assertEqual(geo.nearest(LawyerProfile.objects.all(), 0.5, 179.98, 25, 1)[0][0], west.pk)
+        self.assertEqual(geo.nearest(LawyerProfile.objects.all(), 0.5, -179.98, 25, 1)[0][0], east.pk)
+
+    def test_matches_brute_force(self):
+        rng = random.Random(7)
+        centres = [(6.5244, 3.3792), (64.1, -21.9), (70.0, 179.5), (-89.5, 0.0), (89.7, 45.0)]
+        for latitude, longitude in centres:
+            for _ in range(15):
+                self.place(
+                    min(90.0, max(-90.0, latitude + rng.uniform(-0.8, 0.8))),
+                    (longitude + rng.uniform(-4, 4) + 180) % 360 - 180,
+                )
+        found = 0
+        for latitude, longitude in centres:
+            for radius_km in (5, 25, 60):
+                found += self.assertMatchesBruteForce(latitude, longitude, radius_km)
+        self.assertGreater(found, 20)
+
+    def test_rank_by_distance(self):
+        api = APIClient()
+        api.force_authenticate(make_client(city="Lagos", latitude=6.5244, longitude=3.3792))
+        one_km = self.place(6.5244, 3.3882, city="Ibadan")  # Matches ignore the city in this mode
+        five_km = self.place(6.5694, 3.3792, city="Lagos")
+        self.place(6.8844, 3.3792, city="Lagos")  # 40 km
+        self.place(6.5244, 3.3972, city="Lagos", verified=False)
+        two_km = self.place(6.5244, 3.3972, city="Lagos", specialization="Tax Law")
+
+        rows = api.get(reverse("match-lawyers"), {"rank": "distance", "radius": 30}).json()
+        self.assertEqual([row["id"] for row in rows], [one_km.pk, two_km.pk, five_km.pk])
+        self.assertEqual([row["distance_km"] for row in rows], [0.99, 1.99, 5.0])
+        self.assertIsNone(rows[0]["score"])
+        rows = api.get(reverse("match-lawyers"), {"rank": "distance", "radius": 30, "limit": 1}).json()
+        self.assertEqual([row["id"] for row in rows], [one_km.pk])
+        rows = api.get(reverse("match-lawyers"), {"rank": "distance", "specialization": "Tax Law"}).json()
+        self.assertEqual([row["distance_km"] for row in rows], [1.99])
+        rows = api.get(reverse("match-lawyers"), {"rank": "distance", "lat": 0.5, "lng": 179.99, "radius": 30}).json()
+        self.assertEqual(rows, [])
+        for bad in ({"lat": "nan", "lng": 3}, {"lat": 6.5, "lng": "inf"}, {"radius": "-inf"}):
+            response = api.get(reverse("match-lawyers"), {"rank": "distance", **bad})
+            self.assertEqual(response.status_code, 400, bad)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class RecommendationTests(TestCase):
+    # (id, latitude, longitude, specialization, experience, rating_avg, rating_count, load)
+    ROWS = [
+        (1, 0.0, 0.0, "Tax Law", 15, 4.0, 5, 1),
+        (2, None, None, "Corporate Tax", 40, 5.0, 0, 0),
+        (3, 0.0, 0.9, "Family Law", 0, 2.0, 15, 3),
+    ]
+
+    def setUp(self):
+        cache.clear()
+        self.candidates = CandidateSet.from_rows(self.ROWS, "Tax Law")
+
+    def assertRanked(self, ranked, expected):
+        self.assertEqual([pk for pk, _, _ in ranked], [pk for pk, _, _ in expected])
+        for (_, score, distance), (_, expected_score, expected_distance) in zip(ranked, expected):
+            self.assertAlmostEqual(score, expected_score, places=6)
+            if expected_distance is None:
+                self.assertIsNone(distance)
+            else:
+                self.assertAlmostEqual(distance, expected_distance, places=3)
+
+    def test_scores(self):
+        # Weights: distance .35, specialization .25, rating .2, experience .1, load .1.
+        # Ratings are pulled towards 3.5 as if the lawyer had 5 more reviews at that mean.
+        distance = 0.9 * geo.KM_PER_DEGREE  # Along the equator
+        first = 0.35 * 1 + 0.25 * 1 + 0.2 * (4.0 * 5 + 3.5 * 5) / 10 / 5 + 0.1 * 15 / 30 + 0.1 / 2
+        # "Corporate Tax" shares "tax" with "Tax Law", experience is capped at 30 years
+        second = 0.25 * 0.5 + 0.2 * 3.5 / 5 + 0.1 * 1 + 0.1 * 1
+        third = 0.35 * (1 - distance / 200) + 0.2 * (2.0 * 15 + 3.5 * 5) / 20 / 5 + 0.1 / 4
+        self.assertAlmostEqual(first, 0.85)
+        self.assertAlmostEqual(second, 0.465)
+        self.assertAlmostEqual(third, 0.2949, places=4)
+        self.assertRanked(
+            self.candidates.rank(10, latitude=0.0, longitude=0.0, radius_km=200),
+            [(1, first, 0.0), (2, second, None), (3, third, distance)],
+        )
+        # Without a location nobody gets distance credit
+        self.assertRanked(
+            self.candidates.rank(10),
+            [(1, first - 0.35, None), (2, second, None), (3, third - 0.35 * (1 - distance / 200), None)],
+        )
+
+    def test_filters_and_limit(self):
+        ranked = self.candidates.rank(10, latitude=0.0, longitude=0.0, radius_km=50)
+        self.assertEqual([pk for pk, _, _ in ranked], [1, 2])  # Lawyers without coordinates stay in
+        self.assertEqual([pk for pk, _, _ in self.candidates.rank(10, min_rating=3)], [1, 2])
+        self.assertEqual([pk for pk, _, _ in self.candidates.rank(1)], [1])
+        twins = CandidateSet.from_rows([(9, None, None, "Tax Law", 3, 0, 0, 0), (4, None, None, "Tax Law", 3, 0, 0, 0)])
+        self.assertEqual([pk for pk, _, _ in twins.rank(2)], [4, 9])  # Ties go to the lower id
+        self.assertEqual(CandidateSet.from_rows([]).rank(5), [])
+
+    def test_cached_per_city_version(self):
+        lawyer = make_lawyer(city="Lagos", verified=True, experience=3).lawyer_profile
+        make_lawyer(city="Abuja", verified=True)
+        self.assertEqual(list(get_candidates("Lagos").ids), [lawyer.pk])
+        with self.assertNumQueries(0):
+            get_candidates("Lagos")
+
+        other = make_lawyer(city="Lagos", verified=True).lawyer_profile
+        self.assertEqual(sorted(get_candidates("Lagos").ids), [lawyer.pk, other.pk])
+        get_candidates("Abuja")
+        lawyer.experience = 30
+        lawyer.save()
+        self.assertEqual(get_candidates("Lagos").components["experience"][0], 1.0)
+        with self.assertNumQueries(0):
+            get_candidates("Abuja")  # Another city's set survives
+
+    def test_match_filters(self):
+        api = APIClient()
+        api.force_authenticate(make_client(city="Lagos", latitude=6.5244, longitude=3.3792))
+        near = make_lawyer(city="Lagos", verified=True, latitude=6.5244, longitude=3.3882, rating_avg=4.5).lawyer_profile
+        poorly_rated = make_lawyer(city="Lagos", verified=True, latitude=6.5244, longitude=3.3882, rating_avg=2.0).lawyer_profile
+        make_lawyer(city="Lagos", verified=True, latitude=6.8844, longitude=3.3792, rating_avg=5.0)  # 40 km
+
+        rows = api.get(reverse("match-lawyers"), {"radius": 25}).json()
+        self.assertEqual(sorted(row["id"] for row in rows), sorted([near.pk, poorly_rated.pk]))
+        rows = api.get(reverse("match-lawyers"), {"radius": 25, "min_rating": 4}).json()
+        self.assertEqual([row["id"] for row in rows], [near.pk])
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.api = APIClient()
+        self.api.force_authenticate(make_client(city="Lagos"))
+        self.lawyer = make_lawyer(city="Lagos", verified=True, specialization="Tax Law").lawyer_profile
+        self.other = make_lawyer(city="Abuja", verified=True, specialization="Family Law").lawyer_profile
+
+    def get(self, url):
+        response = self.api.get(url)
+        return response["X-Cache"], response.json()
+
+    def test_hits_until_a_lawyer_changes(self):
+        url = reverse("lawyer-list")
+        self.assertEqual(self.get(url + "?page_size=5&ordering=experience")[0], "MISS")
+        self.assertEqual(self.get(url + "?ordering=experience&page_size=5&search=")[0], "HIT")
+
+        self.lawyer.experience = 12
+        self.lawyer.save()
+        state, body = self.get(url + "?page_size=5&ordering=experience")
+        self.assertEqual(state, "MISS")
+        self.assertIn(12, [row["experience"] for row in body["results"]])
+
+    def test_user_and_review_writes_invalidate(self):
+        url = reverse("match-lawyers")
+        self.get(url)
+        self.assertEqual(self.get(url)[0], "HIT")
+
+        self.lawyer.user.username = "renamed"
+        self.lawyer.user.save()
+        state, body = self.get(url)
+        self.assertEqual(state, "MISS")
+        self.assertEqual(body[0]["user"]["username"], "renamed")
+
+        Review.objects.create(client=make_client().clientprofile, lawyer=self.lawyer, rating=5)
+        self.assertEqual(self.get(url)[0], "MISS")
+
+    def test_specialization_filter_survives_other_writes(self):
+        url = reverse("lawyer-list") + "?specialization=Tax Law"
+        self.get(url)
+        self.other.experience = 3
+        self.other.save()
+        self.assertEqual(self.get(url)[0], "HIT")
+
+    def test_stats(self):
+        url = reverse("lawyer-list")
+        self.get(url)
+        self.get(url)
+        admin = APIClient()
+        admin.force_authenticate(User.objects.create_user("staff", "staff@example.com", "x", is_staff=True))
+        stats = admin.get(reverse("response-cache-stats")).json()
+        self.assertEqual(stats["lawyer-list"], {"hits": 1, "misses": 1, "hit_rate": 0.5})
+        self.assertEqual(self.api.get(reverse("response-cache-stats")).status_code, 403)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class LawyerDashboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.lawyer = make_lawyer(city="Lagos")
+        self.profile = self.lawyer.lawyer_profile
+        access = tokens_for_user(self.lawyer).access_token
+        self.headers = {"Authorization": f"Bearer {access}"}
+        self.url = reverse("lawyer-dashboard")
+        self.days = count(1)
+
+    def get(self, params=None):
+        response = self.client.get(self.url, params, headers=self.headers)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response
+
+    def add_rows(self, size):
+        for _ in range(size):
+            client = make_client()
+            day = next(self.days)
+            Booking.objects.create(
+                client=client, lawyer=self.lawyer, appointment_date=timezone.now() + timedelta(days=day), status="confirmed"
+            )
+            Consultation.objects.create(
+                client=client.clientprofile, lawyer=self.profile, date=date.today() + timedelta(days=day), time=time(10)
+            )
+            Review.objects.create(client=client.clientprofile, lawyer=self.profile, rating=day % 5 + 1)
+
+    def test_counts(self):
+        client = make_client()
+        Booking.objects.create(client=client, lawyer=self.lawyer, appointment_date=timezone.now() + timedelta(days=2))
+        Booking.objects.create(
+            client=client, lawyer=self.lawyer, appointment_date=timezone.now() + timedelta(days=20), status="confirmed"
+        )
+        Booking.objects.create(
+            client=client, lawyer=self.lawyer, appointment_date=timezone.now() + timedelta(days=3), status="canceled"
+        )
+        Consultation.objects.create(
+            client=client.clientprofile, lawyer=self.profile, date=date.today() + timedelta(days=1), time=time(9)
+        )
+        Review.objects.create(client=client.clientprofile, lawyer=self.profile, rating=4)
+        LawyerProfile.rebuild_ratings(LawyerProfile.objects.filter(pk=self.profile.pk))  # Count and average are read from here
+        Notification.objects.create(recipient=self.lawyer, message="New booking")
+
+        body = self.get().json()
+        self.assertEqual(
+            body["bookings"], {"total": 3, "pending": 1, "confirmed": 1, "canceled": 1, "upcoming": 1}
+        )
+        self.assertEqual(body["consultations"]["pending"], 1)
+        self.assertEqual(body["consultations"]["upcoming"], 1)
+        self.assertEqual(body["ratings"], {"count": 1, "average": 4.0, "distribution": {"1": 0, "2": 0, "3": 0, "4": 1, "5": 0}})
+        self.assertEqual([row["status"] for row in body["upcoming"]["bookings"]], ["pending"])
+        self.assertEqual(body["upcoming"]["consultations"][0]["client__user__username"], client.username)
+        self.assertEqual(body["notifications"], {"unread": 1})
+        self.assertEqual(self.get({"days": 30}).json()["bookings"]["upcoming"], 2)
+
+    def test_query_count_is_constant(self):
+        counts = []
+        for size in (1, 5):
+            self.add_rows(size)
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                self.get({"days": 31})
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_cached_until_a_write(self):
+        self.assertEqual(self.get()["X-Cache"], "MISS")
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get()["X-Cache"], "HIT")
+        self.assertEqual(len(queries), 1)  # The unread count only
+
+        Notification.objects.create(recipient=self.lawyer, message="Hello")
+        self.assertEqual(self.get().json()["notifications"], {"unread": 1})
+
+        self.add_rows(1)
+        response = self.get()
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.json()["consultations"]["total"], 1)
+
+        booking = Booking.objects.get()
+        booking.status = "canceled"
+        booking.save()
+        self.assertEqual(self.get().json()["bookings"]["canceled"], 1)
+
+    def test_clients_are_refused(self):
+        api = APIClient()
+        api.force_authenticate(make_client())
+        self.assertEqual(api.get(self.url).status_code, 403)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_client(city="Lagos")
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+        self.notification = Notification.objects.create(recipient=self.user, message="hello")
+
+    def revalidate(self, url):
+        first = self.api.get(url)
+        self.assertEqual(first.status_code, 200)
+        return first["ETag"], self.api.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+
+    def test_unchanged_list_is_not_modified(self):
+        etag, response = self.revalidate(reverse("notification-list"))
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        self.assertNotIn("Last-Modified", response)
+
+    def test_lists_ignore_if_modified_since(self):
+        # max(updated_at) doesn't move on a delete, only the ETag notices
+        url = reverse("notification-list")
+        Notification.objects.create(recipient=self.user, message="second")
+        self.notification.delete()
+        self.assertEqual(self.api.get(url, HTTP_IF_MODIFIED_SINCE="Fri, 01 Jan 2100 00:00:00 GMT").status_code, 200)
+
+    def test_detail_sends_last_modified(self):
+        consultation = Consultation.objects.create(
+            client=self.user.clientprofile, lawyer=make_lawyer().lawyer_profile, date=date(2030, 1, 1), time="10:00:00",
+        )
+        url = reverse("consultation-detail", args=[consultation.pk])
+        last_modified = self.api.get(url)["Last-Modified"]
+        self.assertEqual(self.api.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+    def test_updates_and_deletes_change_the_etag(self):
+        url = reverse("notification-list")
+        etag, _ = self.revalidate(url)
+        self.api.post(reverse("notification-mark-read"))
+        self.assertEqual(self.api.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        etag, _ = self.revalidate(url)
+        self.notification.delete()
+        self.assertEqual(self.api.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_lawyer_list_tracks_related_changes(self):
+        lawyer = make_lawyer(city="Lagos")
+        url = reverse("lawyer-list")
+        etag, response = self.revalidate(url)
+        self.assertEqual(response.status_code, 304)
+
+        lawyer.username = "renamed"
+        lawyer.save()
+        self.assertEqual(self.api.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_not_modified_skips_the_list_query(self):
+        url = reverse("notification-list")
+        etag, _ = self.revalidate(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.api.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(len(queries), 1)  # The aggregate only
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class StatelessAuthTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        LoginRateThrottle.reset()
+        self.user = make_client(city="Lagos")
+        tokens = self.client.post(
+            reverse("login"), {"email": self.user.email, "password": "password123"}
+        ).json()
+        self.access, self.refresh = tokens["access"], tokens["refresh"]
+        self.headers = {"Authorization": f"Bearer {self.access}"}
+
+    def test_claims_are_issued(self):
+        token = AccessToken(self.access)
+        self.assertTrue(token["is_client"])
+        self.assertFalse(token["is_lawyer"])
+        self.assertEqual(token["client_profile_id"], self.user.clientprofile.id)
+
+    def test_hot_reads_skip_the_user_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("notification-unread-count"), headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in queries if 'FROM "users_user"' in q["sql"]])
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(reverse("lawyer-list"), headers=self.headers).status_code, 200)
+        self.assertFalse([q for q in queries if 'FROM "users_user"' in q["sql"]])
+
+    def test_logout_revokes_tokens(self):
+        url = reverse("notification-unread-count")
+        response = self.client.post(reverse("logout"), {"refresh": self.refresh}, headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(url, headers=self.headers).status_code, 401)
+        self.assertEqual(self.client.post(reverse("token_refresh"), {"refresh": self.refresh}).status_code, 401)
+
+    def test_role_change_revokes_tokens(self):
+        user = User.objects.get(pk=self.user.pk)
+        user.is_lawyer = True
+        user.save()
+        self.assertEqual(self.client.get(reverse("lawyer-list"), headers=self.headers).status_code, 401)
+
+
+    def test_login_in_the_revocation_second_is_valid(self):
+        url = reverse("notification-unread-count")
+        issued_ms = AccessToken(self.access)["issued_ms"]
+        with mock.patch("users.authentication.time.time", return_value=(issued_ms + 1) / 1000):
+            revoke_user_tokens(self.user.pk)
+        with mock.patch("users.authentication.time.time", return_value=(issued_ms + 2) / 1000):
+            access = self.client.post(
+                reverse("login"), {"email": self.user.email, "password": "password123"}
+            ).json()["access"]
+        self.assertEqual(self.client.get(url, headers=self.headers).status_code, 401)
+        self.assertEqual(self.client.get(url, headers={"Authorization": f"Bearer {access}"}).status_code, 200)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS + ["django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher"])
+class LoginTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        LoginRateThrottle.reset()
+        self.user = make_client()
+
+    def login(self, email, password="password123", **extra):
+        return self.client.post(reverse("login"), {"email": email, "password": password}, **extra)
+
+    def test_login_is_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.login(self.user.email)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(AccessToken(response.json()["access"])["client_profile_id"], self.user.clientprofile.id)
+
+    def test_bad_credentials(self):
+        self.assertEqual(self.login(self.user.email, "wrong").status_code, 400)
+        self.assertEqual(self.login("nobody@example.com").status_code, 400)
+
+    def test_old_hashes_are_upgraded_without_revoking_tokens(self):
+        access = self.login(self.user.email).json()["access"]
+        old_hash = PBKDF2SHA1PasswordHasher().encode("password123", "saltsalt", iterations=1000)
+        User.objects.filter(pk=self.user.pk).update(password=old_hash)
+
+        self.assertEqual(self.login(self.user.email).status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith("md5$"))
+        response = self.client.get(reverse("notification-unread-count"), headers={"Authorization": f"Bearer {access}"})
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(LOGIN_RATE="2/min")
+    def test_attempts_are_throttled_per_ip_and_email(self):
+        self.login(self.user.email, "wrong")
+        self.login(self.user.email, "wrong")
+        response = self.login(self.user.email)
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response)
+
+        # The email's bucket is empty from any address, and this address is out for any email
+        self.assertEqual(self.login(self.user.email, REMOTE_ADDR="10.0.0.2").status_code, 429)
+        self.assertEqual(self.login("other@example.com").status_code, 429)
+        self.assertEqual(self.login("other@example.com", REMOTE_ADDR="10.0.0.3").status_code, 400)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ImportUsersTests(TestCase):
+    def write(self, suffix, content):
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(handle, "w") as file:
+            file.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_csv_import_with_rejects(self):
+        make_client(city="Lagos")
+        existing = User.objects.get(is_client=True)
+        path = self.write(".csv", "\n".join([
+            "role,username,email,password,city,latitude,longitude,specialization,license_number",
+            "lawyer,ada,ada@example.com,secret-1,Lagos,6.5,3.4,Tax Law,LIC-A",
+            "client,bob,bob@example.com,,Abuja,,,,",
+            f"client,{existing.username},new@example.com,x,,,,,",
+            "client,cy,bob@example.com,x,,,,,",
+            "lawyer,dee,dee@example.com,x,,,,Tax Law,",
+            "judge,eve,eve@example.com,x,,,,,",
+        ]))
+        rejects = path + ".rejects.csv"
+        self.addCleanup(lambda: os.path.exists(rejects) and os.remove(rejects))
+
+        call_command("import_users", path, workers=0, rejects=rejects, stdout=StringIO())
+
+        ada = User.objects.get(username="ada")
+        self.assertTrue(ada.is_lawyer and ada.check_password("secret-1"))
+        self.assertEqual(ada.lawyer_profile.license_number, "LIC-A")
+        self.assertTrue(ada.lawyer_profile.geohash)
+        bob = User.objects.get(username="bob")
+        self.assertFalse(bob.has_usable_password())
+        self.assertEqual(bob.clientprofile.city, "Abuja")
+        self.assertFalse(User.objects.filter(username__in=["cy", "dee", "eve"]).exists())
+
+        with open(rejects) as file:
+            lines = file.read().splitlines()
+        self.assertEqual([line.split(",")[0] for line in lines], ["line", "4", "5", "6", "7"])
+        self.assertNotIn("password", lines[0])
+
+        self.api = APIClient()
+        self.api.force_authenticate(existing)
+        response = self.api.get(reverse("lawyer-list"), {"search": "ada"})
+        self.assertEqual([row["user"]["username"] for row in response.data["results"]], ["ada"])
+
+    def test_jsonl_import_in_chunks_with_a_hashing_pool(self):
+        rows = [
+            {"role": "client", "username": f"bulk{i}", "email": f"bulk{i}@example.com", "password": f"pw-{i}"}
+            for i in range(5)
+        ]
+        path = self.write(".jsonl", "\n".join(json.dumps(row) for row in rows) + "\nnot json\n")
+        call_command("import_users", path, chunk_size=2, workers=2, stdout=StringIO(), stderr=StringIO())
+
+        self.assertEqual(ClientProfile.objects.filter(user__username__startswith="bulk").count(), 5)
+        self.assertTrue(User.objects.get(username="bulk3").check_password("pw-3"))
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class BenchmarkSuiteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        call_command(
+            "seed_data", clients=6, lawyers=3, bookings=10, consultations=10, reviews=8, notifications=5,
+            stdout=StringIO(),
+        )
+
+    def test_seed_data(self):
+        self.assertEqual(User.objects.filter(is_client=True).count(), 6)
+        self.assertEqual(Booking.objects.count(), 10)
+        self.assertEqual(Consultation.objects.count(), 10)
+        self.assertEqual(sum(LawyerProfile.objects.values_list("rating_count", flat=True)), 8)
+        self.assertTrue(all(LawyerProfile.objects.values_list("geohash", flat=True)))
+        with self.assertRaises(CommandError):
+            call_command("seed_data", clients=1, lawyers=1, stdout=StringIO())
+
+    def test_benchmark_and_baseline(self):
+        handle, path = tempfile.mkstemp(suffix=".json")
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        endpoints = ["lawyer-list", "login", "consultation-status", "create-booking"]
+        call_command("benchmark_api", requests=2, warmup=1, endpoints=endpoints, output=path, stdout=StringIO())
+
+        with open(path) as file:
+            results = json.load(file)
+        self.assertEqual(list(results["endpoints"]), endpoints)
+        for name, stats in results["endpoints"].items():
+            self.assertEqual(stats["errors"], 0, name)
+            self.assertGreater(stats["queries"], 0, name)
+            self.assertGreater(stats["peak_kib"], 0, name)
+        self.assertEqual(Booking.objects.count(), 10)  # Writes were rolled back
+
+        results["endpoints"]["create-booking"]["queries"] -= 1
+        with open(path, "w") as file:
+            json.dump(results, file)
+        with self.assertRaisesMessage(CommandError, "1 regression"):
+            call_command(
+                "benchmark_api", requests=2, warmup=0, endpoints=["create-booking"], baseline=path,
+                threshold=100, stdout=StringIO(), stderr=StringIO(),
+            )
+
+
+@override_settings(
+    PASSWORD_HASHERS=FAST_HASHERS, REQUEST_PROFILING=True, METRICS_TOKEN="scrape-me",
+    PROFILING_FLUSH_SECONDS=3600, PROFILING_SLOW_MS=500, PROFILING_CPROFILE_RATE=0,
+)
+@modify_settings(MIDDLEWARE={"prepend": "users.profiling.RequestProfilingMiddleware"})
+class RequestProfilingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        self.api = APIClient()
+        self.api.force_authenticate(make_client(city="Lagos"))
+        make_lawyer(city="Lagos", verified=True)
+
+    def test_server_timing_and_metrics(self):
+        response = self.api.get(reverse("lawyer-list"))
+        self.assertEqual(response.status_code, 200)
+        timing = response["Server-Timing"]
+        self.assertRegex(timing, r'^total;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries, 0 duplicate"')
+        self.assertIn("serialize;dur=", timing)
+        self.assertIn("render;dur=", timing)
+
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        body = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer scrape-me").content.decode()
+        labels = '{route="api/lawyers/",method="GET"'
+        self.assertIn(f'http_requests_total{labels},status="200"}} 1', body)
+        self.assertIn(f'http_request_duration_seconds_bucket{labels},le="+Inf"}} 1', body)
+        self.assertIn(f"http_response_bytes_total{labels}}} {len(response.content)}", body)
+        with override_settings(METRICS_TOKEN=""):
+            self.assertEqual(self.client.get("/metrics").status_code, 404)
+
+    def test_serializer_timing_only_while_profiling(self):
+        original = BaseSerializer.data
+        response = self.api.get(reverse("client-bookings"))
+        self.assertIn("serialize;dur=", response["Server-Timing"])
+        self.assertIs(BaseSerializer.data, original)
+
+    async def test_async_requests(self):
+        user = await User.objects.aget(username__startswith="client")
+        response = await self.async_client.get(
+            reverse("notification-poll"), {"timeout": 0}, headers={"Authorization": f"Bearer {AccessToken.for_user(user)}"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response["Server-Timing"], r'db;dur=[\d.]+;desc="[1-9]\d* queries')
+        self.assertIn('route="api/notifications/poll/",method="GET",status="200"', registry.render())
+
+        async def view(request):
+            return JsonResponse({})
+
+        self.assertTrue(iscoroutinefunction(RequestProfilingMiddleware(view)))
+
+    def test_duplicate_queries(self):
+        profile = RequestProfile()
+        with connection.execute_wrapper(profile):
+            for user_id in (1, 1, 1, 2):
+                list(User.objects.filter(pk=user_id))
+        self.assertEqual((profile.queries, profile.duplicates), (4, 2))
+        self.assertEqual(profile.most_repeated()[0], 3)
+
+    def test_slow_requests_are_profiled_and_routes_flushed(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with override_settings(
+            PROFILING_SLOW_MS=0, PROFILING_CPROFILE_RATE=1, PROFILING_DIR=directory, PROFILING_FLUSH_SECONDS=0,
+        ), self.assertLogs("users.profiling", "INFO") as logs:
+            self.api.get(reverse("lawyer-list"))
+        self.assertEqual(len(os.listdir(directory)), 1)
+        self.assertRegex(os.listdir(directory)[0], r"-GET-api-lawyers-\d+ms\.prof$")
+        self.assertTrue(any("GET api/lawyers/: 1 requests" in line for line in logs.output))
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class SignalQueryCountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        LoginRateThrottle.reset()
+
+    def register(self, username, **roles):
+        data = {"username": username, "email": f"{username}@example.com", "password": "password123", **roles}
+        return self.client.post(reverse("register"), data)
+
+    def bearer(self, user):
+        access = self.client.post(reverse("login"), {"email": user.email, "password": "password123"}).json()["access"]
+        return {"Authorization": f"Bearer {access}"}
+
+    def test_register_writes_the_user_and_profile_once(self):
+        # Two uniqueness checks, the user and the profile
+        with self.assertNumQueries(4):
+            self.assertEqual(self.register("newclient", is_client=True).status_code, 201)
+        self.assertTrue(ClientProfile.objects.filter(user__username="newclient").exists())
+
+        # Lawyers start without a license number, which no longer collides
+        self.assertEqual(self.register("newlawyer1", is_lawyer=True).status_code, 201)
+        self.assertEqual(self.register("newlawyer2", is_lawyer=True).status_code, 201)
+        self.assertEqual(LawyerProfile.objects.filter(license_number__isnull=True).count(), 2)
+
+    def test_user_saves_leave_the_profile_alone(self):
+        user = make_client()
+        user.last_login = timezone.now()
+        with self.assertNumQueries(1):
+            user.save(update_fields=["last_login"])
+        with self.assertNumQueries(1):
+            response = self.client.post(reverse("login"), {"email": user.email, "password": "password123"})
+        self.assertEqual(response.status_code, 200)
+
+    def test_profile_update_writes_only_changed_fields(self):
+        headers = self.bearer(make_client(city="Lagos"))
+        url = reverse("update-client-profile")
+        # The user, the profile and one UPDATE of the changed column
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(url, {"city": "Abuja"}, content_type="application/json", headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 3)
+        self.assertIn('SET "city" = ', queries[-1]["sql"])
+        self.assertNotIn('"address"', queries[-1]["sql"])
+
+        with self.assertNumQueries(2):
+            self.client.patch(url, {"city": "Abuja"}, content_type="application/json", headers=headers)
+
+        # The nested user is read-only, not a 500
+        response = self.client.patch(
+            url, {"city": "Kano", "user": {"username": "renamed"}}, content_type="application/json", headers=headers
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["city"], "Kano")
+        self.assertNotEqual(response.data["user"]["username"], "renamed")
+
+        # Columns outside the search document don't reindex the lawyer
+        headers = self.bearer(make_lawyer())
+        with self.assertNumQueries(3):
+            response = self.client.patch(
+                reverse("update-lawyer-profile"), {"experience": 7}, content_type="application/json", headers=headers
+            )
+        self.assertEqual(response.data["experience"], 7)
+
+    def test_new_role_gets_a_profile(self):
+        user = make_client()
+        user.is_lawyer = True
+        user.save(update_fields=["is_lawyer"])
+        self.assertTrue(LawyerProfile.objects.filter(user=user).exists())
+
+    def test_batched_side_effects_reindex_once(self):
+        lawyers = [make_lawyer().lawyer_profile for _ in range(3)]
+        with CaptureQueriesContext(connection) as queries, side_effects_batched():
+            for lawyer in lawyers:
+                lawyer.specialization = "Maritime Law"
+                lawyer.save(update_fields=["specialization"])
+        self.assertEqual(len([q for q in queries if q["sql"].startswith("INSERT INTO users_lawyer_search")]), 1)
+
+        api = APIClient()
+        api.force_authenticate(make_client())
+        response = api.get(reverse("lawyer-list"), {"search": "maritime"})
+        self.assertEqual(len(response.data["results"]), 3)
+
+
+async def mark_all_read(request):
+    user = await request.auser()
+    await Notification.objects.filter(recipient=user).aupdate(is_read=True)
+    return JsonResponse({})
+
+
+# Async views aren't routed anywhere yet, ReplicaRoutingTests mounts this one
+urlpatterns = [path("async/mark-read/", mark_all_read)]
+
+
+# A second SQLite file stands in for the replica. It's migrated like the primary but
+# replication is left out, so rows written with .using("replica") exist only there.
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ReplicaRoutingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Added here rather than in settings, so the runner's checks don't look for it
+        cls.replica_dir = tempfile.mkdtemp()
+        connections.settings["replica"] = {
+            **connections["default"].settings_dict, "NAME": os.path.join(cls.replica_dir, "replica.sqlite3"),
+        }
+        call_command("migrate", database="replica", verbosity=0)
+        cls.databases = {"default", "replica"}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections["replica"].close()
+        del connections["replica"]
+        del connections.settings["replica"]
+        shutil.rmtree(cls.replica_dir)
+
+    def setUp(self):
+        cache.clear()
+        self.user = make_client()
+        replica_user = User.objects.db_manager("replica").create_user(
+            username=self.user.username, email=self.user.email, password="password123", is_client=True
+        )
+        Notification.objects.using("replica").create(recipient_id=replica_user.id, message="Only on the replica")
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def messages(self):
+        response = self.api.get(reverse("notification-list"))
+        self.assertEqual(response.status_code, 200)
+        return [row["message"] for row in response.data["results"]]
+
+    def test_list_reads_from_the_replica_until_the_user_writes(self):
+        self.assertEqual(self.messages(), ["Only on the replica"])
+
+        response = self.api.post(reverse("notification-mark-read"), {}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.messages(), [])  # Pinned to the primary
+
+    @override_settings(ROOT_URLCONF=__name__)
+    async def test_async_views_pin_the_user_too(self):
+        client = AsyncClient()
+        await client.aforce_login(self.user)
+        response = await client.post("/async/mark-read/")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(is_pinned(self.user.id))
+        # Ran without a thread hop around the view
+        self.assertTrue(iscoroutinefunction(ReadYourWritesMiddleware(mark_all_read)))
+
+    def test_writes_go_to_the_primary_and_end_replica_reads(self):
+        router = PrimaryReplicaRouter()
+        with reading_from_replica():
+            self.assertEqual(router.db_for_read(Notification), "replica")
+            self.assertIsNone(router.db_for_write(Notification))
+            self.assertIsNone(router.db_for_read(Notification))
+        self.assertIsNone(router.db_for_read(Notification))
+
+
+class DatabaseSettingsTests(TestCase):
+    def test_database_urls(self):
+        config = parse_database_url("postgres://app:p%40ss@db:5433/legal?sslmode=require", conn_max_age=60)
+        self.assertEqual(config["ENGINE"], "django.db.backends.postgresql")
+        self.assertEqual((config["USER"], config["PASSWORD"], config["HOST"], config["PORT"]), ("app", "p@ss", "db", "5433"))
+        self.assertEqual(config["OPTIONS"], {"sslmode": "require"})
+        self.assertEqual(parse_database_url("sqlite:////tmp/app.sqlite3")["NAME"], "/tmp/app.sqlite3")
+
+    def test_sqlite_tuning_applies_on_connect(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings_dict = {
+            **connections["default"].settings_dict,
+            "NAME": os.path.join(directory, "tuned.sqlite3"),
+            "OPTIONS": sqlite_tuning_options(busy_timeout_ms=1234),
+        }
+        wrapper = type(connections["default"])(settings_dict, alias="tuned")
+        self.addCleanup(wrapper.close)
+        with wrapper.cursor() as cursor:
+            self.assertEqual(cursor.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+            self.assertEqual(cursor.execute("PRAGMA busy_timeout").fetchone()[0], 1234)
+            self.assertEqual(cursor.execute("PRAGMA synchronous").fetchone()[0], 1)  # NORMAL
+        self.assertEqual(wrapper.transaction_mode, "IMMEDIATE")
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ScopedListTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client_user, self.other_client = make_client(), make_client()
+        self.lawyer, self.other_lawyer = make_lawyer(), make_lawyer()
+        for client, lawyer, days in [
+            (self.client_user, self.lawyer, 1),
+            (self.client_user, self.other_lawyer, 10),
+            (self.other_client, self.other_lawyer, 5),
+        ]:
+            Consultation.objects.create(
+                client=client.clientprofile, lawyer=lawyer.lawyer_profile,
+                date=date.today() + timedelta(days=days), time=time(10),
+            )
+            Review.objects.create(client=client.clientprofile, lawyer=lawyer.lawyer_profile, rating=days % 5 + 1)
+
+    def results(self, user, name, params=None, **kwargs):
+        api = APIClient()
+        api.force_authenticate(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = api.get(reverse(name, kwargs=kwargs), params)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(full_table_scans(queries), [])
+        return response.json()["results"]
+
+    def test_consultations_are_scoped_to_the_caller(self):
+        rows = self.results(self.client_user, "consultation-list-create")
+        self.assertEqual({row["client"] for row in rows}, {self.client_user.clientprofile.id})
+        self.assertEqual(len(rows), 2)
+        rows = self.results(self.other_lawyer, "consultation-list-create")
+        self.assertEqual({row["lawyer"] for row in rows}, {self.other_lawyer.lawyer_profile.id})
+        self.assertEqual(len(rows), 2)
+
+        staff = User.objects.create_user("staff", "staff@example.com", "x")
+        self.assertEqual(self.results(staff, "consultation-list-create"), [])
+
+    def test_consultation_filters(self):
+        soon = (date.today() + timedelta(days=7)).isoformat()
+        rows = self.results(self.client_user, "consultation-list-create", {"date__lte": soon})
+        self.assertEqual([row["lawyer"] for row in rows], [self.lawyer.lawyer_profile.id])
+        rows = self.results(self.client_user, "consultation-list-create", {"date__gte": soon, "ordering": "date"})
+        self.assertEqual([row["lawyer"] for row in rows], [self.other_lawyer.lawyer_profile.id])
+        self.assertEqual(self.results(self.client_user, "consultation-list-create", {"status": "confirmed"}), [])
+
+        rows = self.results(self.client_user, "consultation-list-create", {"ordering": "-date"})
+        self.assertEqual([row["date"] for row in rows], sorted((row["date"] for row in rows), reverse=True))
+
+    def test_consultation_detail_is_scoped(self):
+        consultation = Consultation.objects.get(client=self.other_client.clientprofile)
+        api = APIClient()
+        api.force_authenticate(self.other_lawyer)
+        self.assertEqual(api.get(reverse("consultation-detail", args=[consultation.pk])).status_code, 200)
+        api.force_authenticate(self.lawyer)
+        self.assertEqual(api.get(reverse("consultation-detail", args=[consultation.pk])).status_code, 404)
+
+    def test_reviews_are_scoped(self):
+        self.assertEqual(len(self.results(self.client_user, "review-list-create")), 2)
+        rows = self.results(self.lawyer, "review-list-create")
+        self.assertEqual([row["client"] for row in rows], [self.client_user.username])
+
+        rows = self.results(self.client_user, "lawyer-reviews", pk=self.other_lawyer.lawyer_profile.id)
+        self.assertEqual({row["lawyer"] for row in rows}, {self.other_lawyer.username})
+        self.assertEqual(len(rows), 2)
+
+
+def full_table_scans(queries):
+    """
+    The SELECTs among `queries` whose SQLite plan reads a whole table, with the offending plan line.
+
+    A bare "SCAN table" is allowed only when the statement has no WHERE and a LIMIT and needs
+    no sort, i.e. it walks the table in output order and stops after one page.
+    """
+    scans = []
+    with connection.cursor() as cursor:
+        for query in queries:
+            sql = query["sql"]
+            if not sql.startswith("SELECT"):
+                continue
+            plan = [row[3] for row in cursor.execute("EXPLAIN QUERY PLAN " + sql).fetchall()]
+            stops_early = " WHERE " not in sql and " LIMIT " in sql and not any("TEMP B-TREE" in line for line in plan)
+            for line in plan:
+                if re.fullmatch(r"SCAN \S+", line) and not stops_early:
+                    scans.append((line, sql))
+    return scans
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class QueryPlanTests(TestCase):
+    # Hot filters on top of the plain list URLs
+    extra_requests = [
+        ("lawyer-list", {"location": "Ikeja"}),
+        ("lawyer-list", {"specialization": "Tax Law"}),
+        ("lawyer-list", {"ordering": "-rating_avg"}),
+        ("lawyer-list", {"search": "tax"}),
+        ("match-lawyers", {}),
+        ("lawyer-dashboard", {}),
+    ]
+
+    def setUp(self):
+        cache.clear()
+        self.client_user = make_client(city="Lagos")
+        self.lawyer = make_lawyer(city="Lagos", specialization="Tax Law", verified=True, location="Ikeja")
+        profile = self.client_user.clientprofile
+        Notification.objects.create(recipient=self.client_user, message="Hello")
+        Booking.objects.create(
+            client=self.client_user, lawyer=self.lawyer, appointment_date=timezone.now() + timedelta(days=2)
+        )
+        Consultation.objects.create(
+            client=profile, lawyer=self.lawyer.lawyer_profile, date=date.today() + timedelta(days=3), time=time(10)
+        )
+        Review.objects.create(client=profile, lawyer=self.lawyer.lawyer_profile, rating=5)
+
+    def list_endpoints(self):
+        for pattern in user_urls.urlpatterns:
+            view = getattr(pattern.callback, "cls", None)
+            if view and issubclass(view, ListModelMixin) and not pattern.pattern.converters:
+                yield pattern.name, {}
+
+    def test_list_endpoints_use_indexes(self):
+        requests = list(self.list_endpoints()) + self.extra_requests
+        for name, params in requests:
+            served = False
+            for user in (self.client_user, self.lawyer):
+                api = APIClient()
+                api.force_authenticate(user)
+                with CaptureQueriesContext(connection) as queries:
+                    response = api.get(reverse(name), params)
+                if response.status_code != 200:
+                    continue
+                served = True
+                with self.subTest(endpoint=name, params=params, user=user.username):
+                    self.assertEqual(full_table_scans(queries), [])
+            self.assertTrue(served, f"No test user could GET {name}")
@@ -0,0 +1,88 @@
+"""
+Login rate limiting.
+
+Every login attempt takes a token from two buckets: one for the client's IP address and
+one for the email it tries. Buckets hold LOGIN_RATE's count and refill at its rate, so a
+client gets a burst of that many attempts and then one per interval. Both checks happen
+before the password is hashed, so a throttled attempt costs almost nothing.
+
+Buckets live in the worker's memory rather than the cache. They need no round trip,
+but each process keeps its own, so with N workers an address can make up to N times
+the attempts.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """'10/min' -> (10, 60), like DRF's throttle rates."""
+    count, period = rate.split('/')
+    return int(count), PERIODS[period[0]]
+
+
+class TokenBucket:
+    __slots__ = ('tokens', 'updated')
+
+    def __init__(self, capacity, now):
+        self.tokens = capacity
+        self.updated = now
+
+    def refill(self, capacity, rate, now):
+        self.tokens = min(capacity, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+
+
+class LoginRateThrottle(BaseThrottle):
+    max_buckets = 100_000  # Least recently used buckets go first
+    _buckets = OrderedDict()
+    _lock = threading.Lock()
+
+    def __init__(self):
+        self.capacity, duration = parse_rate(getattr(settings, 'LOGIN_RATE', '10/min'))
+        self.rate = self.capacity / duration
+        self.wait_seconds = None
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls._buckets.clear()
+
+    def get_keys(self, request):
+        keys = ['ip:' + self.get_ident(request)]
+        email = request.data.get('email') if hasattr(request.data, 'get') else None
+        if isinstance(email, str) and email:
+            keys.append('email:' + email.strip().lower())
+        return keys
+
+    def allow_request(self, request, view):
+        now = time.monotonic()
+        keys = self.get_keys(request)
+        with self._lock:
+            buckets = []
+            for key in keys:
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    bucket = self._buckets[key] = TokenBucket(self.capacity, now)
+                else:
+                    self._buckets.move_to_end(key)
+                    bucket.refill(self.capacity, self.rate, now)
+                buckets.append(bucket)
+            while len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+
+            empty = [bucket for bucket in buckets if bucket.tokens < 1]
+            if empty:
+                self.wait_seconds = max((1 - bucket.tokens) / self.rate for bucket in empty)
+                return False
+            for bucket in buckets:
+                bucket.tokens -= 1
+        return True
+
+    def wait(self):
+        return self.wait_seconds
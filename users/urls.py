@@ -16,11 +16,23 @@ from .views import (
     ConsultationStatusUpdateView, 
     ConsultationRescheduleView, 
     NotificationListView,
+    NotificationStreamView,
+    NotificationPollView,
+    LawyerAvailabilityView,
+    LawyerFreeSlotsView,
+    LogoutView,
+    ResponseCacheStatsView,
+    UnreadNotificationCountView,
+    MarkNotificationsReadView,
+    MarkNotificationReadView,
     ReviewListCreateView, 
     ReviewDetailView,
+    LawyerReviewListView,
+    LawyerDashboardView,
 )
 
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from users.throttling import LoginRateThrottle
 from users.views import MatchLawyersView
 
 
@@ -28,13 +40,18 @@ from users.views import MatchLawyersView
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
     path('login/', LoginView.as_view(), name='login'),
+    path('logout/', LogoutView.as_view(), name='logout'),
     path('clients/', ClientListView.as_view(), name='client-list'),
     path('lawyers/', LawyerListView.as_view(), name='lawyer-list'),
+    path('lawyers/<int:pk>/reviews/', LawyerReviewListView.as_view(), name='lawyer-reviews'),
+    path('lawyers/<int:pk>/free-slots/', LawyerFreeSlotsView.as_view(), name='lawyer-free-slots'),
     path("profile/lawyer/update/", UpdateLawyerProfileView.as_view(), name="update-lawyer-profile"),
+    path("profile/lawyer/availability/", LawyerAvailabilityView.as_view(), name="lawyer-availability"),
     path("profile/client/update/", UpdateClientProfileView.as_view(), name="update-client-profile"),
-    path('auth/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('auth/token/', TokenObtainPairView.as_view(throttle_classes=[LoginRateThrottle]), name='token_obtain_pair'),
     path('auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('match-lawyers/', MatchLawyersView.as_view(), name='match-lawyers'),
+    path('cache/stats/', ResponseCacheStatsView.as_view(), name='response-cache-stats'),
     path('bookings/create/', CreateBookingView.as_view(), name='create-booking'),
     path('bookings/client/', ListClientBookingsView.as_view(), name='client-bookings'),
     path('bookings/lawyer/', ListLawyerBookingsView.as_view(), name='lawyer-bookings'),
@@ -45,6 +62,12 @@ urlpatterns = [
     path('consultations/<int:pk>/status/', ConsultationStatusUpdateView.as_view(), name='consultation-status'),
     path('consultations/<int:pk>/reschedule/', ConsultationRescheduleView.as_view(), name='consultation-reschedule'),
     path('notifications/', NotificationListView.as_view(), name='notification-list'),
+    path('notifications/stream/', NotificationStreamView.as_view(), name='notification-stream'),
+    path('notifications/poll/', NotificationPollView.as_view(), name='notification-poll'),
+    path('notifications/unread-count/', UnreadNotificationCountView.as_view(), name='notification-unread-count'),
+    path('notifications/mark-read/', MarkNotificationsReadView.as_view(), name='notification-mark-read'),
+    path('notifications/<int:pk>/read/', MarkNotificationReadView.as_view(), name='notification-read'),
     path("reviews/", ReviewListCreateView.as_view(), name="review-list-create"),
     path("reviews/<int:pk>/", ReviewDetailView.as_view(), name="review-detail"),
+    path('dashboard/lawyer/', LawyerDashboardView.as_view(), name='lawyer-dashboard'),
 ]
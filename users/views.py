@@ -1,5 +1,5 @@
 from rest_framework import generics, permissions
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
 from rest_framework.permissions import IsAuthenticated
@@ -9,17 +9,48 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework import status
 from django.contrib.auth import authenticate
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import get_user_model
 from .models import ClientProfile, LawyerProfile
 from .models import Booking
 from .models import Consultation, Notification, Review
-from datetime import datetime
+from .models import BlackoutDate
+from datetime import datetime, timedelta
 from rest_framework import serializers
 from django.shortcuts import get_object_or_404
+from django.db import transaction
+from django.db.models import Count, Max, Prefetch, Q
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views import View
+from django.utils import timezone
+from asgiref.sync import sync_to_async
+from rest_framework.exceptions import AuthenticationFailed
+import asyncio
+import json
+import math
+from functools import partial
+from . import geo, recommendations
+from .cache import (
+    ALL_LAWYERS, CachedResponseMixin, cache_stats, city_namespace, get_versions, lawyer_profile_namespace,
+    lawyer_user_namespace, specialization_namespace,
+)
+from .compiled import CompiledListMixin
+from .conditional import ConditionalGetMixin
+from .authentication import StatelessJWTAuthentication, revoke_token, tokens_for_user
+from .availability import SlotUnavailable, book_slot, consultation_start, free_slots
+from .notifications import notify
+from .realtime import get_broker
+from .routers import ReplicaReadMixin
+from .search import LawyerSearchFilter, RankedOrderingFilter
+from .throttling import LoginRateThrottle
 from .serializers import (
+    AvailabilitySerializer,
     ClientProfileSerializer,
     LawyerProfileSerializer,
+    MatchedLawyerSerializer,
     UserSerializer,
     RegisterSerializer,
     LoginSerializer,
@@ -27,6 +58,7 @@ from .serializers import (
     ConsultationSerializer,
     NotificationSerializer,
     ReviewSerializer,
+    parse_field_list,
 )
 
 User = get_user_model()
@@ -39,11 +71,13 @@ class RegisterView(generics.CreateAPIView):
 
 # Login View
 class LoginView(APIView):
+    throttle_classes = [LoginRateThrottle]
+
     def post(self, request):
-        serializer = LoginSerializer(data=request.data)
+        serializer = LoginSerializer(data=request.data, context={"request": request})
         if serializer.is_valid():
             user = serializer.validated_data["user"]
-            refresh = RefreshToken.for_user(user)
+            refresh = tokens_for_user(user)
 
             return Response({
                 "refresh": str(refresh),
@@ -52,6 +86,51 @@ class LoginView(APIView):
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+class LogoutView(APIView):
+    """Revoke the access token used for this request and, if given, the refresh token"""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        refresh = request.data.get("refresh")
+        if refresh:
+            try:
+                refresh = RefreshToken(refresh)
+            except TokenError:
+                return Response({"error": "Invalid refresh token."}, status=status.HTTP_400_BAD_REQUEST)
+            if refresh.get(jwt_settings.USER_ID_CLAIM) != request.user.pk:
+                return Response({"error": "Invalid refresh token."}, status=status.HTTP_400_BAD_REQUEST)
+            revoke_token(refresh)
+        if request.auth is not None:
+            revoke_token(request.auth)
+        return Response({"message": "Logged out successfully."}, status=status.HTTP_200_OK)
+
+class EagerLoadingViewMixin:
+    """Loads whatever the serializer reads up front so list responses cost a fixed number of queries."""
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        serializer = self.get_serializer()
+        # Column restriction is only safe for reads, writes need the full row to save back
+        return serializer.setup_eager_loading(
+            queryset, restrict_columns=self.request.method in permissions.SAFE_METHODS
+        )
+
+class SparseFieldsViewMixin:
+    """
+    ?fields=id,specialization,city,user.username renders only those fields and reads only
+    their columns; ?expand=user renders the nested user in full rather than as its id.
+    """
+
+    def get_sparse_fields(self):
+        params = self.request.query_params
+        fields = parse_field_list(params.get('fields'))
+        return {} if fields is None else {'fields': fields, 'expand': parse_field_list(params.get('expand'))}
+
+    def get_serializer(self, *args, **kwargs):
+        if self.request is not None and self.request.method in permissions.SAFE_METHODS:
+            kwargs.update(self.get_sparse_fields())
+        return super().get_serializer(*args, **kwargs)
+
 # Custom permission to allow only lawyers to see clients
 class IsLawyer(permissions.BasePermission):
     def has_permission(self, request, view):
@@ -63,20 +142,52 @@ class IsClient(permissions.BasePermission):
         return request.user.is_authenticated and request.user.is_client        
 
 # Lawyers can see clients
-class ClientListView(ListAPIView):
+class ClientListView(SparseFieldsViewMixin, EagerLoadingViewMixin, ListAPIView):
     queryset = ClientProfile.objects.all()
     serializer_class = ClientProfileSerializer
     permission_classes = [permissions.IsAuthenticated, IsLawyer]  # Only lawyers can access
+    authentication_classes = [StatelessJWTAuthentication]  # No User query, see users/authentication.py
+    ordering = ['id']
 
 # Clients can see lawyers
-class LawyerListView(ListAPIView):
+class LawyerListView(
+    ReplicaReadMixin, ConditionalGetMixin, CachedResponseMixin, CompiledListMixin, SparseFieldsViewMixin,
+    EagerLoadingViewMixin, ListAPIView,
+):
     queryset = LawyerProfile.objects.all()
     serializer_class = LawyerProfileSerializer
     permission_classes = [permissions.IsAuthenticated, IsClient]  # Only clients can acess
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['specialization', 'address', 'user__is_verified', 'location']
-    search_fields = ['user__username', 'specialization', 'location']
-    ordering_fields = ['experience', 'user__username', 'verified', 'specialization']
+    authentication_classes = [StatelessJWTAuthentication]
+    filter_backends = [DjangoFilterBackend, LawyerSearchFilter, RankedOrderingFilter]
+    filterset_fields = {
+        'specialization': ['exact'],
+        'address': ['exact'],
+        'user__is_verified': ['exact'],
+        'location': ['exact'],
+        'rating_avg': ['gte', 'lte'],
+        'rating_count': ['gte'],
+    }
+    search_fields = ['user__username', 'specialization', 'location', 'city', 'address']  # icontains fallback
+    ordering_fields = ['experience', 'user__username', 'verified', 'specialization', 'rating_avg', 'rating_count']
+    ordering = ['-experience']  # Paginated on the (experience, id) index
+    cache_name = 'lawyer-list'
+
+    def get_cache_namespaces(self, request):
+        # A specialization filter only depends on lawyers with that specialization
+        specialization = request.query_params.get('specialization')
+        return [specialization_namespace(specialization)] if specialization else [ALL_LAWYERS]
+
+    def get_etag_extra(self, request):
+        # Rows also show the lawyer's username and rating, which the versions track
+        return get_versions(*self.get_cache_namespaces(request))
+
+
+class ResponseCacheStatsView(APIView):
+    """Hit and miss counts of the cached directory endpoints, for staff"""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(cache_stats(LawyerListView.cache_name, MatchLawyersView.cache_name, LawyerDashboardView.cache_name))
 
 
 class UpdateLawyerProfileView(RetrieveUpdateAPIView):
@@ -84,7 +195,54 @@ class UpdateLawyerProfileView(RetrieveUpdateAPIView):
     permission_classes = [IsAuthenticated]
 
     def get_object(self):
-        return self.request.user.lawyerprofile  # Get the logged-in user's profile
+        return self.request.user.lawyer_profile  # Get the logged-in user's profile
+
+class LawyerAvailabilityView(RetrieveUpdateAPIView):
+    """The logged-in lawyer's slot length, working hours and blackout dates"""
+    serializer_class = AvailabilitySerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_object(self):
+        if not hasattr(self.request.user, 'lawyer_profile'):
+            raise PermissionDenied({"error": "Only lawyers can set availability."})
+        return self.request.user.lawyer_profile
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            serializer.save()
+
+class LawyerFreeSlotsView(APIView):
+    """Open slots of a lawyer from ?start= (default today) to ?end= (default six days later)"""
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [StatelessJWTAuthentication]
+    max_days = 31
+
+    def get(self, request, pk):
+        params = request.query_params
+        try:
+            start = datetime.strptime(params['start'], "%Y-%m-%d").date() if params.get('start') else timezone.localdate()
+            end = datetime.strptime(params['end'], "%Y-%m-%d").date() if params.get('end') else start + timedelta(days=6)
+        except ValueError:
+            return Response({"error": "Invalid date format, use YYYY-MM-DD"}, status=status.HTTP_400_BAD_REQUEST)
+        if end < start or (end - start).days >= self.max_days:
+            return Response({"error": f"end must be on or after start and at most {self.max_days} days later"}, status=status.HTTP_400_BAD_REQUEST)
+
+        lawyer = get_object_or_404(
+            LawyerProfile.objects.prefetch_related(
+                'working_hours',
+                Prefetch('blackout_dates', queryset=BlackoutDate.objects.filter(date__range=(start, end))),
+            ),
+            pk=pk,
+        )
+        as_string = serializers.DateTimeField().to_representation
+        return Response({
+            "lawyer": lawyer.pk,
+            "slot_minutes": lawyer.slot_minutes,
+            "days": [
+                {"date": day.isoformat(), "slots": [as_string(slot) for slot in slots]}
+                for day, slots in free_slots(lawyer, start, end)
+            ],
+        })
 
 class UpdateClientProfileView(RetrieveUpdateAPIView):
     serializer_class = ClientProfileSerializer
@@ -93,21 +251,102 @@ class UpdateClientProfileView(RetrieveUpdateAPIView):
     def get_object(self):
         return self.request.user.clientprofile  # Get the logged-in user's profile
 
-class MatchLawyersView(APIView):
+def number_param(request, name, default=None, minimum=None, maximum=None, cast=float):
+    """Read a numeric query parameter, clamped to [minimum, maximum]."""
+    raw = request.query_params.get(name)
+    if raw in (None, ''):
+        return default
+    try:
+        value = cast(raw)
+    except ValueError:
+        raise ValidationError({"error": f"'{name}' must be a number."})
+    if not math.isfinite(value):
+        # float() accepts 'nan' and 'inf', and nan slips through the clamping below
+        raise ValidationError({"error": f"'{name}' must be a number."})
+    if minimum is not None:
+        value = max(value, minimum)
+    if maximum is not None:
+        value = min(value, maximum)
+    return value
+
+class MatchLawyersView(SparseFieldsViewMixin, CachedResponseMixin, APIView):
+    """
+    Recommended verified lawyers for the client, best first.
+
+    By default lawyers in the client's city are ranked on a weighted score of distance,
+    specialization match, rating, experience and current booking load (see
+    users/recommendations.py). ?rank=distance instead returns the ?limit= nearest
+    lawyers within ?radius= km from any city.
+
+    Coordinates come from the client's profile or ?lat=&lng=. ?min_rating= filters in
+    both modes; ?specialization= filters in distance mode and is a preference otherwise.
+    """
     permission_classes = [IsAuthenticated]
+    authentication_classes = [StatelessJWTAuthentication]
+    default_radius_km = 25
+    max_radius_km = 500
+    default_limit = 20
+    max_limit = 100
+    cache_name = 'match-lawyers'
 
     def get(self, request, *args, **kwargs):
         # Get the authenticated user's client profile
         try:
-            client_profile = ClientProfile.objects.get(user=request.user)
+            client_profile = ClientProfile.objects.get(user_id=request.user.id)
         except ClientProfile.DoesNotExist:
             return Response({"error": "Client profile not found"}, status=400)
 
-        # Find lawyers in the same city
-        matching_lawyers = LawyerProfile.objects.filter(city=client_profile.city, verified=True)
+        # Clients in the same city and spot with the same parameters get the same matches.
+        # Without coordinates ?rank=distance falls back to the city ranking, so it depends on both.
+        namespaces = [city_namespace(client_profile.city)]
+        if request.query_params.get('rank') == 'distance':
+            specialization = request.query_params.get('specialization')
+            namespaces.append(specialization_namespace(specialization) if specialization else ALL_LAWYERS)
+        return self.cached_response(
+            request, partial(self.match, request, client_profile), namespaces,
+            variant=(client_profile.city, client_profile.latitude, client_profile.longitude),
+        )
+
+    def match(self, request, client_profile):
+        latitude = number_param(request, 'lat', client_profile.latitude, -90, 90)
+        longitude = number_param(request, 'lng', client_profile.longitude, -180, 180)
+        radius = number_param(request, 'radius', self.default_radius_km, 0, self.max_radius_km)
+        limit = number_param(request, 'limit', self.default_limit, 1, self.max_limit, cast=int)
+        min_rating = number_param(request, 'min_rating', minimum=0, maximum=5)
+        specialization = request.query_params.get('specialization', '')
+        has_location = latitude is not None and longitude is not None
+
+        if request.query_params.get('rank') == 'distance' and has_location:
+            # Nearest first, using the geohash index rather than scanning every lawyer
+            candidates = LawyerProfile.objects.filter(verified=True)
+            if specialization:
+                candidates = candidates.filter(specialization=specialization)
+            if min_rating is not None:
+                candidates = candidates.filter(rating_avg__gte=min_rating)
+            matches = [
+                (pk, None, distance)
+                for pk, distance in geo.nearest(candidates, latitude, longitude, radius, limit)
+            ]
+        else:
+            matches = recommendations.recommend(
+                client_profile.city, limit, specialization=specialization,
+                latitude=latitude, longitude=longitude, radius_km=radius, min_rating=min_rating,
+            )
+
+        sparse_fields = self.get_sparse_fields()
+        serializer = MatchedLawyerSerializer(**sparse_fields)
+        profiles = serializer.setup_eager_loading(LawyerProfile.objects.all()).in_bulk(
+            [pk for pk, _, _ in matches]
+        )
+        matching_lawyers = []
+        for pk, score, distance in matches:
+            if pk in profiles:
+                profiles[pk].match_score = score
+                profiles[pk].distance_km = distance
+                matching_lawyers.append(profiles[pk])
 
         # Serialize and return results
-        serializer = LawyerProfileSerializer(matching_lawyers, many=True)
+        serializer = MatchedLawyerSerializer(matching_lawyers, many=True, **sparse_fields)
         return Response(serializer.data, status=200)
     
 class CreateBookingView(generics.CreateAPIView):
@@ -115,23 +354,32 @@ class CreateBookingView(generics.CreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def perform_create(self, serializer):
-        serializer.save(client=self.request.user, status='pending')
+        try:
+            book_slot(
+                serializer.validated_data['appointment_date'],
+                lambda: serializer.save(client=self.request.user, status='pending'),
+                user=serializer.validated_data['lawyer'],
+            )
+        except SlotUnavailable as exc:
+            raise ValidationError({"error": str(exc)})
 
 
-class ListClientBookingsView(generics.ListAPIView):
+class ListClientBookingsView(ConditionalGetMixin, EagerLoadingViewMixin, generics.ListAPIView):
     serializer_class = BookingSerializer
     permission_classes = [permissions.IsAuthenticated]
+    authentication_classes = [StatelessJWTAuthentication]
 
     def get_queryset(self):
-        return Booking.objects.filter(client=self.request.user)
+        return Booking.objects.filter(client_id=self.request.user.id)
 
 
-class ListLawyerBookingsView(generics.ListAPIView):
+class ListLawyerBookingsView(ConditionalGetMixin, EagerLoadingViewMixin, generics.ListAPIView):
     serializer_class = BookingSerializer
     permission_classes = [permissions.IsAuthenticated]
+    authentication_classes = [StatelessJWTAuthentication]
 
     def get_queryset(self):
-        return Booking.objects.filter(lawyer=self.request.user)
+        return Booking.objects.filter(lawyer_id=self.request.user.id)
 
 
 class UpdateBookingStatusView(generics.UpdateAPIView):
@@ -141,12 +389,27 @@ class UpdateBookingStatusView(generics.UpdateAPIView):
     def get_queryset(self):
         return Booking.objects.filter(lawyer=self.request.user)
 
-    def perform_update(self, serializer):
-        status = self.request.data.get("status", None)
-        if status and status in ['confirmed', 'canceled']:
-            serializer.save()
+    def update(self, request, *args, **kwargs):
+        # Only the status changes here, a booking is never moved to another lawyer or time
+        booking = self.get_object()
+        new_status = request.data.get("status")
+        if new_status not in ['confirmed', 'canceled']:
+            return Response({"error": "Invalid status"}, status=status.HTTP_400_BAD_REQUEST)
+
+        reviving = booking.status == 'canceled' and new_status != 'canceled'
+        booking.status = new_status
+        if reviving:
+            # A canceled slot may have been taken since, confirm it only if it's still free
+            try:
+                book_slot(
+                    booking.appointment_date, booking.save,
+                    exclude_booking=booking.pk, user_id=booking.lawyer_id,
+                )
+            except SlotUnavailable as exc:
+                return Response({"error": str(exc)}, status=status.HTTP_409_CONFLICT)
         else:
-            return Response({"error": "Invalid status"}, status=400) 
+            booking.save()
+        return Response(self.get_serializer(booking).data, status=status.HTTP_200_OK)
 
 class DeleteBookingView(APIView):
     permission_classes = [IsAuthenticated]
@@ -161,38 +424,80 @@ class DeleteBookingView(APIView):
         booking.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)  
 
-class ConsultationListCreateView(generics.ListCreateAPIView):
-    """List all consultations and create a new consultation"""
-    queryset = Consultation.objects.all()
+def involving(queryset, user):
+    """
+    The consultations or reviews the user is a party to: as the client, as the lawyer, or
+    both. Each role is one equality filter on an indexed foreign key.
+    """
+    if user.is_client and user.is_lawyer:
+        return queryset.filter(Q(client__user_id=user.id) | Q(lawyer__user_id=user.id))
+    if user.is_client:
+        return queryset.filter(client__user_id=user.id)
+    if user.is_lawyer:
+        return queryset.filter(lawyer__user_id=user.id)
+    return queryset.none()
+
+class ConsultationListCreateView(ConditionalGetMixin, EagerLoadingViewMixin, generics.ListCreateAPIView):
+    """
+    List the user's own consultations and create a new consultation.
+
+    Filter with ?status= and a ?date__gte=/?date__lte= window; ?ordering=date pages
+    through them by date instead of newest first.
+    """
     serializer_class = ConsultationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = {
+        'date': ['gte', 'lte'],
+        'status': ['exact'],
+    }
+    ordering_fields = ['date', 'created_at']  # Paginated on the (client|lawyer, field, id) indexes
+
+    def get_queryset(self):
+        return involving(Consultation.objects.all(), self.request.user)
 
     def perform_create(self, serializer):
         # Ensure only clients can create consultations
         if not hasattr(self.request.user, 'clientprofile'):
             raise ValidationError({"error": "Only clients can schedule consultations."})
 
-        serializer.save(client=self.request.user.clientprofile)
-
-class ConsultationDetailView(generics.RetrieveUpdateDestroyAPIView):
+        data = serializer.validated_data
+        try:
+            book_slot(
+                consultation_start(data['date'], data['time']),
+                lambda: serializer.save(client=self.request.user.clientprofile),
+                pk=data['lawyer'].pk,
+            )
+        except SlotUnavailable as exc:
+            raise ValidationError({"error": str(exc)})
+
+class ConsultationDetailView(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     """Retrieve, update, or delete a consultation"""
-    queryset = Consultation.objects.all()
     serializer_class = ConsultationSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        """Filter consultations based on user type"""
-        user = self.request.user
-        if hasattr(user, 'clientprofile'):
-            return Consultation.objects.filter(client=user.clientprofile)
-        elif hasattr(user, 'lawyerprofile'):
-            return Consultation.objects.filter(lawyer=user.lawyerprofile)
-        return Consultation.objects.none()
+        return involving(Consultation.objects.all(), self.request.user)
+
+    def perform_update(self, serializer):
+        consultation = serializer.instance
+        new_date = serializer.validated_data.get('date', consultation.date)
+        new_time = serializer.validated_data.get('time', consultation.time)
+        if (new_date, new_time) == (consultation.date, consultation.time):
+            serializer.save()
+            return
+        try:
+            book_slot(
+                consultation_start(new_date, new_time), serializer.save,
+                exclude_consultation=consultation.pk, pk=consultation.lawyer_id,
+            )
+        except SlotUnavailable as exc:
+            raise ValidationError({"error": str(exc)})
     
 
 class ConsultationStatusUpdateView(generics.UpdateAPIView):
     """Allow a lawyer to confirm or cancel a consultation"""
-    queryset = Consultation.objects.all()
+    queryset = Consultation.objects.select_related('client__user', 'lawyer__user')
     serializer_class = ConsultationSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -207,13 +512,24 @@ class ConsultationStatusUpdateView(generics.UpdateAPIView):
         if new_status not in ["confirmed", "canceled"]:
             return Response({"error": "Invalid status value"}, status=status.HTTP_400_BAD_REQUEST)
 
+        reviving = consultation.status == 'canceled' and new_status != 'canceled'
         consultation.status = new_status
-        consultation.save()
+        if reviving:
+            # A canceled slot may have been taken since, confirm it only if it's still free
+            try:
+                book_slot(
+                    consultation_start(consultation.date, consultation.time), consultation.save,
+                    exclude_consultation=consultation.pk, pk=consultation.lawyer_id,
+                )
+            except SlotUnavailable as exc:
+                return Response({"error": str(exc)}, status=status.HTTP_409_CONFLICT)
+        else:
+            consultation.save()
 
-        # Create notification for the client
-        Notification.objects.create(
-            recipient=consultation.client.user,
-            message=f"Your consultation with {consultation.lawyer.user.username} has been {new_status}."
+        # Queue a notification for the client, it's delivered by the notification worker
+        notify(
+            consultation.client.user,
+            f"Your consultation with {consultation.lawyer.user.username} has been {new_status}.",
         )
 
         return Response({"message": f"Consultation {new_status} successfully!"}, status=status.HTTP_200_OK)
@@ -223,7 +539,9 @@ class ConsultationRescheduleView(APIView):
 
     def put(self, request, pk):
         try:
-            consultation = Consultation.objects.get(id=pk, client=request.user.clientprofile)
+            consultation = Consultation.objects.select_related('client__user', 'lawyer__user').get(
+                id=pk, client=request.user.clientprofile
+            )
         except Consultation.DoesNotExist:
             return Response({"error": "Consultation not found or not accessible"}, status=status.HTTP_404_NOT_FOUND)
 
@@ -244,44 +562,216 @@ class ConsultationRescheduleView(APIView):
         if new_date < datetime.today().date():
             return Response({"error": "New consultation date must be in the future"}, status=status.HTTP_400_BAD_REQUEST)
 
-        #  Update consultation
+        #  Update consultation, as long as the lawyer is free at the new time
         consultation.date = new_date
         consultation.time = new_time
         consultation.status = "pending"  # Reset status to pending after rescheduling
-        consultation.save()
+        try:
+            book_slot(
+                consultation_start(new_date, new_time), consultation.save,
+                exclude_consultation=consultation.pk, pk=consultation.lawyer_id,
+            )
+        except SlotUnavailable as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_409_CONFLICT)
 
         # Notify the lawyer about the rescheduling
-        Notification.objects.create(
-            recipient=consultation.lawyer.user,
-            message=f"Your consultation with {consultation.client.user.username} has been rescheduled to {new_date} at {new_time}."
+        notify(
+            consultation.lawyer.user,
+            f"Your consultation with {consultation.client.user.username} has been rescheduled to {new_date} at {new_time}.",
         )
 
         return Response({"message": "Consultation rescheduled successfully!"}, status=status.HTTP_200_OK)
 
-class NotificationListView(generics.ListAPIView):
+class NotificationListView(ReplicaReadMixin, ConditionalGetMixin, EagerLoadingViewMixin, generics.ListAPIView):
     """Retrieve notifications for the logged-in user"""
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    authentication_classes = [StatelessJWTAuthentication]
 
     def get_queryset(self):
-        return Notification.objects.filter(recipient=self.request.user).order_by('-created_at')
+        return Notification.objects.filter(recipient_id=self.request.user.id).order_by('-created_at')
+
+class UnreadNotificationCountView(APIView):
+    """Number of unread notifications, counted from the partial unread index"""
+    permission_classes = [permissions.IsAuthenticated]
+    authentication_classes = [StatelessJWTAuthentication]
+
+    def get(self, request):
+        unread = Notification.objects.filter(recipient_id=request.user.id, is_read=False).count()
+        return Response({"unread": unread})
+
+class MarkNotificationsReadView(APIView):
+    """Mark every unread notification up to and including `up_to` (a notification id) as read"""
+    permission_classes = [permissions.IsAuthenticated]
+    authentication_classes = [StatelessJWTAuthentication]
+
+    def post(self, request):
+        up_to = request.data.get('up_to')
+        notifications = Notification.objects.filter(recipient_id=request.user.id, is_read=False)
+        if up_to is not None:
+            try:
+                notifications = notifications.filter(id__lte=int(up_to))
+            except (TypeError, ValueError):
+                return Response({"error": "up_to must be a notification id."}, status=status.HTTP_400_BAD_REQUEST)
+
+        marked = notifications.update(is_read=True, updated_at=timezone.now())
+        return Response({"marked_read": marked}, status=status.HTTP_200_OK)
+
+class MarkNotificationReadView(APIView):
+    """Mark a single notification as read"""
+    permission_classes = [permissions.IsAuthenticated]
+    authentication_classes = [StatelessJWTAuthentication]
+
+    def put(self, request, pk):
+        updated = Notification.objects.filter(pk=pk, recipient_id=request.user.id).update(is_read=True, updated_at=timezone.now())
+        if not updated:
+            return Response({"error": "Notification not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"message": "Notification marked as read."}, status=status.HTTP_200_OK)
+
+class NotificationPushMixin:
+    """
+    Shared pieces of the async notification endpoints. They are plain Django async views,
+    not DRF ones, so an idle connection holds no thread. The JWT comes from the
+    Authorization header or, for EventSource clients that can't set headers, ?access_token=,
+    and is checked without a User query (StatelessJWTAuthentication).
+    """
+    batch_size = 100
+
+    async def authenticate(self, request):
+        auth = StatelessJWTAuthentication()
+        try:
+            result = await sync_to_async(auth.authenticate)(request)
+            if result is None and request.GET.get('access_token'):
+                token = auth.get_validated_token(request.GET['access_token'].encode())
+                result = (await sync_to_async(auth.get_user)(token), token)
+        except AuthenticationFailed:
+            return None
+        return result[0] if result else None
+
+    def unauthorized(self):
+        return JsonResponse({"detail": "Authentication credentials were not provided or are invalid."}, status=401)
+
+    def poll_interval(self):
+        # Fallback re-check for notifications published from another process
+        return getattr(settings, 'NOTIFICATION_STREAM_POLL_SECONDS', 15)
+
+    def parse_cursor(self, raw):
+        try:
+            return int(raw) if raw not in (None, '') else None
+        except ValueError:
+            raise ValueError("The cursor must be a notification id.")
+
+    @sync_to_async
+    def latest_id(self, user_id):
+        return Notification.objects.filter(recipient_id=user_id).aggregate(latest=Max('id'))['latest'] or 0
+
+    @sync_to_async
+    def fetch(self, user_id, cursor):
+        rows = Notification.objects.filter(recipient_id=user_id, id__gt=cursor).order_by('id')[:self.batch_size]
+        return list(NotificationSerializer(rows, many=True).data)
+
+class NotificationStreamView(NotificationPushMixin, View):
+    """Server-Sent Events stream of new notifications, resumable with Last-Event-ID"""
+
+    async def get(self, request, *args, **kwargs):
+        user = await self.authenticate(request)
+        if user is None:
+            return self.unauthorized()
+
+        try:
+            cursor = self.parse_cursor(request.headers.get('Last-Event-ID') or request.GET.get('last_event_id'))
+        except ValueError as exc:
+            return JsonResponse({"error": str(exc)}, status=400)
+        if cursor is None:
+            cursor = await self.latest_id(user.pk)
+
+        response = StreamingHttpResponse(self.events(user.pk, cursor), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # Stop nginx from buffering the stream
+        return response
+
+    async def events(self, user_id, cursor):
+        subscription = get_broker().subscribe(user_id)
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                rows = await self.fetch(user_id, cursor)
+                for row in rows:
+                    cursor = row['id']
+                    yield f"id: {row['id']}\nevent: notification\ndata: {json.dumps(row)}\n\n"
+                if len(rows) == self.batch_size:
+                    continue
+                if not await subscription.wait(self.poll_interval()):
+                    yield ': keep-alive\n\n'
+        finally:
+            subscription.close()
+
+class NotificationPollView(NotificationPushMixin, View):
+    """Long-poll fallback: waits up to ?timeout= seconds for notifications after ?cursor="""
+    max_timeout = 30
+
+    async def get(self, request, *args, **kwargs):
+        user = await self.authenticate(request)
+        if user is None:
+            return self.unauthorized()
 
-class ReviewListCreateView(generics.ListCreateAPIView):
-    """Clients can create reviews, and everyone can list them"""
+        try:
+            cursor = self.parse_cursor(request.GET.get('cursor'))
+            timeout = min(max(float(request.GET.get('timeout', 25)), 0), self.max_timeout)
+        except ValueError:
+            return JsonResponse({"error": "cursor must be a notification id and timeout a number of seconds."}, status=400)
+        if cursor is None:
+            cursor = await self.latest_id(user.pk)
+
+        subscription = get_broker().subscribe(user.pk)
+        try:
+            rows = await self.fetch(user.pk, cursor)
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + timeout
+            while not rows and loop.time() < deadline:
+                await subscription.wait(min(self.poll_interval(), deadline - loop.time()))
+                rows = await self.fetch(user.pk, cursor)
+        finally:
+            subscription.close()
+
+        return JsonResponse({"cursor": rows[-1]['id'] if rows else cursor, "results": rows})
+
+class ReviewListCreateView(ReplicaReadMixin, EagerLoadingViewMixin, generics.ListCreateAPIView):
+    """Clients create reviews and list the ones they wrote, lawyers list the ones about them"""
     serializer_class = ReviewSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return Review.objects.all()
+        return involving(Review.objects.all(), self.request.user)
 
     def perform_create(self, serializer):
+        if not hasattr(self.request.user, 'clientprofile'):
+            raise PermissionDenied({"error": "Only clients can review lawyers."})
+
         consultation = serializer.validated_data.get("consultation")
-        if consultation:
-            lawyer = consultation.lawyer  # Retrieve the lawyer from the consultation
-            serializer.save(client=self.request.user.clientprofile, lawyer=lawyer)
-        else:
+        client = self.request.user.clientprofile
+        if not consultation or consultation.client_id != client.id:
             raise serializers.ValidationError({"consultation": "A valid consultation is required."})
 
+        lawyer = consultation.lawyer  # Retrieve the lawyer from the consultation
+        if Review.objects.filter(client=client, lawyer=lawyer).exists():
+            raise serializers.ValidationError({"error": "You have already reviewed this lawyer."})
+
+        # Keep the lawyer's rating aggregates in step with the review rows
+        with transaction.atomic():
+            review = serializer.save(client=client, lawyer=lawyer)
+            LawyerProfile.adjust_rating(lawyer.id, 1, review.rating)
+
+
+class LawyerReviewListView(ReplicaReadMixin, EagerLoadingViewMixin, generics.ListAPIView):
+    """A lawyer's reviews, newest first, for anyone signed in"""
+    serializer_class = ReviewSerializer
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [StatelessJWTAuthentication]
+
+    def get_queryset(self):
+        return Review.objects.filter(lawyer_id=self.kwargs['pk'])  # Paginated on review_lawyer_created_idx
+
 
 class ReviewDetailView(generics.RetrieveUpdateDestroyAPIView):
     """Clients can update/delete their reviews"""
@@ -289,4 +779,100 @@ class ReviewDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return Review.objects.filter(client=self.request.user.clientprofile)
+        return Review.objects.filter(client__user=self.request.user)  # Other users see no reviews here
+
+    def perform_update(self, serializer):
+        old_rating = serializer.instance.rating
+        with transaction.atomic():
+            review = serializer.save()
+            if review.rating != old_rating:
+                LawyerProfile.adjust_rating(review.lawyer_id, 0, review.rating - old_rating)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            LawyerProfile.adjust_rating(instance.lawyer_id, -1, -instance.rating)
+            instance.delete()
+
+
+class LawyerDashboardView(CachedResponseMixin, APIView):
+    """
+    The lawyer's bookings and consultations counted by status, what's coming up in the
+    next ?days= days (7 by default), rating stats and unread notifications.
+
+    Each table is counted in one conditional aggregate, so the query count doesn't grow
+    with the lawyer's history. Everything but the unread count is cached per lawyer for
+    DASHBOARD_CACHE_TIMEOUT seconds, and booking, consultation and review writes drop it.
+    """
+    permission_classes = [IsAuthenticated, IsLawyer]
+    authentication_classes = [StatelessJWTAuthentication]
+    cache_name = 'lawyer-dashboard'
+    max_days = 31
+    upcoming_limit = 20
+
+    def get_cache_timeout(self):
+        return getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 30)
+
+    def get(self, request, *args, **kwargs):
+        profile_id = getattr(request.user, 'lawyer_profile_id', None)
+        if profile_id is None:
+            # Tokens without claims, look the profile up
+            profile_id = LawyerProfile.objects.filter(user_id=request.user.id).values_list('id', flat=True).first()
+            if profile_id is None:
+                return Response({"error": "Lawyer profile not found"}, status=400)
+        days = number_param(request, 'days', 7, 1, self.max_days, cast=int)
+
+        response = self.cached_response(
+            request, partial(self.summarize, request.user.id, profile_id, days),
+            namespaces=[lawyer_user_namespace(request.user.id), lawyer_profile_namespace(profile_id)],
+            variant=(request.user.id,),
+        )
+        # Marking notifications read sends no signals, so this part is never cached
+        response.data["notifications"] = {
+            "unread": Notification.objects.filter(recipient_id=request.user.id, is_read=False).count(),
+        }
+        return response
+
+    def summarize(self, user_id, profile_id, days):
+        now = timezone.now()
+        today = timezone.localdate()
+
+        def by_status(model, upcoming):
+            counts = {"total": Count('id')}
+            counts.update({value: Count('id', filter=Q(status=value)) for value, _ in model.STATUS_CHOICES})
+            counts["upcoming"] = Count('id', filter=upcoming & ~Q(status='canceled'))
+            return counts
+
+        bookings = Booking.objects.filter(lawyer_id=user_id)
+        upcoming_bookings = Q(appointment_date__gte=now, appointment_date__lt=now + timedelta(days=days))
+        consultations = Consultation.objects.filter(lawyer_id=profile_id)
+        upcoming_consultations = Q(date__gte=today, date__lt=today + timedelta(days=days))
+
+        # Count and average are the profile's stored aggregates, only the distribution counts reviews
+        ratings = LawyerProfile.objects.filter(pk=profile_id).values('rating_count', 'rating_avg').annotate(
+            **{str(rating): Count('reviews', filter=Q(reviews__rating=rating)) for rating in range(1, 6)},
+        ).get()
+        count = ratings.pop('rating_count')
+        average = ratings.pop('rating_avg')
+
+        return Response({
+            "days": days,
+            "bookings": bookings.aggregate(**by_status(Booking, upcoming_bookings)),
+            "consultations": consultations.aggregate(**by_status(Consultation, upcoming_consultations)),
+            "ratings": {
+                "count": count,
+                "average": round(average, 2) if count else None,
+                "distribution": ratings,
+            },
+            "upcoming": {
+                "bookings": list(
+                    bookings.filter(upcoming_bookings).exclude(status='canceled')
+                    .order_by('appointment_date')
+                    .values('id', 'client_id', 'client__username', 'appointment_date', 'status')[:self.upcoming_limit]
+                ),
+                "consultations": list(
+                    consultations.filter(upcoming_consultations).exclude(status='canceled')
+                    .order_by('date', 'time')
+                    .values('id', 'client_id', 'client__user__username', 'date', 'time', 'mode', 'status')[:self.upcoming_limit]
+                ),
+            },
+        })